@@ -13,6 +13,8 @@ import traceback
 from pyobject import desc
 
 _py38=hasattr(compile('','','exec'), 'co_posonlyargcount')
+_py310=sys.version_info>=(3,10)
+_py311=sys.version_info>=(3,11)
 class Code:
     """
 # 用于doctest
@@ -90,6 +92,21 @@ Hello World!
         _default_args['co_posonlyargcount']=0
         _default_args.move_to_end('co_posonlyargcount', last=False)
         _default_args.move_to_end('co_argcount', last=False)
+    # Python 3.10中, co_lnotab被co_linetable取代
+    if _py310:
+        _default_args['co_linetable']=_default_args.pop('co_lnotab')
+        _default_args.move_to_end('co_freevars')
+        _default_args.move_to_end('co_cellvars')
+    # Python 3.11中, 增加了co_qualname和co_exceptiontable
+    if _py311:
+        _default_args['co_qualname']=''
+        _default_args['co_exceptiontable']=b''
+        for _key in ('co_firstlineno','co_linetable','co_exceptiontable',
+                     'co_freevars','co_cellvars'):
+            _default_args.move_to_end(_key)
+        del _key
+        # RESUME 0; LOAD_CONST 0 (None); RETURN_VALUE
+        _default_args['co_code']=b'\x97\x00d\x00S\x00'
 
     _arg_types={key:type(value) for key,value in _default_args.items()}
     def __init__(self,code=None,auto_update=True):
@@ -152,6 +169,7 @@ Hello World!
     def fromstring(cls,string,mode='exec',filename=''):
         return cls(compile(string,filename,mode))
     def to_code(self):
+        if not self.auto_update: self._update_code()
         return self._code
     def to_func(self,globals_=None,name=''):
         if globals_ is None:
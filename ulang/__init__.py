@@ -2,8 +2,18 @@
 # Python bytecode 3.7 (3394)
 # Decompiled from: Python 3.7.2rc1 (tags/v3.7.2rc1:75a402a217, Dec 11 2018, 22:09:03) [MSC v.1916 32 bit (Intel)]
 # Embedded file name: ulang\__init__.py
-from ulang.parser.core import Parser
-from ulang.runtime.main import main
 __version__ = '0.2.2.3'# 原为0.2.2.2
 __all__ = ['Parser', 'main']
+
+
+def __getattr__(name):
+    # imported on first use, so that the runtime of built programs
+    # (``ulang build``) loads without the parser
+    if name == 'Parser':
+        from ulang.parser.core import Parser
+        return Parser
+    if name == 'main':
+        from ulang.runtime.main import main
+        return main
+    raise AttributeError("module 'ulang' has no attribute '%s'" % name)
 # okay decompiling E:\ulang\ulang-0.2.2.exe_extracted\PYZ-00.pyz_extracted\ulang.pyc
\ No newline at end of file
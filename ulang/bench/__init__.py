@@ -0,0 +1,65 @@
+"""
+Performance benchmarks of the µlang toolchain.
+
+Each module can be run on its own, e.g. ``python -m ulang.bench.tables``.
+``python -m ulang.bench.suite`` runs the suite tracked across changes,
+saving its results as JSON and flagging regressions against a former run.
+"""
+import os, subprocess, sys, tempfile, time
+
+
+def measure(func, repeat=5, number=1):
+    """
+    Call func number times per round and return
+    the best time of a single call in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(title, rows):
+    """Print (name, seconds) rows as a small table."""
+    print(title)
+    for name, seconds in rows:
+        if isinstance(seconds, str):
+            print('  %-36s %s' % (name, seconds))
+        else:
+            print('  %-36s %10.3f ms' % (name, seconds * 1000))
+
+
+def ulang_env():
+    """Return the environment of a child python which imports this ulang."""
+    import ulang
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(ulang.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    return env
+
+
+def run_ulang(source, *options):
+    """
+    Run a ulang program in a fresh interpreter and return the
+    completed process, with the output decoded.
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.ul', delete=False) as (f):
+        f.write(source)
+    try:
+        return subprocess.run([sys.executable, '-m', 'ulang', '--no-cache'] + list(options) + [f.name], env=(ulang_env()),
+          stdout=(subprocess.PIPE),
+          stderr=(subprocess.PIPE),
+          universal_newlines=True)
+    finally:
+        os.unlink(f.name)
+
+
+def failure(proc):
+    """Return the last line of the error output of a failed process."""
+    lines = (proc.stderr.strip() or proc.stdout.strip() or 'no output').splitlines()
+    return 'failed: %s' % lines[-1]
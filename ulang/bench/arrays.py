@@ -0,0 +1,136 @@
+"""
+Numeric code written with the ``array`` type and the ``vec`` namespace,
+against the same computation written with loops over a list, in ulang.
+Both versions of a case must compute the same result, compared as lists
+of python numbers.
+
+The arrays need numpy, the benchmark reports it missing otherwise.
+"""
+from ulang.bench import measure, report
+from ulang.parser.core import Parser
+from ulang.runtime.env import create_globals
+
+SETUP = 'xs = list(range(N))\na = array(xs)\n'
+
+# name, with loops over the list xs, with the array a of the same numbers
+CASES = [
+ ('elementwise a * 2 + 1',
+ 'result = []\nfor x in xs {\n  result.append(x * 2 + 1)\n}\n',
+ 'result = a * 2 + 1\n'),
+ ('division and remainder',
+ 'result = []\nfor x in xs {\n  result.append(x / 3 + x % 7)\n}\n',
+ 'result = a / 3 + a % 7\n'),
+ ('sqrt of each item',
+ 'result = []\nfor x in xs {\n  result.append(sqrt(x))\n}\n',
+ 'result = sqrt(a)\n'),
+ ('sum of squares',
+ 'result = 0\nfor x in xs {\n  result += x * x\n}\n',
+ 'result = vec.sum(a * a)\n'),
+ ('max',
+ 'result = xs[0]\nfor x in xs {\n  if x > result {\n    result = x\n  }\n}\n',
+ 'result = max(a)\n'),
+ ('differences of a slice',
+ 'result = []\nfor i in 1..<#xs {\n  result.append(xs[i] - xs[i - 1])\n}\n',
+ 'result = a[1:] - a[:#a - 1]\n'),
+ ('mean and std',
+ 'm = 0.0\nfor x in xs {\n  m += x\n}\nm = m / #xs\nv = 0.0\nfor x in xs {\n  v += (x - m) ^ 2\n}\nresult = [m, sqrt(v / #xs)]\n',
+ 'result = [a.mean(), a.std()]\n')]
+
+# the scalar builtins must raise the errors of python once arrays are used
+ERRORS = [
+ ('log(0 - 1)', ValueError),
+ ('pow(0 - 8, 0.5)', ValueError),
+ ('max(1, "a")', TypeError),
+ ('max([])', ValueError)]
+
+# and take arrays: max and min of one array, elementwise of several
+RESULTS = [
+ ('max(array([1, 5, 3]))', 5),
+ ('min(array([4, 2, 8]))', 2),
+ ('max(array([1, 5]), array([4, 2]))', [4, 5]),
+ ('min(array([1, 5]), 3)', [1, 3]),
+ ('max(2, 7)', 7),
+ ('log(1)', 0.0)]
+
+
+def compile_ulang(source):
+    return compile(Parser().parse(source, '<bench>'), '<bench>', 'exec')
+
+
+def value(x):
+    if hasattr(x, 'tolist'):
+        return x.tolist()
+    if isinstance(x, list):
+        return [value(item) for item in x]
+    return x
+
+
+def same(x, y):
+    x, y = value(x), value(y)
+    if isinstance(x, list):
+        return isinstance(y, list) and len(x) == len(y) and all(same(a, b) for a, b in zip(x, y))
+    return abs(x - y) <= 1e-09 * max(abs(x), abs(y), 1)
+
+
+def case(setup, loops, vectorized):
+    """Return the functions running both versions of a case, once checked."""
+    namespaces = []
+    runs = []
+    for source in (loops, vectorized):
+        namespace = create_globals(fname='<bench>')
+        exec(setup, namespace)
+        code = compile_ulang(source)
+        run = lambda code=code, namespace=namespace: exec(code, namespace)
+        run()
+        namespaces.append(namespace)
+        runs.append(run)
+
+    if not same(namespaces[0]['result'], namespaces[1]['result']):
+        raise AssertionError('the results differ')
+    return runs
+
+
+def check_builtins():
+    namespace = create_globals(fname='<bench>')
+    exec(compile_ulang('a = array([1])\n'), namespace)
+    for source, error in ERRORS:
+        try:
+            exec(compile_ulang('result = %s\n' % source), namespace)
+        except error:
+            continue
+        raise AssertionError('%s does not raise %s' % (source, error.__name__))
+
+    for source, expected in RESULTS:
+        exec(compile_ulang('result = %s\n' % source), namespace)
+        if not same(namespace['result'], expected):
+            raise AssertionError('%s is not %s' % (source, expected))
+
+
+def run(sizes=(10000, 1000000)):
+    try:
+        import numpy
+    except ImportError:
+        return [('arrays', 'failed: numpy is not installed')]
+
+    check_builtins()
+    rows = []
+    for size in sizes:
+        setup = compile_ulang(SETUP.replace('N', str(size)))
+        for name, loops, vectorized in CASES:
+            try:
+                old, new = [measure(func, repeat=3) for func in case(setup, loops, vectorized)]
+            except AssertionError as e:
+                rows.append(('%d items, %s' % (size, name), 'failed: %s' % e))
+                continue
+            rows.append(('%d items, %s' % (size, name), '%10.3f ms -> %8.3f ms  x%.1f' % (
+             old * 1000, new * 1000, old / new)))
+
+    return rows
+
+
+def main():
+    report('numeric code, loops over lists -> arrays', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Blockly xml of big generated programs (``ulang --dump-blockly``): the
+time and the peak memory of writing the xml in one pass, against the
+serialization of the previous converter, which built the same document
+as an ElementTree, wrote it out and parsed it again with minidom to
+indent it. That baseline leaves out visiting the ast, so it is a lower
+bound of the previous cost. Each statement of a program is nested in
+the <next> element of the one before, so the baseline needs a deep
+recursion and its indented output grows with the square of the number
+of statements, it is only run on the smaller sources.
+
+The output must be the document minidom writes, once the indentation
+is removed, be the same on every run and keep the ids of the blocks of
+the functions not edited between two runs.
+"""
+import os, re, sys, tracemalloc
+import xml.etree.ElementTree as etree
+import xml.dom.minidom as minidom
+from ulang.bench import measure, report
+from ulang.codegen import blockly
+from ulang.parser.core import Parser
+
+# statements blockly has blocks for, f is the last function defined
+SNIPPETS = [
+ 'func f{i}(x, y) {{\n  s = x * y + {i}\n  while s > 10 {{\n    s -= 3\n  }}\n  return s\n}}',
+ 'v{i} = f{f}(1, 2) + {i}',
+ 'if v{i} > 3 {{\n  println(v{i}, "big")\n}} else {{\n  println("small")\n}}',
+ 'for j in 0..{i} {{\n  total += j\n}}',
+ 'xs{i} = [v{i}, {i}, "s", nil, true]',
+ 'w{i} = xs{i}[0] > 1 and v{i} < 100 ? len(xs{i}) : -1']
+
+BLOCK_ID = re.compile('<block type="[^"]*" id="([^"]*)"')
+
+
+def generate(lines):
+    out = ['total = 0']
+    count = 1
+    i = 0
+    while count < lines:
+        snippet = SNIPPETS[i % len(SNIPPETS)].format(i=i, f=(i - i % len(SNIPPETS)))
+        out.append(snippet)
+        count += snippet.count('\n') + 1
+        i += 1
+
+    return '\n'.join(out) + '\n'
+
+
+def compact(xml):
+    return re.sub('>\\s+<', '><', xml.split('\n', 1)[1].strip())
+
+
+def tree_and_minidom(xml):
+    """The serialization of the previous converter, from its element tree."""
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 100000))
+    try:
+        # the previous tree had no namespace, the root element added it
+        root = etree.fromstring(xml.split('\n', 1)[1].replace(' xmlns="%s"' % blockly.XMLNS, '', 1))
+        xml = ''.join(etree.tostring(child).decode('utf-8') for child in root)
+        xml = '<xml xmlns="%s">%s</xml>' % (blockly.XMLNS, xml)
+        return minidom.parseString(xml).toprettyxml(indent='  ')
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+def peak(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def check(source):
+    nodes = Parser().parse(source, '<bench>')
+    xml = blockly.dump(nodes)
+    if blockly.dump(Parser().parse(source, '<bench>')) != xml:
+        raise AssertionError('the xml differs between two runs')
+    if minidom.parseString(compact(xml)).documentElement.toxml() != compact(xml):
+        raise AssertionError('the xml is not written like minidom does')
+    if compact(tree_and_minidom(xml)) != compact(xml):
+        raise AssertionError('the xml differs from the element tree one')
+    edited = source.replace('s = x * y + 6\n', 's = x * y + 7\n', 1)
+    assert edited != source
+    ids = set(BLOCK_ID.findall(xml))
+    kept = ids & set(BLOCK_ID.findall(blockly.dump(Parser().parse(edited, '<bench>'))))
+    function = blockly.dump(Parser().parse(SNIPPETS[0].format(i=6, f=6), '<bench>'))
+    if len(ids) - len(kept) != len(BLOCK_ID.findall(function)):
+        raise AssertionError('%d of %d block ids changed' % (len(ids) - len(kept), len(ids)))
+
+
+def run(sizes=(500, 2000, 20000), baseline=2000):
+    check(generate(200))
+    rows = []
+    # the streamed xml goes to a file, as with ulang -b > out.xml
+    devnull = open(os.devnull, 'w')
+    for size in sizes:
+        nodes = Parser().parse(generate(size), '<bench>')
+        write = lambda : blockly.CodeGen().write(nodes, devnull)
+        streamed = measure(write, repeat=3)
+        row = '%10.3f ms %8.1f MB' % (streamed * 1000, peak(write) / 1000000.0)
+        if size <= baseline:
+            xml = blockly.dump(nodes)
+            rebuilt = measure((lambda : tree_and_minidom(xml)), repeat=3)
+            rows.append(('%d lines, tree + minidom' % size, '%10.3f ms %8.1f MB' % (
+             rebuilt * 1000, peak(lambda : tree_and_minidom(xml)) / 1000000.0)))
+            row += '  x%.1f' % (rebuilt / streamed)
+        rows.append(('%d lines, streamed' % size, row))
+
+    devnull.close()
+    return rows
+
+
+def main():
+    report('blockly xml, element tree + minidom -> streamed', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Programs compiled by ``ulang build`` against the same sources run by the
+interpreter, with and without the ``__ulcache__`` of imported modules. The
+time is the wall time of a fresh process, so it covers the startup, the
+loading of all modules and the run: a hello world, and the project of
+``ulang.bench.imports`` computing a total over its modules.
+"""
+import os, shutil, subprocess, sys, tempfile, time
+from ulang.bench import measure, report, ulang_env
+from ulang.bench.imports import write_project
+from ulang.runtime import build
+
+HELLO = 'println("hello")\n'
+
+
+def timed_run(args, cwd, expected):
+    """Return the best wall time of running args, or the reason it failed."""
+    failed = []
+
+    def run():
+        proc = subprocess.run(args, cwd=cwd, env=(ulang_env()), stdout=(subprocess.PIPE),
+          stderr=(subprocess.PIPE),
+          universal_newlines=True)
+        if proc.returncode != 0 or proc.stdout != expected:
+            failed.append((proc.stderr.strip() or proc.stdout.strip() or 'no output').splitlines()[-1])
+
+    seconds = measure(run, repeat=5)
+    if failed:
+        return 'failed: %s' % failed[0]
+    return seconds
+
+
+def compare(name, directory, expected):
+    """Build the program in directory and time all ways of running it."""
+    out_dir = directory + '-build'
+    start = time.perf_counter()
+    build.build(directory, out_dir)
+    build_time = time.perf_counter() - start
+    interpreter = [sys.executable, '-m', 'ulang']
+    cache_dir = os.path.join(directory, '__ulcache__')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    rows = [
+     (
+      '%s, interpreted' % name,
+      timed_run(interpreter + ['--no-cache', 'main.ul'], directory, expected)),
+     (
+      '%s, interpreted, cached' % name,
+      timed_run(interpreter + ['main.ul'], directory, expected)),
+     (
+      '%s, built' % name,
+      timed_run([sys.executable, 'main.pyc'], out_dir, expected)),
+     (
+      '%s, build' % name, build_time)]
+    return rows
+
+
+def run(count=30):
+    rows = []
+    root = tempfile.mkdtemp()
+    try:
+        hello = os.path.join(root, 'hello')
+        os.makedirs(hello)
+        with open(os.path.join(hello, 'main.ul'), 'w') as (f):
+            f.write(HELLO)
+        rows.extend(compare('hello world', hello, 'hello\n'))
+        project = os.path.join(root, 'project')
+        os.makedirs(project)
+        main = write_project(project, count) + 'println(total)\n'
+        with open(os.path.join(project, 'main.ul'), 'w') as (f):
+            f.write(main)
+        total = sum(i * 3 + i // 2 for i in range(count))
+        rows.extend(compare('%d modules' % count, project, '%d\n' % total))
+    finally:
+        shutil.rmtree(root)
+
+    return rows
+
+
+def main():
+    report('running built programs against the interpreter', run())
+
+
+if __name__ == '__main__':
+    main()
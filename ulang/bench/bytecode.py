@@ -0,0 +1,106 @@
+"""
+The bytecode backend (``ulang --backend=bytecode``) against ``compile()``.
+
+Every program is compiled both ways and run in a fresh namespace, the
+printed output and the exception raised must be the same. The programs
+cover the statements of the language and the synthetic sources of the
+other benchmarks. Then the time to compile a large source and the run
+time of loop kernels using ``%``, ``/``, small ranges and ``$`` are
+compared.
+"""
+import contextlib, io
+from ulang.bench import measure, report
+from ulang.bench.sources import generate
+from ulang.codegen import bytecode
+from ulang.parser.core import Parser
+from ulang.runtime.env import create_globals
+
+PROGRAMS = [
+ ('arithmetic', 'a = 7\nb = 2\nx = 2.5\nprintln(a / b, a % b, -a / b, -a % b, a / x, a % x, x / 0.5)\nprintln(a ^ b, a << b, a >> 1, a & 3, a | 8, ~a, -a, !a, 1 + 2 * 3 - 4)\nprintln((60 * 60 * 24) / 1000, 7 % -3, 2 ^ 0.5, "ab" * 3)\n'),
+ ('ranges', 't = 0\nfor i in 1..10 {\n  t += i % 3\n}\nfor i in 0..<10 by 3 {\n  t += i\n}\nfor i in 10..1 by -2 {\n  t += i / 2\n}\nn = 5\nfor i in 0..n {\n  t += i\n}\nfor i in 0..200 {\n  t += i\n}\nprintln(t)\n'),
+ ('loops', 'i = 0\ns = 0\nwhile i < 20 {\n  i += 1\n  if i % 2 == 0 {\n    continue\n  }\n  if i > 15 {\n    break\n  }\n  s += i\n}\nwhile true {\n  s -= 1\n  if s < 50 {\n    break\n  }\n}\nfor x in [1, 2, 3] {\n  for y in [4, 5] {\n    if y == 5 {\n      break\n    }\n    s += x * y\n  }\n}\nprintln(i, s)\n'),
+ ('functions', 'func f(a, b) {\n  return a * b + 1\n}\nfunc g(x, ...) {\n  return x, __varargs__\n}\nfunc h(x) {\n  return\n}\nk = (x) -> x + 1\nm = func(x, y) {\n  z = x - y\n  return z * 2\n}\nprintln(f(3, 4), g(1, 2, 3), h(1), k(1), m(5, 2), f(b = 1, a = 2))\n'),
+ ('closures', 'func counter() {\n  n = 0\n  add = (x) -> x + n\n  n = 10\n  return add\n}\nc = counter()\nprintln(c(5))\nfunc outer(a) {\n  func mid(b) {\n    func inner(c) {\n      return a + b + c\n    }\n    return inner\n  }\n  return mid\n}\nprintln(outer(1)(2)(3))\n'),
+ ('globals', 'count = 0\nfunc bump() {\n  extern count\n  count += 1\n}\nbump()\nbump()\nprintln(count)\n'),
+ ('types', 'type Point {\n  func $Point(x, y) {\n    $x = x\n    $y = y\n  }\n  func $norm2() {\n    return $x * $x + $y * $y\n  }\n  func $shifted(d) {\n    return Point($x + d, $y + d)\n  }\n}\ntype Point3 : Point {\n  func $Point3(x, y, z) {\n    super(x, y)\n    $z = z\n  }\n  func $norm2() {\n    return super.norm2() + $z * $z\n  }\n}\np = Point(3, 4)\nprintln(p.norm2(), p.shifted(1).norm2(), Point3(1, 2, 3).norm2())\n'),
+ ('operators', 'type V {\n  func $V(v) {\n    $v = v\n  }\n  operator + (o) {\n    return V($v + o.v)\n  }\n  operator == (o) {\n    return $v == o.v\n  }\n  attr $size {\n    return $v * 10\n  }\n}\nw = V(1) + V(2)\nprintln(w.v, V(1) == V(1), V(3).size)\n'),
+ ('exceptions', 'func risky(x) {\n  try {\n    if x > 1 {\n      throw ValueError("big")\n    }\n    return x\n  } catch e: ValueError {\n    println("caught", e)\n    return -1\n  } finally {\n    println("finally", x)\n  }\n}\nprintln(risky(1), risky(2))\ntry {\n  println(1 / 0)\n} catch e {\n  println("zero", e)\n}\nfor i in 1..3 {\n  try {\n    if i == 2 {\n      continue\n    }\n    println("in", i)\n  } catch {\n    println("never")\n  } finally {\n    println("out", i)\n  }\n}\ntry {\n  x = [][1]\n} catch e: KeyError {\n  println("key")\n} catch {\n  println("index")\n}\n'),
+ ('with', 'type Ctx {\n  func $Ctx(name, swallow) {\n    $name = name\n    $swallow = swallow\n  }\n  func $__enter__() {\n    println("enter", $name)\n    return $name\n  }\n  func $__exit__(...) {\n    println("exit", $name, __varargs__[0])\n    return $swallow\n  }\n}\ntry n = Ctx("a", false) {\n  println("body", n)\n}\ntry n = Ctx("b", true) {\n  throw ValueError("x")\n}\nfunc early() {\n  try n = Ctx("c", false) {\n    return n\n  }\n}\nprintln(early())\n'),
+ ('generators', 'func gen(n) {\n  for i in 0..n {\n    yield i * i\n  }\n}\nprintln(list(gen(4)))\n'),
+ ('collections', 'xs = [3, 1, 2]\nd = {"a": 1, "b": [1, 2]}\nxs[0] = 9\nd["c"] = xs[1:]\nxs[1] += 10\nd["a"] *= 3\na, b = 1, 2\na, b = b, a\nprintln(xs, d, a, b, #xs, xs[-1], xs[:2])\n'),
+ ('ternary and logic', 'func sign(x) {\n  return x > 0 ? 1 : x < 0 ? -1 : 0\n}\nprintln(sign(5), sign(-2), sign(0), 1 < 2 and 3 > 2, nil or "d", 0 and 1)\nx = nil\nif x === nil and !x {\n  println("nil")\n}\n'),
+ ('imports', 'using math\nusing sqrt, floor in math\nusing os.path\nprintln(math.pi > 3, sqrt(16), floor(2.5), os.path.join("a", "b"))\n'),
+ ('annotations', 'x : int = 3\nfunc f(a) {\n  y : int = a + 1\n  return y\n}\nprintln(x, f(x))\n'),
+ ('errors', 'func f(n) {\n  return g(n) + 1\n}\nfunc g(n) {\n  return undefined_name * n\n}\nprintln(f(2))\n'),
+ ('synthetic', generate(300))]
+
+KERNELS = [
+ ('rem of counters', 'total = 0\nfor i in 1..N {\n  total += i % 7 + i % 3\n}\n'),
+ ('float division', 'total = 0\nfor i in 1..N {\n  total += i / 2.0\n}\n'),
+ ('small inner range', 'total = 0\nfor i in 1..N / 10 {\n  for j in 1..10 {\n    total += j\n  }\n}\n'),
+ ('$ methods', 'type Acc {\n  func $Acc() {\n    $n = 0\n  }\n  func $add(x) {\n    $n = $n + x % 5\n  }\n}\na = Acc()\nfor i in 1..N {\n  a.add(i)\n}\ntotal = a.n\n')]
+
+
+def compile_both(source):
+    nodes = Parser().parse(source, '<bench>')
+    fallbacks = []
+    code = bytecode.compile_module(nodes, '<bench>', fallbacks)
+    return (compile(nodes, '<bench>', 'exec'), code, fallbacks)
+
+
+def execute(code):
+    """Run code in a fresh namespace, return its output and the exception raised."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        namespace = create_globals(fname='<bench>')
+        try:
+            exec(code, namespace)
+        except Exception as e:
+            return (out.getvalue(), '%s: %s' % (e.__class__.__name__, e), namespace)
+
+    return (out.getvalue(), None, namespace)
+
+
+def differential():
+    rows = []
+    for name, source in PROGRAMS:
+        expected, code, fallbacks = compile_both(source)
+        a, b = execute(expected)[:2], execute(code)[:2]
+        if a != b:
+            raise AssertionError('%s: %r != %r' % (name, a, b))
+        rows.append((name, 'same output' + (', %s by compile()' % ', '.join(fallbacks) if fallbacks else '')))
+
+    return rows
+
+
+def timings(iterations=200000):
+    source = generate(5000)
+    nodes = Parser().parse(source, '<bench>')
+    rows = [
+     (
+      'compile 5000 lines, compile()', measure((lambda : compile(nodes, '<bench>', 'exec')), repeat=3)),
+     (
+      'compile 5000 lines, bytecode', measure((lambda : bytecode.compile_module(nodes, '<bench>')), repeat=3))]
+    for name, script in KERNELS:
+        expected, code, fallbacks = compile_both(script.replace('N', str(iterations)))
+        results = [execute(c) for c in (expected, code)]
+        results = [error or namespace['total'] for output, error, namespace in results]
+        if results[0] != results[1]:
+            raise AssertionError('%s: %r != %r' % (name, results[0], results[1]))
+        plain, direct = [measure((lambda : execute(c)), repeat=3) for c in (expected, code)]
+        rows.append((name, '%8.3f ms -> %8.3f ms  x%.2f' % (
+         plain * 1000, direct * 1000, plain / direct)))
+
+    return rows
+
+
+def main():
+    if not bytecode.supported:
+        print('the bytecode backend requires python 3.11')
+        return
+    report('bytecode backend against compile()', differential())
+    report('compile and run time, compile() -> bytecode', timings())
+
+
+if __name__ == '__main__':
+    main()
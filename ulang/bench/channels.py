@@ -0,0 +1,167 @@
+"""
+Producer/consumer communication between ulang tasks over channels,
+against the shared lists polled with ``delay`` that programs used before,
+for thread tasks and green tasks (``--tasks=async``).
+
+The latency is the time of a round trip between two tasks, the throughput
+the time per value passed through a three stage pipeline. Polling takes
+milliseconds per value, so it runs fewer rounds and values.
+"""
+from ulang.bench import failure, report, run_ulang
+
+PING_PONG = '''
+ping = channel(1)
+pong = channel(1)
+func echo() {
+  for v in ping {
+    pong.send(v)
+  }
+}
+spawn(echo)
+start = time()
+for i in 0..<ROUNDS {
+  ping.send(i)
+  pong.recv()
+}
+println(time() - start)
+ping.close()
+'''
+
+PING_PONG_POLLING = '''
+ping = []
+pong = []
+func echo() {
+  while true {
+    if len(ping) == 0 {
+      delay(1)
+    } else {
+      pong.append(ping.pop())
+    }
+  }
+}
+spawn(echo)
+start = time()
+for i in 0..<ROUNDS {
+  ping.append(i)
+  while len(pong) == 0 {
+    delay(1)
+  }
+  pong.pop()
+}
+println(time() - start)
+'''
+
+PIPELINE = '''
+numbers = channel(CAPACITY)
+squares = channel(CAPACITY)
+func produce() {
+  for i in 0..<ITEMS {
+    numbers.send(i)
+  }
+  numbers.close()
+}
+func square() {
+  for v in numbers {
+    squares.send(v * v)
+  }
+  squares.close()
+}
+start = time()
+spawn(produce)
+spawn(square)
+total = 0
+for v in squares {
+  total += v
+}
+println(time() - start)
+println(total)
+'''
+
+PIPELINE_POLLING = '''
+numbers = []
+squares = []
+func produce() {
+  for i in 0..<ITEMS {
+    while len(numbers) >= CAPACITY {
+      delay(1)
+    }
+    numbers.append(i)
+  }
+}
+func square() {
+  for i in 0..<ITEMS {
+    while len(numbers) == 0 {
+      delay(1)
+    }
+    v = numbers.pop(0)
+    while len(squares) >= CAPACITY {
+      delay(1)
+    }
+    squares.append(v * v)
+  }
+}
+start = time()
+spawn(produce)
+spawn(square)
+total = 0
+for i in 0..<ITEMS {
+  while len(squares) == 0 {
+    delay(1)
+  }
+  total += squares.pop(0)
+}
+println(time() - start)
+println(total)
+'''
+
+
+def run_program(source, mode, check=None, **params):
+    """Return the time printed by the program, or the reason it failed."""
+    for name, value in params.items():
+        source = source.replace(name.upper(), str(value))
+    proc = run_ulang(source, '--tasks=' + mode)
+    lines = proc.stdout.split()
+    if proc.returncode != 0 or not lines:
+        return failure(proc)
+    if check is not None:
+        if lines[1:] != [str(check)]:
+            return failure(proc)
+    return float(lines[0])
+
+
+def latency(mode, rounds=2000, polling_rounds=100):
+    rows = []
+    for name, source, count in (('channel', PING_PONG, rounds),
+     (
+      'polling', PING_PONG_POLLING, polling_rounds)):
+        elapsed = run_program(source, mode, rounds=count)
+        if not isinstance(elapsed, str):
+            elapsed /= count
+        rows.append(('%s %s round trip' % (mode, name), elapsed))
+
+    return rows
+
+
+def throughput(mode, items=20000, polling_items=200, capacities=(1, 64)):
+    rows = []
+    for capacity in capacities:
+        for name, source, count in (('channel', PIPELINE, items),
+         (
+          'polling', PIPELINE_POLLING, polling_items)):
+            check = sum(i * i for i in range(count))
+            elapsed = run_program(source, mode, check, items=count, capacity=capacity)
+            if not isinstance(elapsed, str):
+                elapsed /= count
+            rows.append(('%s %s, capacity %d' % (mode, name, capacity), elapsed))
+
+    return rows
+
+
+def main():
+    for mode in ('thread', 'async'):
+        report('%s tasks, latency per round trip' % mode, latency(mode))
+        report('%s tasks, pipeline time per value' % mode, throughput(mode))
+
+
+if __name__ == '__main__':
+    main()
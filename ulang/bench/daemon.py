@@ -0,0 +1,111 @@
+"""
+Keystroke driven checks through the language service daemon
+(``ulang daemon``) against parsing the whole file again.
+
+A line of code is typed character by character in the middle of a
+generated source, each keystroke sent to a daemon on a temporary socket
+as an edit followed by a check. The same checks are timed with a fresh
+``Parser().parse`` of the whole text, as an editor plugin embedding the
+parser would do, and with a fresh ``ulang --dump-ast`` process. The
+errors and the ast of the daemon must match those of the full parse
+after every keystroke.
+"""
+import ast, os, re, tempfile, threading, time
+from ulang.bench import measure, report, run_ulang
+from ulang.bench.sources import generate
+from ulang.parser.core import Parser
+from ulang.runtime import daemon
+
+TYPED = 'total = (total + 17) * 3 % 1000\n'
+
+# anonymous functions get random names
+ANONYMOUS = re.compile("'[A-Za-z]{20}'")
+
+
+def full_check(text):
+    """Return the first error of a full parse and the dump of its ast."""
+    try:
+        nodes = Parser().parse(text, '<bench>')
+    except Exception as e:
+        return ((e.lineno_, e.message_), None)
+
+    return (None, ANONYMOUS.sub('_', ast.dump(nodes, True, True)))
+
+
+def start_daemon(path):
+    thread = threading.Thread(target=(daemon.serve), args=(path,), daemon=True)
+    thread.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    return thread
+
+
+def keystrokes(source):
+    """Yield the edits typing TYPED in the middle line of source, and the text after each."""
+    offset = source.index('\n', len(source) // 2) + 1
+    text = source
+    for k, char in enumerate(TYPED):
+        text = text[:offset + k] + char + text[offset + k:]
+        yield ({'start':offset + k,  'end':offset + k,  'text':char}, text)
+
+
+def through_daemon(client, source, verify):
+    """Type TYPED through the daemon, return the mean time of a keystroke."""
+    client.call('check', file='<bench>', text=source)
+    elapsed = 0
+    for edit, text in keystrokes(source):
+        start = time.perf_counter()
+        errors = client.call('check', file='<bench>', edits=[edit])
+        elapsed += time.perf_counter() - start
+        if verify:
+            expected, dump = full_check(text)
+            found = (errors[0]['line'], errors[0]['message']) if errors else None
+            if found != expected:
+                raise AssertionError('%r != %r after %r' % (found, expected, edit))
+            if dump is not None:
+                if ANONYMOUS.sub('_', client.call('ast', file='<bench>')) != dump:
+                    raise AssertionError('the ast differs after %r' % edit)
+
+    client.call('close', file='<bench>')
+    return elapsed / len(TYPED)
+
+
+def full_parses(source):
+    elapsed = 0
+    for edit, text in keystrokes(source):
+        start = time.perf_counter()
+        full_check(text)
+        elapsed += time.perf_counter() - start
+
+    return elapsed / len(TYPED)
+
+
+def run(sizes=(200, 2000)):
+    rows = []
+    path = os.path.join(tempfile.mkdtemp(), 'daemon.sock')
+    start_daemon(path)
+    client = daemon.Client(path)
+    try:
+        for size in sizes:
+            source = generate(size)
+            through_daemon(client, source, verify=(size == sizes[0]))
+            incremental = min(through_daemon(client, source, False) for _ in range(3))
+            full = min(full_parses(source) for _ in range(3))
+            rows.append(('%d lines, full parse per key' % size, full))
+            rows.append(('%d lines, daemon per key' % size, '%10.3f ms  x%.1f' % (incremental * 1000, full / incremental)))
+            rows.append(('%d lines, ulang --dump-ast process' % size, measure((lambda : run_ulang(source, '--dump-ast')), repeat=1)))
+
+    finally:
+        client.call('shutdown')
+        client.close()
+
+    return rows
+
+
+def main():
+    report('keystroke checks, full parse -> daemon', run())
+
+
+if __name__ == '__main__':
+    main()
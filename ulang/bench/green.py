@@ -0,0 +1,48 @@
+"""
+Spawning many I/O bound ulang tasks as OS threads (the default) and as
+green tasks on an asyncio event loop (``--tasks=async``). Each mode runs
+in a fresh interpreter since the task mode is fixed for a whole program.
+"""
+import time
+from ulang.bench import failure, report, run_ulang
+
+SOURCE = '''
+done = [0]
+func task(i) {
+  delay(50)
+  done[0] += 1
+}
+for i in 0..<TASKS {
+  spawn(task, i)
+}
+while done[0] < TASKS {
+  delay(5)
+}
+println(done[0])
+'''
+
+
+def run_mode(mode, tasks):
+    start = time.perf_counter()
+    proc = run_ulang(SOURCE.replace('TASKS', str(tasks)), '--tasks=' + mode)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0 or proc.stdout.strip() != str(tasks):
+        return failure(proc)
+    return elapsed
+
+
+def run(counts=(1000, 10000)):
+    rows = []
+    for tasks in counts:
+        for mode in ('thread', 'async'):
+            rows.append(('%s %d tasks' % (mode, tasks), run_mode(mode, tasks)))
+
+    return rows
+
+
+def main():
+    report('spawning sleeping tasks', run())
+
+
+if __name__ == '__main__':
+    main()
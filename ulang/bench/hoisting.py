@@ -0,0 +1,116 @@
+"""
+Cost of hoisting anonymous functions on deeply nested, callback heavy
+sources. ``AnnoFuncInsertPass`` inserts the functions recorded by the
+parser for each statement, ``LegacyAnnoFuncInsertPass`` is the former
+pass searching every statement subtree with ``ast.walk``, whose cost
+grows with the nesting depth. Both must produce the same ast.
+"""
+import ast
+from copy import deepcopy
+from ulang.bench import measure, report
+from ulang.bench.parse import normalized_dump
+from ulang.parser.core import AnnoFuncInsertPass, NameFixPass, Parser
+from ulang.parser.lexer import lexer
+from ulang.runtime.env import create_globals
+
+# anonymous functions using a variable of their function, must stay in it
+CLOSURES = [
+ ('func outer(n) {\n  cb = (v) -> { return v + n }\n  return cb(1)\n}\nresult = outer(5)\n', 6),
+ ('func outer(n) {\n  cb = () -> {\n    return n * 2\n  }\n  return cb()\n}\nresult = outer(5)\n', 10),
+ ('func outer(n) {\n  cb = (v) -> v + n\n  return cb(1)\n}\nresult = outer(5)\n', 6),
+ ('func outer(n) {\n  cb = func(v) { return v + n }\n  return cb(1)\n}\nresult = outer(5)\n', 6)]
+
+
+class LegacyAnnoFuncInsertPass(AnnoFuncInsertPass):
+
+    def visit_stmts(self, stmts):
+        new_stmts = []
+        for stmt in stmts:
+            stmt = self.visit(stmt)
+            for node in ast.walk(stmt):
+                if isinstance(node, ast.Name) and node in self.anonfuncs_:
+                    new_stmts.append(self.anonfuncs_[node])
+                    del self.anonfuncs_[node]
+
+            new_stmts.append(stmt)
+
+        return new_stmts
+
+
+def generate(depth, count=20):
+    """
+    Return a source of count functions, each nesting blocks depth
+    levels deep with a callback passed around at every level.
+    """
+    out = []
+    for i in range(count):
+        out.append('func f%d(x) {' % i)
+        for level in range(depth):
+            indent = '  ' * (level + 1)
+            out.append('%scb%d = func(a) { return a + %d }' % (indent, level, level))
+            out.append('%sx = apply(cb%d, func(b) { return b * x })' % (indent, level))
+            out.append('%sif x > %d {' % (indent, level))
+
+        for level in reversed(range(depth)):
+            out.append('%s}' % ('  ' * (level + 1)))
+
+        out.append('  return x')
+        out.append('}')
+
+    return '\n'.join(out) + '\n'
+
+
+def raw_parse(source):
+    """Parse without running the passes, return the module and the hoisted functions."""
+    parser = Parser()
+    parser.source_ = source.split('\n')
+    module = parser.lrparser().parse(lexer.lex(source), state=parser)
+    return module, parser.hoisted_
+
+
+def legacy_anonfuncs(module, hoisted):
+    funcs = {func.name: func for funcs in hoisted.values() for func in funcs}
+    return {node: funcs[node.id] for node in ast.walk(module) if isinstance(node, ast.Name) if node.id in funcs}
+
+
+def check_closures():
+    for source, expected in CLOSURES:
+        namespace = create_globals(fname='<bench>')
+        exec(compile(Parser().parse(source, '<bench>'), '<bench>', 'exec'), namespace)
+        if namespace['result'] != expected:
+            raise AssertionError('closure lost by hoisting: %r' % source)
+
+
+def run(depths=(2, 8, 32, 64), number=5):
+    check_closures()
+    rows = []
+    for depth in depths:
+        module, hoisted = raw_parse(generate(depth))
+        dumps = []
+        for name in ('recorded', 'legacy'):
+            trees = [deepcopy((module, hoisted)) for _ in range(number)]
+            if name == 'legacy':
+                trees = [(tree, legacy_anonfuncs(tree, funcs)) for tree, funcs in trees]
+                cls = LegacyAnnoFuncInsertPass
+            else:
+                cls = AnnoFuncInsertPass
+
+            def hoist():
+                tree, funcs = trees.pop()
+                return cls(funcs).visit(tree)
+
+            dumps.append(normalized_dump(NameFixPass('<bench>').visit(hoist())))
+            rows.append(('%s depth %d' % (name, depth), measure(hoist, repeat=(number - 1))))
+
+        if dumps[0] != dumps[1]:
+            raise AssertionError('passes disagree at depth %d' % depth)
+
+    return rows
+
+
+def main():
+    report('anonymous function hoisting', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Import heavy programs: every module of a generated project imports a
+shared utility module, the previous module and a few python modules, and
+the main program imports all of them.
+
+``legacy_import`` is the former ``__import__`` of ulang, which tried to load
+a ulang module relative to the current directory before every python import
+and ran a module again, in a fresh copy of all builtins, each time it was
+imported. The importer of ``ulang.runtime.importer`` runs every module once.
+"""
+import os, shutil, sys, tempfile
+from types import ModuleType
+from ulang.bench import measure, report
+from ulang.parser.core import Parser
+from ulang.runtime import env, importer
+
+MODULE = '''
+using util
+using math, json, os
+PREVIOUS
+func value_NUMBER(x) {
+  return util.scale(x) + math.floor(NUMBER / 2)
+}
+'''
+
+UTIL = '''
+factor = 3
+func scale(x) {
+  return x * factor
+}
+'''
+
+
+def write_project(directory, count):
+    with open(os.path.join(directory, 'util.ul'), 'w') as (f):
+        f.write(UTIL)
+    for i in range(count):
+        previous = 'using mod%d' % (i - 1) if i else ''
+        with open(os.path.join(directory, 'mod%d.ul' % i), 'w') as (f):
+            f.write(MODULE.replace('PREVIOUS', previous).replace('NUMBER', str(i)))
+
+    main = ['using mod%d' % i for i in range(count)]
+    main.append('total = 0')
+    main.extend('total += mod%d.value_%d(%d)' % (i, i, i) for i in range(count))
+    return '\n'.join(main) + '\n'
+
+
+def legacy_load(name, globals, fromlist=(), level=0):
+    path = name.replace('.', '/') + '.ul'
+    code = env.parse_and_compile(path)
+    modules = []
+    tail = name
+    index = 0
+    while index != -1:
+        index = tail.find('.')
+        head, tail = tail[:index], tail[index + 1:]
+        if index == -1:
+            head = tail
+            module = ModuleType(head)
+            module.__dict__.update(legacy_globals())
+            module.__dict__['__file__'] = os.path.abspath(path)
+            exec(code, module.__dict__)
+        else:
+            module = ModuleType(head)
+        if modules:
+            modules[(-1)].__dict__[head] = module
+        modules.append(module)
+
+    return modules[0]
+
+
+def legacy_import(name, globals=None, locals=None, fromlist=(), level=0):
+    try:
+        return legacy_load(name, globals, fromlist, level)
+    except:
+        return __import__(name, globals, locals, fromlist, level)
+
+
+def legacy_globals():
+    """A copy of all builtins in the module namespace, as create_globals made."""
+    builtins = dict(env.create_globals()['__builtins__'])
+    builtins['__import__'] = legacy_import
+    namespace = dict(builtins)
+    namespace['__builtins__'] = builtins
+    return namespace
+
+
+def forget(count):
+    for name in ['util'] + ['mod%d' % i for i in range(count)]:
+        sys.modules.pop(importer.PREFIX + '.' + name, None)
+
+
+def run(counts=(10, 30, 60)):
+    rows = []
+    cwd = os.getcwd()
+    directory = tempfile.mkdtemp()
+    try:
+        os.chdir(directory)
+        for count in counts:
+            code = compile(Parser().parse(write_project(directory, count), 'main.ul'), 'main.ul', 'exec')
+            results = []
+
+            def legacy():
+                namespace = legacy_globals()
+                exec(code, namespace)
+                results.append(namespace['total'])
+
+            def imported():
+                forget(count)
+                namespace = env.create_globals(fname=(os.path.join(directory, 'main.ul')))
+                exec(code, namespace)
+                results.append(namespace['total'])
+
+            legacy_time = measure(legacy, repeat=3)
+            importer_time = measure(imported, repeat=3)
+            if len(set(results)) != 1:
+                rows.append(('%d modules' % count, 'failed: results differ'))
+                continue
+            rows.append(('%d modules, legacy' % count, legacy_time))
+            rows.append(('%d modules, importer' % count, importer_time))
+
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+        forget(max(counts))
+
+    return rows
+
+
+def main():
+    report('importing a project of ulang modules', run())
+
+
+if __name__ == '__main__':
+    main()
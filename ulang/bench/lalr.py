@@ -0,0 +1,52 @@
+"""
+Generation of the LALR table of the µlang grammar, as done after each
+change of the grammar: ``LRTable.from_grammar`` against the one of rply
+it replaces. rply numbers the states in the order of a set of symbol
+names, so both are run in this process, under the same hash seed, and
+their json cache and binary table must be byte for byte the same.
+"""
+import json
+from rply.parsergenerator import LRTable as RplyLRTable
+from ulang.bench import measure, report
+from ulang.parser.core import Parser
+from ulang.parser.parsergenerator import LRTable, MappedLRTable
+
+
+def rply_table():
+    g = Parser.pg_.build_grammar()
+    g.build_lritems()
+    g.compute_first()
+    g.compute_follow()
+    return RplyLRTable.from_grammar(g)
+
+
+def ulang_table():
+    return LRTable.from_grammar(Parser.pg_.build_grammar())
+
+
+def dumps(table):
+    pg = Parser.pg_
+    return (json.dumps(pg.serialize_table(table)).encode('utf-8'), MappedLRTable.serialize(table, pg.grammar_hash))
+
+
+def run(repeat=3):
+    pg = Parser.pg_
+    pg.grammar_hash = pg.compute_grammar_hash(pg.build_grammar())
+    expected, table = rply_table(), ulang_table()
+    if dumps(expected) != dumps(table):
+        raise AssertionError('the tables differ')
+    before = measure(rply_table, repeat)
+    after = measure(ulang_table, repeat)
+    return [
+     (
+      '%d states, rply' % len(table.lr_action), before),
+     (
+      '%d states, ulang' % len(table.lr_action), '%10.3f ms  x%.1f' % (after * 1000, before / after))]
+
+
+def main():
+    report('LALR table generation, same tables', run())
+
+
+if __name__ == '__main__':
+    main()
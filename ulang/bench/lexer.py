@@ -0,0 +1,43 @@
+"""
+Lexing throughput of the master regex lexer against the rply one,
+on generated sources. Both must yield the same token stream.
+"""
+import io
+from ulang.bench import measure, report
+from ulang.bench.sources import generate
+from ulang.parser.lexer import lexer, rply_lexer
+
+
+def token_stream(tokens):
+    return [(t.name, t.value, t.getsourcepos().idx, t.getsourcepos().lineno, t.getsourcepos().colno) for t in tokens]
+
+
+def run(sizes=(1000, 10000, 50000), repeat=3):
+    rows = []
+    for lines in sizes:
+        source = generate(lines)
+        expected = token_stream(rply_lexer.lex(source))
+        if token_stream(lexer.lex(source)) != expected:
+            raise AssertionError('token streams differ on %d lines' % lines)
+        if token_stream(lexer.lex_file(io.StringIO(source), 4096)) != expected:
+            raise AssertionError('chunked token streams differ on %d lines' % lines)
+        for name, func in (
+         (
+          'rply', lambda : sum(1 for _ in rply_lexer.lex(source))),
+         (
+          'master regex', lambda : sum(1 for _ in lexer.lex(source))),
+         (
+          'master regex, 4k chunks', lambda : sum(1 for _ in lexer.lex_file(io.StringIO(source), 4096)))):
+            seconds = measure(func, repeat)
+            rows.append(('%s %d lines' % (name, lines),
+             '%8.3f s %10.0f tokens/s' % (seconds, len(expected) / seconds)))
+
+    return rows
+
+
+def main():
+    report('lexer throughput', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Microbenchmarks of loop heavy scripts compiled with and without the
+ast optimiser (``ulang -O``). Both builds must compute the same values.
+"""
+from ulang.bench import measure, report
+from ulang.parser import optimizer
+from ulang.parser.core import Parser
+from ulang.runtime.env import create_globals
+
+SCRIPTS = [
+ ('div/rem of counters', 'total = 0\nfor i in 1..N {\n  total += i / 7 + i % 3\n}\n'),
+ ('float division', 'total = 0\nfor i in 1..N {\n  total += i / 2.0 + i % 1.5\n}\n'),
+ ('constant expressions', 'total = 0\nfor i in 1..N {\n  total += (60 * 60 * 24) / 1000 + 2 ^ 10 - 3 % 2\n}\n'),
+ ('nested ranges by step', 'total = 0\nfor i in 1..N / 100 {\n  for j in 100..1 by -1 {\n    total += j % 10\n  }\n}\n'),
+ ('int division above 2 ^ 53', 'total = 0\nfor i in 1..N {\n  total = (9007199254740993 + 2 * i) / 1\n}\n'),
+ ('untyped /= (unchanged)', 'total = 0\nfor i in 1..N {\n  x = i * 8\n  for k in 0..2 {\n    x /= 2\n  }\n  total += x\n}\n')]
+
+
+def compile_script(source, optimize):
+    nodes = Parser().parse(source, '<bench>')
+    if optimize:
+        nodes = optimizer.optimize(nodes)
+    return compile(nodes, '<bench>', 'exec')
+
+
+def execute(code):
+    namespace = create_globals(fname='<bench>')
+    exec(code, namespace)
+    return namespace['total']
+
+
+def run(iterations=200000):
+    rows = []
+    for name, script in SCRIPTS:
+        source = script.replace('N', str(iterations))
+        codes = [compile_script(source, optimize) for optimize in (False, True)]
+        results = [execute(code) for code in codes]
+        if results[0] != results[1]:
+            raise AssertionError('%s: %r != %r' % (name, results[0], results[1]))
+        plain, optimized = [measure((lambda : execute(code)), repeat=3) for code in codes]
+        rows.append(('%s' % name, '%8.3f ms -> %8.3f ms  x%.2f' % (
+         plain * 1000, optimized * 1000, plain / optimized)))
+
+    return rows
+
+
+def main():
+    report('ast optimiser', run())
+
+
+if __name__ == '__main__':
+    main()
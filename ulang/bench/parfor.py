@@ -0,0 +1,73 @@
+"""
+Scaling of ``par for`` loops with the pool and the number of workers,
+against the same loop run sequentially by a plain ``for``.
+
+    python -m ulang.bench.parfor [workers ...]
+
+The bodies either compute, which only a process pool runs in parallel,
+or wait, which the threads of a thread pool do at the same time. Every
+version of a loop must reduce the same result as the sequential one,
+exactly, floats included. The speedup of the computing loops is bounded
+by the number of cpus, printed first.
+"""
+import os, sys
+from ulang.bench import measure, report
+from ulang.parser.core import Parser
+from ulang.runtime.env import create_globals
+
+FUNCTIONS = 'func work(n) {\n  s = 0\n  for i in 0..<n {\n    s += i * i % 7\n  }\n  return s\n}\n'
+
+# name, items, body updating result from x
+LOOPS = [
+ ('computing', '0..<64', 'result += work(20000 + x)'),
+ ('computing floats', '0..<64', 'result += 1.0 / (work(20000 + x) + 1)'),
+ ('waiting', '0..<64', 'sleep(0.005)\n  result += x'),
+ ('two operators on one name', '0..<64', 'result *= 3\n  result -= x')]
+
+POOLS = ('thread', 'process')
+
+
+def program(items, body, pragma=None):
+    loop = 'for' if pragma is None else 'par(%s) for' % pragma
+    return '%sresult = 0\n%s x in %s {\n  %s\n}\n' % (FUNCTIONS, loop, items, body)
+
+
+def compiled(source):
+    code = compile(Parser().parse(source, '<bench>'), '<bench>', 'exec')
+    namespace = create_globals(fname='<bench>')
+
+    def run():
+        exec(code, namespace)
+        return namespace['result']
+
+    return run
+
+
+def run(workers=(1, 2, 4)):
+    rows = [('cpus', '%10d' % (os.cpu_count() or 1))]
+    for name, items, body in LOOPS:
+        sequential = compiled(program(items, body))
+        expected = sequential()
+        seconds = measure(sequential, repeat=3)
+        rows.append(('%s, for' % name, '%10.3f ms' % (seconds * 1000)))
+        for pool in POOLS:
+            for count in workers:
+                loop = compiled(program(items, body, '%s, %d' % (pool, count)))
+                label = '%s, %s x %d' % (name, pool, count)
+                # the first run starts the pool
+                if loop() != expected:
+                    rows.append((label, 'failed: the result differs from the for loop'))
+                    continue
+                parallel = measure(loop, repeat=3)
+                rows.append((label, '%10.3f ms  x%.2f' % (parallel * 1000, seconds / parallel)))
+
+    return rows
+
+
+def main():
+    workers = tuple(int(arg) for arg in sys.argv[1:]) or (1, 2, 4)
+    report('par for loops, speedup over a for loop', run(workers))
+
+
+if __name__ == '__main__':
+    main()
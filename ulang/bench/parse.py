@@ -0,0 +1,72 @@
+"""
+Throughput of the µlang LR drivers on pre-lexed generated sources,
+comparing the array based driver against the reference dict based one.
+Both drivers must produce the same ast.
+"""
+import ast, re, time
+from ulang.bench import report
+from ulang.bench.sources import generate
+from ulang.parser.core import Parser
+from ulang.parser.lexer import lexer
+from ulang.parser.lrparser import ArrayLRParser
+
+ANON_NAME = re.compile("'[A-Za-z]{20}'")
+
+
+def normalized_dump(node):
+    """ast.dump with the random names of anonymous functions renumbered."""
+    names = {}
+    return ANON_NAME.sub(lambda m: names.setdefault(m.group(0), "'anon%d'" % len(names)), ast.dump(node))
+
+
+def count_reductions(source):
+    Parser.build_parser()
+    counter = ArrayLRParser(Parser.reference_parser_)
+    count = [0]
+
+    def counted(func):
+
+        def wrapper(*args):
+            count[0] += 1
+            return func(*args)
+
+        return wrapper
+
+    counter.prod_func = [counted(f) for f in counter.prod_func]
+    parser = Parser()
+    parser.parser_ = counter
+    parser.parse(source, '<bench>')
+    return count[0]
+
+
+def run(sizes=(1000, 5000, 20000)):
+    rows = []
+    for lines in sizes:
+        source = generate(lines)
+        tokens = list(lexer.lex(source))
+        reductions = count_reductions(source)
+        dumps = []
+        for name, reference in (('array', False), ('reference', True)):
+            parser = Parser(reference=reference)
+            dumps.append(normalized_dump(parser.parse(source, '<bench>')))
+            driver = parser.reference_parser_ if reference else parser.parser_
+            parser.source_ = source.split('\n')
+            start = time.perf_counter()
+            driver.parse(iter(tokens), state=parser)
+            elapsed = time.perf_counter() - start
+            rows.append(('%s %d lines' % (name, lines),
+             '%8.3f s %10.0f tokens/s %10.0f reductions/s' % (
+              elapsed, len(tokens) / elapsed, reductions / elapsed)))
+
+        if dumps[0] != dumps[1]:
+            raise AssertionError('drivers disagree on %d lines' % lines)
+
+    return rows
+
+
+def main():
+    report('parse throughput', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Scaling of a numeric ulang workload over worker processes with ``pmap``,
+against the plain serial ``map`` on the main thread.
+"""
+import os
+from ulang.bench import measure, report
+from ulang.parser.core import Parser
+from ulang.runtime import processes
+from ulang.runtime.env import create_globals
+
+SOURCE = '''
+func collatz(n) {
+  steps = 0
+  for i in 1..n {
+    x = i
+    while x != 1 {
+      x = x % 2 == 0 ? x / 2 : 3 * x + 1
+      steps += 1
+    }
+  }
+  return steps
+}
+'''
+
+# the workers must see a global reassigned between two calls
+GLOBALS = 'scale = 10\nfunc scaled(x) {\n  return scale * x * x\n}\n'
+
+
+def check_globals():
+    namespace = create_globals(fname='<bench>')
+    exec(compile(Parser().parse(GLOBALS, '<bench>'), '<bench>', 'exec'), namespace)
+    scaled = namespace['scaled']
+    for scale in (10, 100):
+        exec(compile(Parser().parse('scale = %d' % scale, '<bench>'), '<bench>', 'exec'), namespace)
+        if processes.pmap(scaled, [1, 2, 3]) != [scale, 4 * scale, 9 * scale]:
+            raise AssertionError('pmap uses stale globals')
+        if processes.spawn_process(scaled, 4).result() != 16 * scale:
+            raise AssertionError('spawn_process uses stale globals')
+
+
+def run(items=32, n=1500):
+    check_globals()
+    namespace = create_globals(fname='<bench>')
+    exec(compile(Parser().parse(SOURCE, '<bench>'), '<bench>', 'exec'), namespace)
+    collatz = namespace['collatz']
+    work = [n] * items
+    expected = list(map(collatz, work))
+    serial = measure((lambda : list(map(collatz, work))), repeat=3)
+    rows = [('serial map', serial)]
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        if processes.pmap(collatz, work, workers) != expected:
+            raise AssertionError('pmap with %d workers disagrees' % workers)
+        seconds = measure((lambda : processes.pmap(collatz, work, workers)), repeat=3)
+        rows.append(('pmap %d workers' % workers, '%10.3f ms  x%.2f' % (seconds * 1000, serial / seconds)))
+        workers *= 2
+
+    return rows
+
+
+def main():
+    report('pmap scaling', run())
+
+
+if __name__ == '__main__':
+    main()
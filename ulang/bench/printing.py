@@ -0,0 +1,87 @@
+"""
+Printing big containers with ``print``: the streaming printer of
+``ulang.runtime.printer`` against the former ``local_str``, which built the
+text of every nested container by concatenation before writing it. The
+output goes to a null device, both must produce the same text.
+"""
+import os
+from ulang.bench import measure, report
+from ulang.runtime import printer
+
+
+def legacy_str(x):
+
+    def container_to_str(c, start='', end='', ptr=None):
+        _str = start
+        for i, item in enumerate(c):
+            if i:
+                _str += ', '
+            if ptr is None:
+                _str += legacy_str(item)
+            else:
+                _str += ptr(c, item)
+
+        _str += end
+        return _str
+
+    if x is None:
+        return 'nil'
+    if isinstance(x, bool):
+        if x:
+            return 'true'
+        return 'false'
+    if isinstance(x, list):
+        return container_to_str(x, '[', ']')
+    if isinstance(x, tuple):
+        return container_to_str(x)
+    if isinstance(x, dict):
+        return container_to_str(x, '{', '}', lambda c, k: '%s: %s' % (k, c[k]))
+    if isinstance(x, set):
+        return container_to_str(x, '{', '}')
+    return str(x)
+
+
+def legacy_print(obj, file):
+    file.write(legacy_str(obj))
+
+
+def structures(size):
+    """Return (name, value) pairs of containers with about size items."""
+    side = int(size ** 0.5)
+    return [
+     (
+      'flat list of %d' % size, list(range(size))),
+     (
+      'nested %dx%d lists' % (side, side), [[j for j in range(side)] for i in range(side)]),
+     (
+      'dict of %d lists' % side, {'k%d' % i: [i, 2, 1.5] * (side // 3) for i in range(side)}),
+     (
+      'list of %d deep pairs' % (size // 100), [[[[i, [i + 1]]]] for i in range(size // 100)])]
+
+
+def run(sizes=(100000, 1000000, 4000000), number=1):
+    rows = []
+    with open(os.devnull, 'w') as (devnull):
+        for size in sizes:
+            for name, value in structures(size):
+                if size <= 1000000:
+                    if legacy_str(value) != printer.to_str(value):
+                        rows.append((name, 'failed: outputs differ'))
+                        continue
+                    rows.append((name + ', legacy',
+                     measure((lambda: legacy_print(value, devnull)), repeat=3, number=number)))
+                rows.append((name + ', streaming',
+                 measure((lambda: printer.print_values((value,), file=devnull)), repeat=3, number=number)))
+
+        limited = list(range(max(sizes)))
+        rows.append(('flat list of %d, limit=10' % len(limited),
+         measure((lambda: printer.print_values((limited,), file=devnull, limit=10)), number=100)))
+    return rows
+
+
+def main():
+    report('printing big containers', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Overhead of ``ulang --profile``: the run time of programs under the
+sampling profiler against a plain run, and the function found the
+hottest, which must be the expected one.
+"""
+import contextlib, io
+from ulang.bench import measure, report
+from ulang.parser.core import Parser
+from ulang.runtime import profiler
+from ulang.runtime.env import create_globals
+
+PROGRAMS = [
+ ('recursive calls', 'fib', 'func fib(n) {\n  if n < 2 {\n    return n\n  }\n  return fib(n - 1) + fib(n - 2)\n}\nfunc main() {\n  println(fib(25))\n}\nmain()\n'),
+ ('loop with builtins', 'kernel', 'func kernel(n) {\n  t = 0\n  for i in 1..n {\n    t += i / 3 + i % 7\n  }\n  return t\n}\nfunc main() {\n  println(kernel(300000))\n}\nmain()\n'),
+ ('lambdas and types', 'Point.norm2', 'type Point {\n  func $Point(x, y) {\n    $x = x\n    $y = y\n  }\n  func $norm2() {\n    s = 0\n    for k in 1..20 {\n      s += $x * k + $y\n    }\n    return s\n  }\n}\nfunc main() {\n  sq = (p) -> p.norm2()\n  t = 0\n  for i in 1..50000 {\n    t += sq(Point(i, i))\n  }\n  println(t)\n}\nmain()\n')]
+
+
+def execute(code):
+    with contextlib.redirect_stdout(io.StringIO()):
+        exec(code, create_globals(fname='<bench>.ul'))
+
+
+def hottest(code):
+    """Return the function with the most self time."""
+    sampler = profiler.Sampler()
+    sampler.start()
+    try:
+        execute(code)
+    finally:
+        sampler.stop()
+
+    profile = profiler.Profile(sampler.stacks)
+    return max((profile.functions), key=(profile.functions.get))[1]
+
+
+def run():
+    rows = []
+    for name, expected, source in PROGRAMS:
+        code = compile(Parser().parse(source, '<bench>.ul'), '<bench>.ul', 'exec')
+        found = hottest(code)
+        if found != expected:
+            raise AssertionError('%s: the hottest function is %s, not %s' % (name, found, expected))
+        plain = measure((lambda : execute(code)), repeat=3)
+        profiled = measure((lambda : hottest(code)), repeat=3)
+        rows.append((name, '%8.3f ms -> %8.3f ms  %+.1f%%, hottest %s' % (
+         plain * 1000, profiled * 1000, (profiled / plain - 1) * 100, found)))
+
+    return rows
+
+
+def main():
+    report('plain run -> under the profiler', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Pasting blocks of code into the REPL, line by line as a terminal sends
+them, against the previous REPL which lexed the whole pending input
+again after each line and parsed a complete one up to twice, as an
+expression and then as statements.
+
+A generated source is pasted as is, a sequence of short statements, and
+wrapped into a single function, a block the REPL only parses once its
+last line arrived. Both REPLs must leave the same globals.
+"""
+import contextlib, io, re, sys
+from ulang.bench import measure, report
+from ulang.bench.sources import generate
+from ulang.parser.lexer import lexer
+from ulang.runtime import repl
+from ulang.runtime.env import create_globals
+
+# anonymous functions get random names
+ANONYMOUS = re.compile('[A-Za-z]{20}$')
+
+KEYWORDS = {'FUNC', 'OPERATOR', 'ATTR', 'TYPE', 'FOR', 'LOOP', 'WHILE',
+ 'IF', 'ELIF', 'ELSE', 'TRY', 'CATCH', 'FINALLY'}
+
+
+def relexed_is_close(source):
+    """The completeness check of the previous REPL: braces and keywords."""
+    depth = 0
+    unclosed = 0
+    for token in lexer.lex(source):
+        kind = token.gettokentype()
+        if kind in KEYWORDS:
+            unclosed += 1
+        elif kind == 'LBRACE':
+            depth += 1
+        elif kind == 'RBRACE':
+            depth -= 1
+            unclosed = max(unclosed - 1, 0)
+
+    return depth == 0 and (unclosed == 0 or source.rstrip('\n').endswith(';'))
+
+
+class Relexing(repl.Repl):
+    __doc__ = '\n    The previous REPL, lexing and parsing text.\n    '
+    stmt = ''
+
+    def default(self, line):
+        self.stmt += line + '\n'
+        if not relexed_is_close(self.stmt):
+            return
+        source, self.stmt = self.stmt, ''
+        try:
+            nodes = self.parser.parse('___=(%s);__print__(___)' % source, '<STDIN>')
+        except Exception:
+            nodes = self.parser.parse(source, '<STDIN>')
+
+        try:
+            exec(compile(nodes, '<STDIN>', 'exec'), self.globals, self.locals)
+        except Exception as e:
+            sys.stderr.write('%s: %s\n' % (e.__class__.__name__, str(e)))
+
+    def onecmd(self, line):
+        self.default(line)
+
+
+def paste(cls, source):
+    """Feed source to a fresh REPL of class cls, return its globals."""
+    shell = cls(globals=(create_globals(fname='<STDIN>')))
+    # the generated statements use undefined names, the errors are ignored
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        for line in source.split('\n'):
+            shell.onecmd(line)
+
+    return shell.globals
+
+
+def names(namespace):
+    return sorted(name for name in namespace if name != '___' if not ANONYMOUS.match(name))
+
+
+def run(sizes=(100, 500)):
+    rows = []
+    for size in sizes:
+        source = generate(size)
+        block = 'func pasted() {\n%s}\n' % source
+        for name, text in (('statements', source), ('one block', block)):
+            if names(paste(Relexing, text)) != names(paste(repl.Repl, text)):
+                raise AssertionError('%s of %d lines: the globals differ' % (name, size))
+            old = measure((lambda : paste(Relexing, text)), repeat=3)
+            new = measure((lambda : paste(repl.Repl, text)), repeat=3)
+            rows.append(('%d lines, %s' % (size, name), '%10.3f ms -> %8.3f ms  x%.1f' % (
+             old * 1000, new * 1000, old / new)))
+
+    return rows
+
+
+def main():
+    report('pasting into the REPL, relexing -> incremental', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Record heavy programs with the automatic ``__slots__`` of types and
+without them (``ulang --no-slots``): the memory held by the records a
+program creates, traced with ``tracemalloc``, and the time of loops
+reading and writing their fields.
+"""
+import tracemalloc
+from ulang.bench import measure, report
+from ulang.parser import slots
+from ulang.parser.core import Parser
+from ulang.runtime.env import create_globals
+
+RECORDS = 'type Point {\n  func $Point(x, y) {\n    $x = x\n    $y = y\n  }\n}\ntype Point3 : Point {\n  func $Point3(x, y, z) {\n    super(x, y)\n    $z = z\n  }\n}\ntype Entry {\n  func $Entry(key, value, next) {\n    $key = key\n    $value = value\n    $next = next\n    $hits = 0\n  }\n}\ntype Tagged : int {\n  func $Tagged(v) {\n    $tag = 1\n  }\n}\n'
+
+ALLOCATE = [
+ ('points', 'records = []\nfor i in 1..N {\n  records.append(Point(i, i))\n}\n'),
+ ('points of a subtype', 'records = []\nfor i in 1..N {\n  records.append(Point3(i, i, i))\n}\n'),
+ ('linked entries', 'records = nil\nfor i in 1..N {\n  records = Entry(i, i, records)\n}\n')]
+
+ACCESS = [
+ ('read fields', 'p = Point(1, 2)\ntotal = 0\nfor i in 1..N {\n  total += p.x + p.y\n}\n'),
+ ('write fields', 'p = Point(1, 2)\nfor i in 1..N {\n  p.x = i\n  p.y = p.x\n}\ntotal = p.y\n'),
+ ('subtype of int', 't = Tagged(5)\ntotal = 0\nfor i in 1..N {\n  total += t + t.tag\n}\n'),
+ ('walk a list', 'head = nil\nfor i in 1..1000 {\n  head = Entry(i, i, head)\n}\ntotal = 0\nfor k in 1..N / 1000 {\n  e = head\n  while e !== nil {\n    e.hits += 1\n    total += e.value\n    e = e.next\n  }\n}\n')]
+
+
+def compile_script(source, slotted):
+    enabled = slots.enabled
+    slots.enabled = slotted
+    try:
+        nodes = Parser().parse(RECORDS + source, '<bench>')
+    finally:
+        slots.enabled = enabled
+
+    return compile(nodes, '<bench>', 'exec')
+
+
+def execute(code):
+    namespace = create_globals(fname='<bench>')
+    exec(code, namespace)
+    return namespace
+
+
+def allocated(code):
+    """Return the bytes still allocated after running code, and the namespace."""
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        namespace = execute(code)
+        return (tracemalloc.get_traced_memory()[0] - start, namespace)
+    finally:
+        tracemalloc.stop()
+
+
+def run(records=100000, iterations=500000):
+    rows = []
+    for name, script in ALLOCATE:
+        codes = [compile_script(script.replace('N', str(records)), slotted) for slotted in (False, True)]
+        plain, slotted = [allocated(code)[0] for code in codes]
+        rows.append(('%s, %d records' % (name, records), '%8.1f MB -> %8.1f MB  x%.2f' % (
+         plain / 1000000.0, slotted / 1000000.0, plain / slotted)))
+
+    for name, script in ACCESS:
+        codes = [compile_script(script.replace('N', str(iterations)), slotted) for slotted in (False, True)]
+        results = [execute(code)['total'] for code in codes]
+        if results[0] != results[1]:
+            raise AssertionError('%s: %r != %r' % (name, results[0], results[1]))
+        plain, slotted = [measure((lambda : execute(code)), repeat=3) for code in codes]
+        rows.append((name, '%8.3f ms -> %8.3f ms  x%.2f' % (
+         plain * 1000, slotted * 1000, plain / slotted)))
+
+    return rows
+
+
+def main():
+    report('types without and with __slots__', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Generators of synthetic µlang sources for the benchmarks.
+"""
+
+SNIPPETS = [
+ 'a{i} = {i} * 3 + (b - 2) / 7 % 5',
+ 'name{i} = "item {i}"',
+ 'xs{i} = [1, 2.5, 0x1f, "s", nil, true, false]',
+ 'd{i} = {{"k": {i}, "v": [1, 2, 3]}}',
+ 'if a{i} > 10 {{\n  a{i} -= 1\n}} elif a{i} < 0 {{\n  a{i} = 0\n}} else {{\n  a{i} += 1\n}}',
+ 'for j in 0..{i} by 2 {{\n  total = total + j\n}}',
+ 'while total < {i} {{\n  total += 1\n  if total == 3 {{ break }}\n}}',
+ 'func f{i}(x, y) {{\n  return x * y + {i}\n}}',
+ 'g{i} = (x) -> x + {i}',
+ 'h{i} = func(x) {{\n  return x - {i}\n}}',
+ 'println(f{i}(1, 2), g{i}(3), xs{i}[1:2], d{i}["k"])',
+ 'type T{i} {{\n  func $T{i}(v) {{\n    $v = v\n  }}\n  func get() {{\n    return $v\n  }}\n}}',
+ 'try {{\n  throw Exception("e{i}")\n}} catch e {{\n  println(e)\n}}',
+ 'r{i} = a{i} > 0 ? "pos" : "neg"']
+
+
+def generate(lines):
+    """
+    Return a valid µlang source of about the given number of lines,
+    cycling through a mix of statements.
+    """
+    out = ['total = 0', 'b = 1']
+    count = 2
+    i = 0
+    while count < lines:
+        snippet = SNIPPETS[i % len(SNIPPETS)].format(i=i)
+        out.append(snippet)
+        count += snippet.count('\n') + 1
+        i += 1
+
+    return '\n'.join(out) + '\n'
@@ -0,0 +1,100 @@
+"""
+Cost of string interpolation, at parse time and at run time.
+
+The current parser compiles `\\(expr\\)` and `` `expr` `` into f-string
+asts through ``Parser.parse_expr``. ``LegacyParser`` keeps the former
+approach, a new ``Parser`` per interpolation and `%` formatting of
+``str()`` calls, as the baseline.
+"""
+import ast, time
+from ulang.bench import measure, report
+from ulang.parser.core import FORMAT_PATTERN, Parser
+from ulang.runtime.env import create_globals
+
+TEMPLATES = [
+ 's{i} = "item `{i}` of `n`: \\(n * 2\\) left"',
+ "t{i} = 'name=`names[{i} % 3]` size=`len(names)` ok=`n > {i}`'",
+ 'u{i} = "no interpolation in line {i}"',
+ 'v{i} = "`n` `n + 1` `n + 2` `n + 3`"']
+
+LOOP = '\nfor i in 0..ITERATIONS {\n  a = "item `i` of `n`: \\(i * 2\\) left"\n  b = \'x=`i` y=`n - i` z=`names[i % 3]`\'\n}\n'
+
+
+class LegacyParser(Parser):
+
+    def parse_format_str(self, string, p):
+        format_string = string
+        exprs = []
+        pos = 0
+        while True:
+            match = FORMAT_PATTERN.search(string=string,
+              pos=pos)
+            if match is None:
+                break
+            pos = match.span()[1]
+            expr = match.group(1)
+            if expr is None:
+                expr = match.group(2)
+            submo = Parser().parse('str(%s)' % expr)
+            exprs.append(submo.body[0].value)
+            format_string = format_string.replace(match.group(0), '%s')
+
+        if len(exprs) == 0:
+            return
+        return ast.BinOp(left=ast.Str(s=format_string,
+          lineno=(self.getlineno(p)),
+          col_offset=(self.getcolno(p))),
+          op=(ast.Mod()),
+          right=ast.Tuple(elts=exprs,
+          ctx=(ast.Load()),
+          lineno=(self.getlineno(p)),
+          col_offset=(self.getcolno(p))),
+          lineno=(self.getlineno(p)),
+          col_offset=(self.getcolno(p)))
+
+
+def generate(lines):
+    """Return a source of the given number of lines full of templated strings."""
+    out = ['n = 7', 'names = ["a", "b", "c"]']
+    for i in range(lines - len(out)):
+        out.append(TEMPLATES[i % len(TEMPLATES)].format(i=i))
+
+    return '\n'.join(out) + '\n'
+
+
+def run_parse(sizes=(1000, 5000)):
+    rows = []
+    for lines in sizes:
+        source = generate(lines)
+        results = []
+        for name, cls in (('joinedstr', Parser), ('legacy', LegacyParser)):
+            seconds = measure((lambda : cls().parse(source, '<bench>')), repeat=3)
+            module = cls().parse(source, '<bench>')
+            namespace = create_globals(fname='<bench>')
+            exec(compile(module, '<bench>', 'exec'), namespace)
+            results.append({k:v for k, v in namespace.items() if k[0] in 'stuv' if k[1:].isdigit()})
+            rows.append(('parse %s %d lines' % (name, lines), seconds))
+
+        if results[0] != results[1]:
+            raise AssertionError('parsers disagree on %d lines' % lines)
+
+    return rows
+
+
+def run_eval(iterations=200000):
+    rows = []
+    source = 'n = 7\nnames = ["a", "b", "c"]' + LOOP.replace('ITERATIONS', str(iterations))
+    for name, cls in (('joinedstr', Parser), ('legacy', LegacyParser)):
+        code = compile(cls().parse(source, '<bench>'), '<bench>', 'exec')
+        seconds = measure((lambda : exec(code, create_globals(fname='<bench>'))), repeat=3)
+        rows.append(('run %s %d iterations' % (name, iterations), seconds))
+
+    return rows
+
+
+def main():
+    report('string interpolation', run_parse() + run_eval())
+
+
+if __name__ == '__main__':
+    main()
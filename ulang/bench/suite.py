@@ -0,0 +1,237 @@
+"""
+The benchmark suite of the µlang toolchain, its results saved as JSON
+to track regressions from one run to another.
+
+    python -m ulang.bench.suite [-o results.json] [-k filter]
+    python -m ulang.bench.suite -c baseline.json [-t 10] [-k filter]
+    python -m ulang.bench.suite -c baseline.json results.json [-t 10]
+
+It times the lexer and the parser on generated sources of growing size,
+the startup of ``ulang``, a line typed in the REPL, and small programs:
+range loops, ``/`` and ``%`` (``__div__`` and ``__rem__``), string
+interpolation, ``print`` of big containers and ``spawn``. The startup,
+the REPL and the programs are also timed in plain python, for
+comparison. Each result is the best time of a few runs, in seconds.
+
+With ``-o`` the results are written to a file. With ``-c`` they are
+compared to those of a former run, or two saved runs are compared
+without running anything. A benchmark more than the threshold slower
+(10% by default) is a regression, the exit status is then 1.
+"""
+import code, contextlib, getopt, json, os, platform, subprocess, sys, tempfile, time
+from ulang.bench import measure, report, run_ulang
+from ulang.bench.sources import generate
+from ulang.parser.core import Parser
+from ulang.parser.lexer import lexer
+from ulang.runtime.env import create_globals
+
+# the iterations of the runtime programs
+N = 200000
+
+PROGRAMS = [
+ ('range loop',
+ 's = 0\nfor i in 0..N {\n  s += i\n}\n',
+ 's = 0\nfor i in range(N + 1):\n    s += i\n'),
+ ('div and rem',
+ 's = 0\nfor i in 1..N {\n  s += i / 3 + i % 7\n}\n',
+ 's = 0\nfor i in range(1, N + 1):\n    s += i // 3 + i % 7\n'),
+ ('string interpolation',
+ 'n = 7\nfor i in 0..N {\n  t = "item `i` of `n`: \\(i * 2\\)"\n}\n',
+ 'n = 7\nfor i in range(N + 1):\n    t = f"item {i} of {n}: {i * 2}"\n'),
+ ('print of containers',
+ 'xs = list(range(N))\nprint({"k": xs, "v": [xs, [xs]]})\n',
+ 'xs = list(range(N))\nprint({"k": xs, "v": [xs, [xs]]}, end="")\n'),
+ ('spawn',
+ 'done = []\nfunc work(i) {\n  done.append(i)\n}\ntasks = []\nfor i in 0..<N / 100 {\n  tasks.append(spawn(work, i))\n}\nfor t in tasks {\n  t.join()\n}\n',
+ 'import threading\ndone = []\ndef work(i):\n    done.append(i)\ntasks = []\nfor i in range(N // 100):\n    t = threading.Thread(target=work, args=(i,), daemon=True)\n    t.start()\n    tasks.append(t)\nfor t in tasks:\n    t.join()\n')]
+
+REPL_LINES = [
+ ('statement', 'x = x + 1'),
+ ('expression', 'x * 2')]
+
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, 'w') as (devnull):
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+def ulang_program(source):
+    code = compile(Parser().parse(source, '<bench>'), '<bench>', 'exec')
+
+    def run():
+        exec(code, create_globals(fname='<bench>'))
+
+    return run
+
+
+def python_program(source):
+    code = compile(source, '<bench>', 'exec')
+
+    def run():
+        exec(code, {'__name__': '__bench__'})
+
+    return run
+
+
+def run_python(source):
+    """Run a python program in a fresh interpreter, like run_ulang."""
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as (f):
+        f.write(source)
+    try:
+        return subprocess.run([sys.executable, f.name], stdout=(subprocess.PIPE),
+          stderr=(subprocess.PIPE),
+          universal_newlines=True)
+    finally:
+        os.unlink(f.name)
+
+
+def checked(proc):
+    if proc.returncode != 0:
+        raise RuntimeError((proc.stderr.strip() or 'failed').splitlines()[(-1)])
+
+
+def lexing(sizes=(1000, 10000)):
+    for lines in sizes:
+        source = generate(lines)
+        yield ('lexer %d lines' % lines, lambda source=source: sum(1 for _ in lexer.lex(source)))
+
+
+def parsing(sizes=(1000, 5000)):
+    Parser.build_parser()
+    for lines in sizes:
+        source = generate(lines)
+        yield ('parser %d lines' % lines, lambda source=source: Parser().parse(source, '<bench>'))
+
+
+def startup():
+    yield ('startup, ulang', lambda : checked(run_ulang('x = 1\n')))
+    yield ('startup, python', lambda : checked(run_python('x = 1\n')))
+
+
+def repl_lines(number=200):
+    from ulang.runtime.repl import Repl
+    shell = Repl(globals=(create_globals(fname='<STDIN>')))
+    shell.onecmd('x = 0')
+    console = code.InteractiveInterpreter({'x': 0})
+    for name, line in REPL_LINES:
+
+        def ulang_line(line=line):
+            for _ in range(number):
+                shell.onecmd(line)
+
+        def python_line(line=line):
+            for _ in range(number):
+                console.runsource(line)
+
+        yield ('repl %s, ulang' % name, ulang_line, number)
+        yield ('repl %s, python' % name, python_line, number)
+
+
+def runtime():
+    for name, ulang_source, python_source in PROGRAMS:
+        yield ('%s, ulang' % name, ulang_program(ulang_source.replace('N', str(N))))
+        yield ('%s, python' % name, python_program(python_source.replace('N', str(N))))
+
+
+SUITE = [lexing, parsing, startup, repl_lines, runtime]
+
+
+def run(filter=None, repeat=5):
+    """Return the results of the benchmarks whose name contains filter."""
+    results = {}
+    for group in SUITE:
+        for case in group():
+            name, func = case[:2]
+            # the time of one of the calls done by func
+            number = case[2] if len(case) > 2 else 1
+            if filter and filter not in name:
+                continue
+            with quiet():
+                results[name] = measure(func, repeat) / number
+            print('  %-36s %10.3f ms' % (name, results[name] * 1000))
+
+    return results
+
+
+def save(results, path):
+    data = {'python':platform.python_version(),  'platform':platform.platform(),  'time':time.strftime('%Y-%m-%dT%H:%M:%S'),
+     'results':results}
+    with open(path, 'w', encoding='utf-8') as (f):
+        json.dump(data, f, indent=1, sort_keys=True)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as (f):
+        return json.load(f)['results']
+
+
+def compare(baseline, results, threshold=0.1):
+    """Return the report rows of two runs and the names of the regressions."""
+    rows = []
+    regressions = []
+    for name in sorted(set(baseline) | set(results)):
+        if name not in results or name not in baseline:
+            rows.append((name, 'only in %s run' % ('the baseline' if name in baseline else 'this')))
+            continue
+        old, new = baseline[name], results[name]
+        change = new / old - 1 if old else 0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        rows.append((name, '%10.3f ms -> %10.3f ms %+7.1f%%%s' % (old * 1000, new * 1000, change * 100, flag)))
+
+    return (rows, regressions)
+
+
+def main(argv=None):
+    usage = 'usage: python -m ulang.bench.suite [-o out.json] [-c baseline.json [results.json]] [-t percent] [-k filter]\n'
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:] if argv is None else argv, 'ho:c:t:k:', [
+         'help', 'output=', 'compare=', 'threshold=', 'filter='])
+    except getopt.GetoptError as e:
+        sys.stderr.write('%s\n%s' % (e, usage))
+        return 2
+
+    output = baseline = filter = None
+    threshold = 0.1
+    for opt, value in opts:
+        if opt in ('-h', '--help'):
+            sys.stdout.write(usage)
+            return 0
+        if opt in ('-o', '--output'):
+            output = value
+        elif opt in ('-c', '--compare'):
+            baseline = value
+        elif opt in ('-t', '--threshold'):
+            threshold = float(value) / 100
+        elif opt in ('-k', '--filter'):
+            filter = value
+
+    if len(args) > 1 or args and baseline is None:
+        sys.stderr.write(usage)
+        return 2
+    if args:
+        results = load(args[0])
+    else:
+        print('ulang benchmark suite')
+        results = run(filter)
+        if output:
+            save(results, output)
+    if baseline is None:
+        return 0
+    old = load(baseline)
+    if filter:
+        old = {name: seconds for name, seconds in old.items() if filter in name}
+    rows, regressions = compare(old, results, threshold)
+    report('compared to %s' % baseline, rows)
+    if regressions:
+        print('%d regressions above %g%%' % (len(regressions), threshold * 100))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Startup cost of getting the LR table of the µlang grammar:
+mapping the binary table, loading the json cache and a cold build.
+"""
+import json, os, tempfile
+from ulang.bench import measure, report
+from ulang.parser.core import Parser
+from ulang.parser.parsergenerator import LRTable, MappedLRTable
+
+
+def run(repeat=5):
+    pg = Parser.pg_
+    g = pg.build_grammar()
+    pg.grammar_hash = pg.compute_grammar_hash(g)
+    table = pg.build_table(g, binary=False)
+    rows = [('grammar + hash', measure(lambda : pg.compute_grammar_hash(pg.build_grammar()), repeat))]
+
+    fd, path = tempfile.mkstemp(suffix='.lrt')
+    os.close(fd)
+    try:
+        pg.write_binary_table(table, path)
+        rows.append(('binary table (mmap)', measure(lambda : MappedLRTable.load(g, path, pg.grammar_hash), repeat)))
+    finally:
+        os.unlink(path)
+
+    cache_file = pg.cache_file('json')
+    if os.path.exists(cache_file):
+
+        def load_json():
+            with open(cache_file) as (f):
+                data = json.load(f)
+            pg.data_is_valid(g, data)
+            return LRTable.from_cache(g, data)
+
+        rows.append(('json cache', measure(load_json, repeat)))
+    else:
+        rows.append(('json cache', 'missing'))
+
+    def cold_build():
+        return LRTable.from_grammar(pg.build_grammar())
+
+    rows.append(('cold build', measure(cold_build, 1)))
+    return rows
+
+
+def main():
+    report('LR table startup', run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Throughput of ulang tasks started with ``spawn``, comparing the current
+killable ``Thread`` against the former one tracing every line of its
+frames so that ``kill`` could interrupt it.
+"""
+import threading, time
+from ulang.bench import measure, report
+from ulang.parser.core import Parser
+from ulang.runtime import env
+
+SOURCE = '''
+func work(n) {
+  s = 0
+  for i in 0..n {
+    s += i % 7 * 3 + 1
+  }
+  done.append(s)
+}
+'''
+
+
+class TracedThread(env.Thread):
+
+    def start(self):
+        self._Thread__run_backup = self.run
+        self.run = self._Thread__run
+        threading.Thread.start(self)
+
+
+def load():
+    namespace = env.create_globals(fname='<bench>')
+    namespace['done'] = []
+    exec(compile(Parser().parse(SOURCE, '<bench>'), '<bench>', 'exec'), namespace)
+    return namespace
+
+
+def run_tasks(namespace, tasks, n):
+    threads = [namespace['__builtins__']['spawn'](namespace['work'], n) for _ in range(tasks)]
+    for th in threads:
+        th.join()
+
+
+def run(tasks=(1, 4, 16), n=100000):
+    rows = []
+    namespace = load()
+    thread = env.Thread
+    for count in tasks:
+        for name, cls in (('untraced', thread), ('traced', TracedThread)):
+            env.Thread = cls
+            try:
+                seconds = measure((lambda : run_tasks(namespace, count, n)), repeat=3)
+            finally:
+                env.Thread = thread
+            rows.append(('%s %d tasks' % (name, count), '%10.3f ms %12.0f iterations/s' % (
+             seconds * 1000, count * n / seconds)))
+
+    return rows
+
+
+def kill_latency():
+    """Time from kill() until a busy task is gone."""
+    namespace = load()
+    exec(compile(Parser().parse('func spin() {\n  while true {\n  }\n}\n', '<bench>'), '<bench>', 'exec'), namespace)
+    th = namespace['__builtins__']['spawn'](namespace['spin'])
+    time.sleep(0.01)
+    start = time.perf_counter()
+    namespace['__builtins__']['kill'](th)
+    th.join()
+    return [('kill latency', time.perf_counter() - start)]
+
+
+def main():
+    report('spawned task throughput', run() + kill_latency())
+
+
+if __name__ == '__main__':
+    main()
@@ -2,353 +2,390 @@
 # Python bytecode 3.7 (3394)
 # Decompiled from: Python 3.7.2rc1 (tags/v3.7.2rc1:75a402a217, Dec 11 2018, 22:09:03) [MSC v.1916 32 bit (Intel)]
 # Embedded file name: ulang\codegen\blockly.py
-import ast, sys
-from copy import deepcopy
-import xml.etree.ElementTree as etree
-import xml.dom.minidom as minidom
-import random, string
+import ast, hashlib, io, re
+from contextlib import contextmanager
+from copy import copy
+from xml.sax.saxutils import escape
 
-def randomString(stringLength=20):
+XMLNS = 'http://www.w3.org/1999/xhtml'
+
+ATTRIBUTE_ENTITIES = {'"': '&quot;'}
+
+SPECIAL = re.compile('[&<>"]')
+
+
+def quote(text, entities={}):
+    # most texts are names and numbers, with nothing to escape
+    if SPECIAL.search(text) is None:
+        return text
+    return escape(text, entities)
+
+
+def digest(*parts):
     """
-    Generate a random string of fixed length 
+    Return an id of 20 hex digits hashing the given strings, the ids
+    of blocks and variables only change with what they are made of.
     """
-    letters = string.ascii_letters
-    return ''.join((random.choice(letters) for i in range(stringLength)))
+    return hashlib.blake2b(('\x00'.join(parts).encode('utf-8')), digest_size=10).hexdigest()
 
 
 def dump(ast):
     return CodeGen().dump(ast)
 
 
+class Symbols(ast.NodeVisitor):
+    __doc__ = '\n    The functions and the variables of a module, found before its\n    blocks are written since blockly wants the variables first and a\n    call lists the parameters of a function defined after it.\n    '
+
+    def __init__(self):
+        self.functions = {}
+        self.variables = {}
+
+    def add(self, name):
+        if name not in self.variables:
+            self.variables[name] = digest('variable', name)
+
+    def visit_FunctionDef(self, func_def):
+        self.functions[func_def.name] = func_def
+        self.generic_visit(func_def)
+
+    def visit_arg(self, arg):
+        self.add(arg.arg)
+
+    def visit_Name(self, name):
+        self.add(name.id)
+
+    def visit_Call(self, call):
+        # the name of a called function is no variable
+        if isinstance(call.func, ast.Attribute):
+            self.visit(call.func.value)
+        for arg in call.args:
+            self.visit(arg)
+
+
 class CodeGen(ast.NodeVisitor):
-    __doc__ = '\n    A simple python ast to blockly xml converter.\n    '
+    __doc__ = '\n    A simple python ast to blockly xml converter.\n\n    The xml is written to a stream as the ast is visited. A statement of\n    a sequence leaves its block open, the next one being written into its\n    <next> element, and the open blocks are closed at the end of the\n    sequence. The blocks of a sequence are indented alike, or the output\n    would grow with the square of the number of statements.\n\n    The ids of the blocks hash the top level statement they belong to and\n    their rank in it, so the blocks of a function keep their ids while\n    other code changes.\n    '
 
     def __init__(self):
-        self.ast2xml_ = {}
+        self.out_ = None
+        self.indent_ = 0
+        self.deferred_ = []
         self.variables_ = {}
         self.functions_ = {}
+        # whether the next block is a statement of the innermost sequence
+        self.chained_ = False
+        # the number of blocks left open by each sequence being written
+        # and the indentation of its blocks
+        self.links_ = []
+        self.seed_ = ''
+        self.seeds_ = {}
+        self.blocks_ = 0
 
     def dump(self, ast):
-        self.ast2xml_ = {}
-        self.variables_ = {}
-        self.functions_ = {}
-        self.calls_ = set()
-        self.visit(ast)
-        roots = self.ast2xml_[ast]
-        assert isinstance(roots, list)
-        for call in self.calls_:
-            self.fix_call(call, first_pass=False)
-
+        out = io.StringIO()
+        self.write(ast, out)
+        return out.getvalue()
+
+    def write(self, ast, out):
+        """Write the blockly xml of a module to the text stream out."""
+        symbols = Symbols()
+        symbols.visit(ast)
+        self.variables_ = symbols.variables
+        self.functions_ = symbols.functions
+        self.out_ = out
+        self.indent_ = 0
+        self.seeds_ = {}
+        out.write('<?xml version="1.0" ?>\n')
+        self.start('xml', [('xmlns', XMLNS)])
         if len(self.variables_) > 0:
-            variables = etree.Element('variables')
+            self.start('variables')
             for name, id in self.variables_.items():
-                self.add_variable(variables, name, id=id)
+                self.leaf('variable', name, [('type', ''), ('id', id)])
 
-            roots.insert(0, variables)
-        xml = ''.join((etree.tostring(i).decode('utf-8') for i in roots))
-        xml = '<xml xmlns="http://www.w3.org/1999/xhtml">%s</xml>' % xml
-        return minidom.parseString(xml).toprettyxml(indent='  ')
+            self.end('variables')
+        self.visit(ast)
+        self.end('xml')
 
     def visit_Module(self, module):
-        roots = []
-        main = None
-        for stmt in module.body:
-            self.visit(stmt)
-            block = self.ast2xml_.get(stmt)
-            if block is None:
-                continue
-            if not self.has_next(stmt):
-                roots.append(block)
-            else:
-                if main is None:
-                    roots.append(block)
-                else:
-                    self.connect(main, block)
-                main = block
+        # the statements form one sequence, written where the first one is
+        first = len(module.body)
+        for i, stmt in enumerate(module.body):
+            if self.has_next(stmt):
+                first = i
+                break
+
+        for stmt in module.body[:first]:
+            self.visit_root(stmt, False)
 
-        self.ast2xml_[module] = roots
+        self.links_.append([0, 0])
+        for stmt in module.body[first:]:
+            if self.has_next(stmt):
+                self.visit_root(stmt, True)
+
+        self.close_links()
+        for stmt in module.body[first:]:
+            if not self.has_next(stmt):
+                self.visit_root(stmt, False)
+
+    def visit_root(self, stmt, chained):
+        key = ast.dump(stmt)
+        count = self.seeds_.get(key, 0)
+        self.seeds_[key] = count + 1
+        self.seed_ = digest(key, str(count))
+        self.blocks_ = 0
+        self.chained_ = chained
+        self.visit(stmt)
+        self.chained_ = False
 
     def visit_FunctionDef(self, func_def):
-        root = self.add_block(func_def, 'procedures_defnoreturn')
-        self.functions_[func_def.name] = func_def
-        if len(func_def.args.args) > 0:
-            mutation = self.add_mutation(root)
-            for arg in func_def.args.args:
-                if arg.arg not in self.variables_:
-                    self.variables_[arg.arg] = randomString()
-                arg_elem = etree.SubElement(mutation, 'arg')
-                arg_elem.set('name', arg.arg)
-                arg_elem.set('varid', self.variables_[arg.arg])
-
-        self.add_field(root, 'NAME', func_def.name)
         last = func_def.body[(-1)]
-        if isinstance(last, ast.Return) and last.value is not None:
-            self.add_statement(root, 'STACK', func_def.body[:-1])
-            self.add_value(root, 'RETURN', last)
-            root.set('type', 'procedures_defreturn')
-        else:
-            self.add_statement(root, 'STACK', func_def.body)
+        returns = isinstance(last, ast.Return) and last.value is not None
+        with self.block('procedures_defreturn' if returns else 'procedures_defnoreturn'):
+            if len(func_def.args.args) > 0:
+                self.start('mutation')
+                for arg in func_def.args.args:
+                    self.leaf('arg', '', [('name', arg.arg), ('varid', self.variables_[arg.arg])])
+
+                self.end('mutation')
+            self.add_field('NAME', func_def.name)
+            if returns:
+                self.add_statement('STACK', func_def.body[:-1])
+                self.add_value('RETURN', last.value)
+            else:
+                self.add_statement('STACK', func_def.body)
 
     def visit_Name(self, name):
-        if name.id not in self.variables_:
-            self.variables_[name.id] = randomString()
         block_type = 'variables_get' if isinstance(name.ctx, ast.Load) else 'variables_set'
-        root = self.add_block(name, block_type)
-        self.add_field(root=root,
-          name='VAR',
-          text=(name.id),
-          id=(self.variables_[name.id]),
-          variabletype='')
+        with self.block(block_type):
+            self.add_variable(name.id)
 
     def visit_If(self, if_stmt):
-        root = self.add_block(if_stmt, 'controls_if')
-        if len(if_stmt.orelse) > 0:
-            self.add_mutation(root=root,
-              elseif='0').set('else', '1')
-        self.add_value(root, 'IF0', if_stmt.test)
-        self.add_statement(root, 'DO0', if_stmt.body)
-        if len(if_stmt.orelse) > 0:
-            self.add_statement(root, 'ELSE', if_stmt.orelse)
+        with self.block('controls_if'):
+            if len(if_stmt.orelse) > 0:
+                self.leaf('mutation', '', [('elseif', '0'), ('else', '1')])
+            self.add_value('IF0', if_stmt.test)
+            self.add_statement('DO0', if_stmt.body)
+            if len(if_stmt.orelse) > 0:
+                self.add_statement('ELSE', if_stmt.orelse)
 
     def visit_While(self, while_stmt):
-        root = self.add_block(while_stmt, 'controls_whileUntil')
-        self.add_field(root, 'MODE', 'WHILE')
-        self.add_value(root, 'BOOL', while_stmt.test)
-        self.add_statement(root, 'DO', while_stmt.body)
+        with self.block('controls_whileUntil'):
+            self.add_field('MODE', 'WHILE')
+            self.add_value('BOOL', while_stmt.test)
+            self.add_statement('DO', while_stmt.body)
 
     def visit_For(self, for_stmt):
         it = for_stmt.iter
-        ty = 'controls_forEach'
-        if isinstance(it, ast.Call):
-            if isinstance(it.func, ast.Name):
-                if it.func.id == 'range':
-                    ty = 'controls_for'
-        else:
-            root = self.add_block(for_stmt, ty)
-            var = for_stmt.target
-            assert isinstance(var, ast.Name)
-            self.visit(var)
-            self.add_field(root, 'VAR', var.id)
-            if ty == 'controls_for':
-                args = it.args
+        var = for_stmt.target
+        assert isinstance(var, ast.Name)
+        counted = isinstance(it, ast.Call) and isinstance(it.func, ast.Name) and it.func.id == 'range'
+        with self.block('controls_for' if counted else 'controls_forEach'):
+            self.add_variable(var.id)
+            if counted:
+                args = list(it.args)
                 if len(args) == 1:
-                    args.insert(0, ast.Num(n=0))
-                else:
-                    if len(args) == 2:
-                        args.append(ast.Num(n=1))
-                    self.add_value(root, 'FROM', args[0])
-                    if isinstance(args[1], ast.Num):
-                        self.add_value(root, 'TO', ast.Num(args[1].n - 1))
-                    else:
-                        self.add_value(root, 'TO', ast.BinOp(left=(args[1]),
-                          right=ast.Num(n=1),
-                          op=(ast.Sub())))
-                self.add_value(root, 'BY', args[2])
+                    args.insert(0, ast.Constant(value=0))
+                if len(args) == 2:
+                    args.append(ast.Constant(value=1))
+                self.add_value('FROM', args[0])
+                self.add_value('TO', self.last_of_range(args[1]))
+                self.add_value('BY', args[2])
             else:
-                self.add_value(root, 'LIST', it)
-        self.add_statement(root, 'DO', for_stmt.body)
+                self.add_value('LIST', it)
+            self.add_statement('DO', for_stmt.body)
+
+    def last_of_range(self, end):
+        """Return the last value of a range ending before end, blockly includes it."""
+        if isinstance(end, ast.Constant) and type(end.value) in (int, float):
+            return ast.Constant(value=(end.value - 1))
+        # a..b is range(a, b + 1)
+        if isinstance(end, ast.BinOp) and isinstance(end.op, ast.Add):
+            if isinstance(end.right, ast.Constant) and end.right.value == 1:
+                return end.left
+        return ast.BinOp(left=end, right=ast.Constant(value=1), op=(ast.Sub()))
 
     def visit_Break(self, brk):
-        root = self.add_block(brk, 'controls_flow_statements')
-        self.add_field(root, 'FLOW', 'BREAK')
+        with self.block('controls_flow_statements'):
+            self.add_field('FLOW', 'BREAK')
 
     def visit_Continue(self, cont):
-        root = self.add_block(cont, 'controls_flow_statements')
-        self.add_field(root, 'FLOW', 'CONTINUE')
+        with self.block('controls_flow_statements'):
+            self.add_field('FLOW', 'CONTINUE')
 
     def visit_Return(self, ret):
-        root = self.add_block(ret, 'procedures_ifreturn')
-        if ret.value is not None:
-            self.add_mutation(root=root,
-              value='1')
-            self.add_value(root, 'CONDITION', ast.NameConstant(True))
-            self.add_value(root, 'VALUE', ret.value)
+        with self.block('procedures_ifreturn'):
+            if ret.value is not None:
+                self.leaf('mutation', '', [('value', '1')])
+                self.add_value('CONDITION', ast.Constant(value=True))
+                self.add_value('VALUE', ret.value)
 
     def visit_Assign(self, assign):
-        if not len(assign.targets) == 1:
-            raise AssertionError
+        assert len(assign.targets) == 1
+        target = assign.targets[0]
+        if isinstance(target, ast.Name):
+            pairs = [(target, assign.value)]
+        elif isinstance(target, ast.Tuple):
+            if not (isinstance(assign.value, ast.Tuple) and len(assign.value.elts) == len(target.elts)):
+                raise AssertionError
+            pairs = list(zip(target.elts, assign.value.elts))
         else:
-            target = assign.targets[0]
-            self.visit(assign.targets[0])
-            self.visit(assign.value)
-            if isinstance(target, ast.Name):
-                block = self.ast2xml_[target]
-                self.add_value(block, 'VALUE', assign.value)
-                self.ast2xml_[assign] = block
-            else:
-                if isinstance(target, ast.Tuple):
-                    if not (isinstance(assign.value, ast.Tuple) and len(assign.value.elts) == len(target.elts)):
-                        raise AssertionError
-                    elts = assign.value.elts
-                    for i in range(len(target.elts)):
-                        name = target.elts[i]
-                        assert isinstance(name, ast.Name)
-                        block = self.ast2xml_[name]
-                        self.add_value(block, 'VALUE', elts[i])
-                        if i == 0:
-                            self.ast2xml_[assign] = block
-                        else:
-                            self.connect(self.ast2xml_[target.elts[(i - 1)]], block)
+            # only variables have blocks
+            return
+        chained = self.chained_
+        for name, value in pairs:
+            assert isinstance(name, ast.Name)
+            self.chained_ = chained
+            with self.block('variables_set'):
+                self.add_variable(name.id)
+                self.add_value('VALUE', value)
 
     def visit_AugAssign(self, aug):
         assert isinstance(aug.target, ast.Name)
         assign = ast.Assign(targets=[
          aug.target],
-          op=(aug.op),
           value=ast.BinOp(left=ast.Name(id=(aug.target.id),
           ctx=(ast.Load())),
           right=(aug.value),
           op=(aug.op)))
         self.visit(assign)
-        self.ast2xml_[aug] = self.ast2xml_[assign]
 
     def visit_Compare(self, cmp):
         if not (len(cmp.ops) == 1 and len(cmp.comparators) == 1):
             raise AssertionError
-        root = self.add_block(cmp, 'logic_compare')
         opc = cmp.ops[0].__class__.__name__.upper()
         if opc == 'NOTEQ':
             opc = 'NEQ'
-        self.add_field(root=root,
-          name='OP',
-          text=opc)
-        self.add_value(root, 'A', cmp.left)
-        self.add_value(root, 'B', cmp.comparators[0])
+        with self.block('logic_compare'):
+            self.add_field('OP', opc)
+            self.add_value('A', cmp.left)
+            self.add_value('B', cmp.comparators[0])
 
     def visit_BinOp(self, binop):
-        root = self.add_block(binop, 'math_arithmetic')
-        self.add_field(root=root,
-          name='OP',
-          text=(binop.op.__class__.__name__.upper()))
-        self.add_value(root, 'A', binop.left)
-        self.add_value(root, 'B', binop.right)
+        with self.block('math_arithmetic'):
+            self.add_field('OP', binop.op.__class__.__name__.upper())
+            self.add_value('A', binop.left)
+            self.add_value('B', binop.right)
 
     def visit_UnaryOp(self, uop):
         if isinstance(uop.op, ast.Not):
-            root = self.add_block(uop, 'logic_negate')
-            self.add_value(root, 'BOOL', uop.operand)
+            with self.block('logic_negate'):
+                self.add_value('BOOL', uop.operand)
+        elif isinstance(uop.op, ast.USub):
+            with self.block('math_single'):
+                self.add_field('OP', 'NEG')
+                self.add_value('NUM', uop.operand)
         else:
-            if isinstance(uop.op, ast.USub):
-                root = self.add_block(uop, 'math_single')
-                self.add_field(root, 'OP', 'NEG')
-                self.add_value(root, 'NUM', uop.operand)
-            else:
-                assert False, 'unsupport unary op %s' % str(uop.op)
+            assert False, 'unsupport unary op %s' % str(uop.op)
 
     def visit_BoolOp(self, boolop):
-        root = self.add_block(boolop, 'logic_operation')
-        self.add_field(root=root,
-          name='OP',
-          text=(boolop.op.__class__.__name__.upper()))
-        self.add_value(root, 'A', boolop.values[0])
-        if len(boolop.values) == 2:
-            self.add_value(root, 'B', boolop.values[1])
-        else:
-            rest = deepcopy.copy(boolop)
-            rest.values = rest.values[1:]
-            self.add_value(root, 'B', rest)
+        with self.block('logic_operation'):
+            self.add_field('OP', boolop.op.__class__.__name__.upper())
+            self.add_value('A', boolop.values[0])
+            if len(boolop.values) == 2:
+                self.add_value('B', boolop.values[1])
+            else:
+                rest = copy(boolop)
+                rest.values = boolop.values[1:]
+                self.add_value('B', rest)
 
     def visit_Call(self, call):
         fname, value = (None, None)
         if isinstance(call.func, ast.Name):
             fname = call.func.id
-        else:
-            if isinstance(call.func, ast.Attribute):
-                fname = call.func.attr
-                value = call.func.value
-            else:
-                if fname == 'print' or fname == 'println':
-                    root = self.add_block(call, 'text_print')
-                    self.add_value(root, 'TEXT', call.args[0])
-                    for arg in call.args[1:]:
-                        block = self.add_block(None, 'text_print')
-                        self.add_value(block, 'TEXT', arg)
-                        self.connect(root, block)
-                        root = block
-
-        if fname == 'len':
+        elif isinstance(call.func, ast.Attribute):
+            fname = call.func.attr
+            value = call.func.value
+        if fname == 'print' or fname == 'println':
+            # a block per argument, one after the other
+            chained = self.chained_
+            if not chained:
+                self.links_.append([0, 0])
+            for arg in call.args or [None]:
+                self.chained_ = True
+                with self.block('text_print'):
+                    self.add_value('TEXT', arg)
+
+            if not chained:
+                self.close_links()
+        elif fname == 'len':
             assert len(call.args) == 1
-            root = self.add_block(call, 'lists_length')
-            self.add_value(root, 'VALUE', call.args[0])
+            with self.block('lists_length'):
+                self.add_value('VALUE', call.args[0])
+        elif fname == 'str':
+            assert len(call.args) == 1
+            self.visit(call.args[0])
+        elif fname == 'assert':
+            self.chained_ = False
+        elif fname == 'append':
+            if not (len(call.args) == 1 and isinstance(value, ast.Name)):
+                raise AssertionError
+            with self.block('text_append'):
+                self.add_variable(value.id)
+                self.add_value('TEXT', call.args[0])
         else:
-            if fname == 'str':
-                assert len(call.args) == 1
-                self.visit(call.args[0])
-                self.ast2xml_[call] = self.ast2xml_[call.args[0]]
-            else:
-                if fname == 'assert':
-                    pass
-                elif fname == 'append':
-                    if not (len(call.args) == 1 and isinstance(value, ast.Name)):
-                        raise AssertionError
-                    root = self.add_block(call, 'text_append')
-                    self.add_field(root, 'VAR', value.id)
-                    self.add_value(root, 'TEXT', call.args[0])
-                else:
-                    root = self.add_block(call, 'procedures_callreturn')
-                    self.add_mutation(root=root,
-                      name=fname)
-                    self.fix_call(call, first_pass=True)
-                    for i in range(len(call.args)):
-                        self.add_value(root, 'ARG' + str(i), call.args[i])
+            assert isinstance(call.func, ast.Name) and fname in self.functions_, 'func "%s" is not defined' % fname
+            block_type = 'procedures_callnoreturn' if self.chained_ else 'procedures_callreturn'
+            with self.block(block_type):
+                self.start('mutation', [('name', fname)], lazy=True)
+                for arg in self.functions_[fname].args.args:
+                    self.leaf('arg', '', [('name', arg.arg), ('id', self.variables_[arg.arg])])
+
+                self.end('mutation')
+                for i in range(len(call.args)):
+                    self.add_value('ARG%d' % i, call.args[i])
 
     def visit_Expr(self, expr):
         self.visit(expr.value)
-        if isinstance(expr.value, ast.Call):
-            elem = self.ast2xml_.get(expr.value)
-            if elem is not None:
-                if elem.get('type') == 'procedures_callreturn':
-                    elem.set('type', 'procedures_callnoreturn')
-        if expr.value in self.ast2xml_:
-            self.ast2xml_[expr] = self.ast2xml_[expr.value]
 
     def visit_List(self, lst):
-        root = self.add_block(lst, 'lists_create_with')
-        self.add_mutation(root=root,
-          items=(str(len(lst.elts))))
-        for i in range(len(lst.elts)):
-            self.add_value(root, 'ADD%d' % i, lst.elts[i])
+        with self.block('lists_create_with'):
+            self.leaf('mutation', '', [('items', str(len(lst.elts)))])
+            for i in range(len(lst.elts)):
+                self.add_value('ADD%d' % i, lst.elts[i])
 
     def visit_Tuple(self, tup):
         self.visit_List(tup)
 
     def visit_Subscript(self, sub):
-        assert isinstance(sub.slice, ast.Index)
-        root = self.add_block(sub, 'lists_getIndex')
-        self.add_mutation(root=root,
-          statement='false',
-          at='true')
-        self.add_field(root, 'MODE', 'GET')
-        self.add_field(root, 'WHERE', 'FROM_START')
-        self.add_value(root, 'VALUE', sub.value)
-        self.add_value(root, 'AT', sub.slice)
-
-    def visit_Index(self, idx):
-        self.visit(idx.value)
-        self.ast2xml_[idx] = self.ast2xml_[idx.value]
-
-    def visit_Num(self, num):
-        self.add_field(root=(self.add_block(num, 'math_number')),
-          name='NUM',
-          text=(str(num.n)))
-
-    def visit_Str(self, s):
-        self.add_field(root=(self.add_block(s, 'text')),
-          name='TEXT',
-          text=(s.s))
-
-    def visit_NameConstant(self, c):
+        index = sub.slice.value if isinstance(sub.slice, ast.Index) else sub.slice
+        if isinstance(index, ast.Slice):
+            self.unimplement(index)
+        with self.block('lists_getIndex'):
+            self.leaf('mutation', '', [('statement', 'false'), ('at', 'true')])
+            self.add_field('MODE', 'GET')
+            self.add_field('WHERE', 'FROM_START')
+            self.add_value('VALUE', sub.value)
+            self.add_value('AT', index)
+
+    def visit_Constant(self, c):
         if c.value is None:
-            self.add_block(c, 'logic_null')
-            return
-        root = self.add_block(c, 'logic_boolean')
-        self.add_field(root, 'BOOL', str(c.value).upper())
+            with self.block('logic_null'):
+                pass
+        elif isinstance(c.value, bool):
+            with self.block('logic_boolean'):
+                self.add_field('BOOL', str(c.value).upper())
+        elif isinstance(c.value, (int, float)):
+            with self.block('math_number'):
+                self.add_field('NUM', str(c.value))
+        elif isinstance(c.value, str):
+            with self.block('text'):
+                self.add_field('TEXT', c.value)
+        else:
+            self.unimplement(c)
+
+    def visit_JoinedStr(self, s):
+        with self.block('text_join'):
+            self.leaf('mutation', '', [('items', str(len(s.values)))])
+            for i in range(len(s.values)):
+                self.add_value('ADD%d' % i, s.values[i])
+
+    def visit_FormattedValue(self, value):
+        self.visit(value.value)
 
     def visit_IfExp(self, expr):
-        root = self.add_block(expr, 'logic_ternary')
-        self.add_value(root, 'IF', expr.test)
-        self.add_value(root, 'THEN', expr.body)
-        self.add_value(root, 'ELSE', expr.orelse)
+        with self.block('logic_ternary'):
+            self.add_value('IF', expr.test)
+            self.add_value('THEN', expr.body)
+            self.add_value('ELSE', expr.orelse)
 
     def visit_Dict(self, dct):
         self.unimplement(dct)
@@ -374,92 +411,96 @@ class CodeGen(ast.NodeVisitor):
     def unimplement(self, node):
         assert False, 'unimplement ast node "%s"' % node.__class__.__name__
 
-    def add_variable(self, root, name, ty='', id=randomString()):
-        var = etree.SubElement(root, 'variable')
-        var.set('type', ty)
-        var.set('id', id)
-        var.text = name
-        return var
-
-    def add_block(self, ast, block_type):
-        block = etree.Element('block')
-        block.set('type', block_type)
-        block.set('id', randomString())
-        if ast is not None:
-            self.ast2xml_[ast] = block
-        return block
-
-    def add_field(self, root, name, text='', **kwargs):
-        field = etree.SubElement(root, 'field')
-        field.set('name', name)
-        field.text = text
-        for key, value in kwargs.items():
-            field.set(key, value)
-
-        return field
-
-    def add_value(self, root, name, stmt=None):
-        value = etree.SubElement(root, 'value')
-        value.set('name', name)
-        if stmt is not None:
-            if stmt not in self.ast2xml_:
-                self.visit(stmt)
-            block = self.ast2xml_[stmt]
-            if block is not None:
-                value.append(block)
-        return value
-
-    def add_statement(self, root, name, stmts=[]):
-        statement = etree.SubElement(root, 'statement')
-        statement.set('name', name)
-        for i in range(len(stmts)):
-            stmt = stmts[i]
-            if stmt not in self.ast2xml_:
-                self.visit(stmt)
-            if stmt not in self.ast2xml_:
-                continue
-            if len(statement) == 0:
-                statement.append(self.ast2xml_[stmt])
+    @contextmanager
+    def block(self, block_type):
+        """Write a block around the fields and values written in the with body."""
+        chained, self.chained_ = self.chained_, False
+        if chained:
+            link = self.links_[(-1)]
+            if link[0] > 0:
+                # the next block is indented like the first one
+                self.flush()
+                self.out_.write('%s<next>\n' % ('  ' * link[1]))
+                self.indent_ = link[1]
             else:
-                self.connect(self.ast2xml_[stmts[(i - 1)]], self.ast2xml_[stmt])
-
-        return statement
-
-    def add_mutation(self, root, **kwargs):
-        mutation = etree.SubElement(root, 'mutation')
-        for key, value in kwargs.items():
-            mutation.set(key, value)
+                link[1] = self.indent_ + len(self.deferred_)
+        self.start('block', [('type', block_type), ('id', digest(self.seed_, str(self.blocks_)))], lazy=True)
+        self.blocks_ += 1
+        yield
+        if chained:
+            self.links_[(-1)][0] += 1
+        else:
+            self.end('block')
+
+    def close_links(self):
+        count, indent = self.links_.pop()
+        for i in range(count):
+            if i > 0:
+                self.out_.write('%s</next>\n' % ('  ' * indent))
+                self.indent_ = indent + 1
+            self.end('block')
+
+    def add_variable(self, name):
+        self.leaf('field', name, [('name', 'VAR'), ('id', self.variables_[name]), ('variabletype', '')])
+
+    def add_field(self, name, text=''):
+        self.leaf('field', text, [('name', name)])
+
+    def add_value(self, name, node=None):
+        self.start('value', [('name', name)], lazy=True)
+        if node is not None:
+            self.chained_ = False
+            self.visit(node)
+        self.end('value')
+
+    def add_statement(self, name, stmts=()):
+        self.start('statement', [('name', name)], lazy=True)
+        self.links_.append([0, 0])
+        for stmt in stmts:
+            self.chained_ = True
+            self.visit(stmt)
 
-        return mutation
-
-    def connect(self, prev, block):
-        while True:
-            next = prev.find('next', None)
-            if next == None:
-                etree.SubElement(prev, 'next').append(block)
-                break
-            else:
-                prev = next.find('block', None)
-
-    def fix_call(self, call, first_pass=True):
-        assert isinstance(call.func, ast.Name)
-        assert call in self.ast2xml_
-        callee = call.func.id
-        call_block = self.ast2xml_[call]
-        func_def = self.functions_[callee] if callee in self.functions_ else None
-        if func_def is None:
-            assert first_pass, 'func "%s" is not defined' % callee
-            self.calls_.add(call)
-            return
-        mutation = call_block.find('mutation')
-        assert mutation is not None
-        for arg in func_def.args.args:
-            arg_elem = etree.SubElement(mutation, 'arg')
-            arg_elem.set('name', arg.arg)
-            arg_elem.set('id', self.variables_[arg.arg])
+        self.chained_ = False
+        self.close_links()
+        self.end('statement')
 
     def has_next(self, node):
         if not isinstance(node, ast.stmt) or isinstance(node, ast.FunctionDef):
             return False
         return True
+
+    def start(self, tag, attrs=(), lazy=False):
+        """
+        Open an element. A lazy one is only written with its first child,
+        it is written as an empty element if it has none.
+        """
+        self.deferred_.append((tag, attrs))
+        if not lazy:
+            self.flush()
+
+    def flush(self):
+        for tag, attrs in self.deferred_:
+            self.out_.write('%s<%s%s>\n' % ('  ' * self.indent_, tag, self.attributes(attrs)))
+            self.indent_ += 1
+
+        self.deferred_.clear()
+
+    def end(self, tag):
+        if self.deferred_:
+            tag, attrs = self.deferred_.pop()
+            self.flush()
+            self.out_.write('%s<%s%s/>\n' % ('  ' * self.indent_, tag, self.attributes(attrs)))
+        else:
+            self.indent_ -= 1
+            self.out_.write('%s</%s>\n' % ('  ' * self.indent_, tag))
+
+    def leaf(self, tag, text='', attrs=()):
+        self.flush()
+        if text:
+            self.out_.write('%s<%s%s>%s</%s>\n' % ('  ' * self.indent_, tag, self.attributes(attrs), quote(text), tag))
+        else:
+            self.out_.write('%s<%s%s/>\n' % ('  ' * self.indent_, tag, self.attributes(attrs)))
+
+    def attributes(self, attrs):
+        return ''.join([' %s="%s"' % (name, quote(value, ATTRIBUTE_ENTITIES)) for name, value in attrs])
 # okay decompiling E:\ulang\ulang-0.2.2.exe_extracted\PYZ-00.pyz_extracted\ulang.codegen.blockly.pyc
@@ -0,0 +1,1869 @@
+"""
+A backend building the code objects of a µlang module directly from its
+ast, instead of handing the ast to ``compile()`` (``ulang --backend=bytecode``).
+
+The instructions are those of CPython 3.11, laid out the way its compiler
+lays them out, with a few rewrites of ulang constructs on top:
+
+* ``for`` loops over small ranges with constant bounds, as written with
+  ``a..b``, iterate over a constant tuple, so entering the loop costs no
+  call of ``range``;
+* the ``__rem__`` and ``__div__`` helpers behind ``%`` and ``/`` become a
+  ``BINARY_OP`` where the result is the same: ``__rem__`` of operands
+  known to be numbers, ``__div__`` when one operand is known to be a float.
+  Unlike ``-O`` this never changes the result of an integer division;
+* jumps to jumps are threaded, unreachable code and jumps to the next
+  instruction are dropped.
+
+Operand types are known the way ``ulang.parser.optimizer`` knows them, from
+literals and the counters of range loops. ``$`` is the first argument of a
+method and already loads with a single ``LOAD_FAST``.
+
+The code objects are assembled with ``pyobject.code_.Code``. A top level
+function or class using a construct the backend does not handle, such as
+comprehensions or async code, is compiled by ``compile()`` instead, and
+so is the whole module if one appears in its top level statements.
+"""
+import ast, dis, opcode, sys
+from types import CodeType
+from ulang.parser import optimizer
+
+# the instruction set emitted, other versions of python are not supported
+supported = sys.version_info[:2] == (3, 11)
+
+# ranges of at most this many items are iterated as constant tuples
+MAX_RANGE_CONST = 64
+
+CO_OPTIMIZED = 1
+CO_NEWLOCALS = 2
+CO_VARARGS = 4
+CO_VARKEYWORDS = 8
+CO_NESTED = 16
+CO_GENERATOR = 32
+
+NOT_CONSTANT = optimizer.NOT_CONSTANT
+
+NB_NAMES = [name for name, symbol in getattr(opcode, '_nb_ops', ())]
+
+BINOPS = {ast.Add: 'ADD',
+ ast.BitAnd: 'AND',
+ ast.FloorDiv: 'FLOOR_DIVIDE',
+ ast.LShift: 'LSHIFT',
+ ast.MatMult: 'MATRIX_MULTIPLY',
+ ast.Mult: 'MULTIPLY',
+ ast.Mod: 'REMAINDER',
+ ast.BitOr: 'OR',
+ ast.Pow: 'POWER',
+ ast.RShift: 'RSHIFT',
+ ast.Sub: 'SUBTRACT',
+ ast.Div: 'TRUE_DIVIDE',
+ ast.BitXor: 'XOR'}
+
+UNARYOPS = {ast.UAdd: 'UNARY_POSITIVE',
+ ast.USub: 'UNARY_NEGATIVE',
+ ast.Invert: 'UNARY_INVERT',
+ ast.Not: 'UNARY_NOT'}
+
+COMPARE = {ast.Lt: ('COMPARE_OP', '<'),
+ ast.LtE: ('COMPARE_OP', '<='),
+ ast.Eq: ('COMPARE_OP', '=='),
+ ast.NotEq: ('COMPARE_OP', '!='),
+ ast.Gt: ('COMPARE_OP', '>'),
+ ast.GtE: ('COMPARE_OP', '>='),
+ ast.Is: ('IS_OP', 0),
+ ast.IsNot: ('IS_OP', 1),
+ ast.In: ('CONTAINS_OP', 0),
+ ast.NotIn: ('CONTAINS_OP', 1)}
+
+CONVERSIONS = {-1: 0, 115: 1, 114: 2, 97: 3}
+
+# jumps resolved to their forward or backward form by the assembler
+RELATIVE_JUMPS = {'JUMP': ('JUMP_FORWARD', 'JUMP_BACKWARD'),
+ 'POP_JUMP_IF_FALSE': ('POP_JUMP_FORWARD_IF_FALSE', 'POP_JUMP_BACKWARD_IF_FALSE'),
+ 'POP_JUMP_IF_TRUE': ('POP_JUMP_FORWARD_IF_TRUE', 'POP_JUMP_BACKWARD_IF_TRUE'),
+ 'POP_JUMP_IF_NONE': ('POP_JUMP_FORWARD_IF_NONE', 'POP_JUMP_BACKWARD_IF_NONE'),
+ 'POP_JUMP_IF_NOT_NONE': ('POP_JUMP_FORWARD_IF_NOT_NONE', 'POP_JUMP_BACKWARD_IF_NOT_NONE')}
+FORWARD_JUMPS = {'FOR_ITER', 'JUMP_IF_FALSE_OR_POP', 'JUMP_IF_TRUE_OR_POP', 'SEND'}
+BACKWARD_JUMPS = {'JUMP_BACKWARD_NO_INTERRUPT'}
+JUMPS = set(RELATIVE_JUMPS) | FORWARD_JUMPS | BACKWARD_JUMPS
+UNCONDITIONAL = {'JUMP', 'JUMP_BACKWARD_NO_INTERRUPT'}
+EXITS = {'RETURN_VALUE', 'RAISE_VARARGS', 'RERAISE'}
+
+CACHES = {name: opcode._inline_cache_entries[code] for name, code in opcode.opmap.items()} if supported else {}
+
+
+class Unsupported(Exception):
+    __doc__ = '\n    Raised for a construct the backend does not compile, the top level\n    definition or the module holding it is compiled by compile().\n    '
+
+
+class Label:
+    __doc__ = '\n    A position in the instructions of a code object, the target of\n    jumps and exception handlers.\n    '
+    __slots__ = ('index', )
+
+    def __init__(self):
+        self.index = None
+
+
+class Block:
+    __doc__ = '\n    A statement entered by the compiler which needs some cleanup when\n    return, break or continue leave it: loops, try, except and with.\n    '
+    __slots__ = ('kind', 'regions', 'depth', 'start', 'end', 'data')
+
+    def __init__(self, kind, regions, depth, start=None, end=None, data=None):
+        self.kind = kind
+        self.regions = regions
+        self.depth = depth
+        self.start = start
+        self.end = end
+        self.data = data
+
+
+def const_key(value):
+    """Return a key telling apart constants python considers equal, like 1, 1.0 and True."""
+    if isinstance(value, tuple):
+        return (tuple, tuple(const_key(v) for v in value))
+    if isinstance(value, (float, complex)):
+        return (type(value), repr(value))
+    if isinstance(value, CodeType):
+        return (CodeType, id(value))
+    return (type(value), value)
+
+
+def write_varint(out, value):
+    while value >= 64:
+        out.append(64 | value & 63)
+        value >>= 6
+    out.append(value)
+
+
+def write_svarint(out, value):
+    write_varint(out, -value << 1 | 1 if value < 0 else value << 1)
+
+
+def write_except_varint(out, value, msb=0):
+    for shift in (24, 18, 12, 6):
+        if value >= 1 << shift:
+            out.append(value >> shift & 63 | 64 | msb)
+            msb = 0
+    out.append(value & 63 | msb)
+
+
+def code_class():
+    """Import pyobject.code_.Code, without the warning about its optional C extension."""
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        from pyobject.code_ import Code
+    return Code
+
+
+class Assembler:
+    __doc__ = '\n    Collects the instructions, constants and names of one code object,\n    then lays them out into bytecode, line and exception tables.\n    '
+
+    def __init__(self, filename, name, qualname, firstlineno):
+        self.filename = filename
+        self.name = name
+        self.qualname = qualname
+        self.firstlineno = firstlineno
+        self.lineno = firstlineno
+        self.instrs = []
+        self.consts = {}
+        self.const_values = []
+        self.names = {}
+        # stack of (handler label, stack depth, push lasti) of the try blocks entered
+        self.regions = []
+
+    def emit(self, op, arg=None):
+        self.instrs.append((op, arg, self.lineno, self.regions[(-1)] if self.regions else None))
+
+    def mark(self, label):
+        label.index = len(self.instrs)
+
+    def const(self, value):
+        key = const_key(value)
+        index = self.consts.get(key)
+        if index is None:
+            index = self.consts[key] = len(self.const_values)
+            self.const_values.append(value)
+        return index
+
+    def add_name(self, name):
+        return self.names.setdefault(name, len(self.names))
+
+    def push_region(self, label, depth, lasti=False):
+        self.regions.append((label, depth, int(lasti)))
+
+    def pop_region(self):
+        self.regions.pop()
+
+    def thread_jumps(self):
+        """Retarget jumps to unconditional jumps at the final destination."""
+        instrs = self.instrs
+        for i, (op, target, lineno, region) in enumerate(instrs):
+            if op not in JUMPS:
+                continue
+            label = target
+            for _ in range(8):
+                op2, target2, _, _ = instrs[label.index]
+                if op2 != 'JUMP' or target2 is label:
+                    break
+                label = target2
+
+            if label is not target:
+                if op in FORWARD_JUMPS and label.index <= i:
+                    continue
+                instrs[i] = (op, label, lineno, region)
+
+    def flow(self, generator):
+        """
+        Follow the control flow, return which instructions are reachable
+        and the largest stack depth.
+        """
+        instrs = self.instrs
+        depths = [None] * len(instrs)
+        todo = [(0, 1 if generator else 0)]
+        max_depth = 0
+        while todo:
+            i, depth = todo.pop()
+            while depths[i] is None:
+                depths[i] = depth
+                op, arg, _, region = instrs[i]
+                if region is not None:
+                    label, handler_depth, lasti = region
+                    todo.append((label.index, handler_depth + lasti + 1))
+                    max_depth = max(max_depth, handler_depth + lasti + 1)
+                if op in JUMPS:
+                    code = opcode.opmap[RELATIVE_JUMPS[op][0] if op in RELATIVE_JUMPS else op]
+                    todo.append((arg.index, depth + dis.stack_effect(code, 0, jump=True)))
+                    if op in UNCONDITIONAL:
+                        break
+                    depth += dis.stack_effect(code, 0, jump=False)
+                else:
+                    if op in EXITS:
+                        break
+                    code = opcode.opmap[op]
+                    depth += dis.stack_effect(code, arg if code >= opcode.HAVE_ARGUMENT else None)
+                max_depth = max(max_depth, depth)
+                i += 1
+
+        return (depths, max_depth)
+
+    def optimize(self, generator):
+        """
+        Thread jumps, drop unreachable instructions and jumps to the
+        next instruction, return the largest stack depth.
+        """
+        self.thread_jumps()
+        depths, max_depth = self.flow(generator)
+        instrs = self.instrs
+        alive = [i for i, depth in enumerate(depths) if depth is not None]
+        keep = [False] * len(instrs)
+        for n, i in enumerate(alive):
+            op, arg = instrs[i][:2]
+            keep[i] = not (op == 'JUMP' and n + 1 < len(alive) and alive[n + 1] == arg.index)
+
+        new_index = []
+        kept = []
+        for i, instr in enumerate(instrs):
+            new_index.append(len(kept))
+            if keep[i]:
+                kept.append(instr)
+
+        new_index.append(len(kept))
+        labels = {}
+        for op, arg, _, region in kept:
+            if op in JUMPS:
+                labels[id(arg)] = arg
+            if region is not None:
+                labels[id(region[0])] = region[0]
+
+        for label in labels.values():
+            label.index = new_index[label.index]
+
+        self.instrs = kept
+        return max_depth
+
+    def layout(self):
+        """Return the opcode, argument and size of every instruction, in code units."""
+        instrs = self.instrs
+        count = len(instrs)
+        ops = []
+        args = []
+        for i, (op, arg, _, _) in enumerate(instrs):
+            if op in RELATIVE_JUMPS:
+                op = RELATIVE_JUMPS[op][0 if arg.index > i else 1]
+            ops.append(op)
+            args.append(0 if arg is None else arg)
+
+        sizes = [1 + CACHES[op] for op in ops]
+        for i, arg in enumerate(args):
+            if not isinstance(arg, Label):
+                sizes[i] += (arg > 255) + (arg > 65535) + (arg > 16777215)
+
+        while True:
+            offsets = []
+            offset = 0
+            for size in sizes:
+                offsets.append(offset)
+                offset += size
+
+            offsets.append(offset)
+            changed = False
+            for i in range(count):
+                if not isinstance(args[i], Label):
+                    continue
+                target = offsets[args[i].index]
+                after = offsets[i] + sizes[i]
+                if target >= after:
+                    delta = target - after
+                    assert not ops[i].endswith(('BACKWARD', 'NO_INTERRUPT'))
+                else:
+                    delta = after - target
+                    assert ops[i] not in FORWARD_JUMPS
+                size = 1 + CACHES[ops[i]] + (delta > 255) + (delta > 65535) + (delta > 16777215)
+                if size > sizes[i]:
+                    sizes[i] = size
+                    changed = True
+
+            if not changed:
+                break
+
+        resolved = []
+        for i in range(count):
+            arg = args[i]
+            if isinstance(arg, Label):
+                target = offsets[arg.index]
+                after = offsets[i] + sizes[i]
+                arg = target - after if target >= after else after - target
+            resolved.append(arg)
+
+        return (ops, resolved, sizes, offsets)
+
+    def assemble(self, argcount=0, posonlyargcount=0, kwonlyargcount=0, flags=0, varnames=(), cellvars=(), freevars=()):
+        stacksize = self.optimize(flags & CO_GENERATOR)
+        ops, args, sizes, offsets = self.layout()
+        extended_arg = opcode.EXTENDED_ARG
+        code = bytearray()
+        for op, arg, size in zip(ops, args, sizes):
+            caches = CACHES[op]
+            for shift in range(8 * (size - caches - 1), 0, -8):
+                code.append(extended_arg)
+                code.append(arg >> shift & 255)
+
+            code.append(opcode.opmap[op])
+            code.append(arg & 255)
+            code.extend(bytes(2 * caches))
+
+        lines = bytearray()
+        line = self.firstlineno
+        i = 0
+        count = len(self.instrs)
+        while i < count:
+            lineno = self.instrs[i][2]
+            units = 0
+            while i < count and self.instrs[i][2] == lineno:
+                units += sizes[i]
+                i += 1
+
+            while units > 0:
+                length = min(units, 8)
+                units -= length
+                if lineno is None:
+                    lines.append(128 | 120 | length - 1)
+                else:
+                    lines.append(128 | 104 | length - 1)
+                    write_svarint(lines, lineno - line)
+                    line = lineno
+
+        exceptions = bytearray()
+        i = 0
+        while i < count:
+            region = self.instrs[i][3]
+            start = i
+            while i < count and self.instrs[i][3] == region:
+                i += 1
+
+            if region is not None:
+                label, depth, lasti = region
+                write_except_varint(exceptions, offsets[start], 128)
+                write_except_varint(exceptions, offsets[i] - offsets[start])
+                write_except_varint(exceptions, offsets[label.index])
+                write_except_varint(exceptions, depth << 1 | lasti)
+
+        Code = code_class()
+        result = Code(auto_update=False)
+        result.co_argcount = argcount
+        result.co_posonlyargcount = posonlyargcount
+        result.co_kwonlyargcount = kwonlyargcount
+        result.co_nlocals = len(varnames)
+        result.co_stacksize = max(stacksize, 1)
+        result.co_flags = flags
+        result.co_code = bytes(code)
+        result.co_consts = tuple(self.const_values)
+        result.co_names = tuple(self.names)
+        result.co_varnames = tuple(varnames)
+        result.co_filename = self.filename
+        result.co_name = self.name
+        result.co_qualname = self.qualname
+        result.co_firstlineno = self.firstlineno
+        result.co_linetable = bytes(lines)
+        result.co_exceptiontable = bytes(exceptions)
+        result.co_freevars = tuple(freevars)
+        result.co_cellvars = tuple(cellvars)
+        return result.to_code()
+
+
+class Scope:
+    __doc__ = '\n    The names bound and used in a module, class or function body, and\n    after resolve(), which of them are fast locals, cells or free\n    variables.\n    '
+
+    def __init__(self, kind, node, parent):
+        self.kind = kind
+        self.node = node
+        self.parent = parent
+        self.nested = parent is not None and (parent.kind == 'function' or parent.nested)
+        self.children = []
+        self.params = []
+        self.bound = {}
+        self.used = set()
+        self.globals = set()
+        self.nonlocals = set()
+        self.generator = False
+        self.uses_super = False
+        self.locals = {}
+        self.cells = []
+        self.frees = []
+
+
+def is_private(name):
+    return name.startswith('__') and not name.endswith('__')
+
+
+class SymbolTable(ast.NodeVisitor):
+    __doc__ = '\n    Collects the scopes of the definitions in a top level statement and\n    the names bound and used in each of them.\n    '
+
+    def __init__(self, scopes, scope):
+        self.scopes = scopes
+        self.scope = scope
+        self.classes = 0
+
+    def check(self, name):
+        if self.classes and is_private(name):
+            # names mangled inside classes are left to compile()
+            raise Unsupported('private name %s' % name)
+
+    def bind(self, name):
+        self.check(name)
+        self.scope.bound[name] = None
+
+    def enter(self, kind, node, body, params=()):
+        scope = Scope(kind, node, self.scope)
+        for name in params:
+            self.check(name)
+            if name in scope.params:
+                raise Unsupported('duplicate argument %s' % name)
+            scope.params.append(name)
+
+        self.scope.children.append(scope)
+        self.scopes[node] = scope
+        outer = self.scope
+        self.scope = scope
+        self.classes += kind == 'class'
+        if isinstance(body, list):
+            for stmt in body:
+                self.visit(stmt)
+
+        else:
+            self.visit(body)
+        self.classes -= kind == 'class'
+        self.scope = outer
+
+    def visit_arguments(self, args, annotations):
+        for default in args.defaults:
+            self.visit(default)
+
+        for default in args.kw_defaults:
+            if default is not None:
+                self.visit(default)
+
+        if annotations:
+            for arg in self.arg_nodes(args):
+                if getattr(arg, 'annotation', None) is not None:
+                    self.visit(arg.annotation)
+
+    @staticmethod
+    def arg_nodes(args):
+        nodes = list(getattr(args, 'posonlyargs', ())) + args.args + args.kwonlyargs
+        if args.vararg is not None:
+            nodes.append(args.vararg)
+        if args.kwarg is not None:
+            nodes.append(args.kwarg)
+        return nodes
+
+    def visit_FunctionDef(self, node):
+        self.bind(node.name)
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+
+        self.visit_arguments(node.args, True)
+        if getattr(node, 'returns', None) is not None:
+            self.visit(node.returns)
+        self.enter('function', node, node.body, [arg.arg for arg in self.arg_nodes(node.args)])
+
+    def visit_Lambda(self, node):
+        self.visit_arguments(node.args, False)
+        self.enter('function', node, node.body, [arg.arg for arg in self.arg_nodes(node.args)])
+
+    def visit_ClassDef(self, node):
+        self.bind(node.name)
+        for expr in node.decorator_list + node.bases + [k.value for k in node.keywords]:
+            self.visit(expr)
+
+        self.enter('class', node, node.body)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.check(node.id)
+            self.scope.used.add(node.id)
+            if node.id == 'super':
+                self.scope.uses_super = True
+        else:
+            self.bind(node.id)
+
+    def visit_Attribute(self, node):
+        self.check(node.attr)
+        self.visit(node.value)
+
+    def visit_Global(self, node):
+        for name in node.names:
+            if name in self.scope.bound or name in self.scope.used or name in self.scope.params:
+                raise Unsupported('global after use')
+            self.scope.globals.add(name)
+
+    def visit_Nonlocal(self, node):
+        if self.scope.kind != 'function':
+            raise Unsupported('nonlocal outside of a function')
+        for name in node.names:
+            if name in self.scope.bound or name in self.scope.used or name in self.scope.params:
+                raise Unsupported('nonlocal after use')
+            self.scope.nonlocals.add(name)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.bind((alias.asname or alias.name).split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                if self.scope.kind != 'module':
+                    raise Unsupported('import * outside of the module')
+            else:
+                self.bind(alias.asname or alias.name)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.bind(node.name)
+        self.generic_visit(node)
+
+    def visit_Yield(self, node):
+        if self.scope.kind != 'function':
+            raise Unsupported('yield outside of a function')
+        self.scope.generator = True
+        self.generic_visit(node)
+
+    visit_YieldFrom = visit_Yield
+
+    def unsupported(self, node):
+        raise Unsupported(node.__class__.__name__)
+
+    visit_AsyncFunctionDef = unsupported
+    visit_AsyncFor = unsupported
+    visit_AsyncWith = unsupported
+    visit_Await = unsupported
+    visit_ListComp = unsupported
+    visit_SetComp = unsupported
+    visit_DictComp = unsupported
+    visit_GeneratorExp = unsupported
+    visit_NamedExpr = unsupported
+
+
+def resolve(scope, visible):
+    """
+    Decide how the names of scope and its children are accessed, where
+    visible are the names bound in the enclosing functions. Return the
+    free variables of scope.
+    """
+    if scope.kind == 'function':
+        scope.locals = dict.fromkeys(scope.params)
+        for name in scope.bound:
+            if name not in scope.globals and name not in scope.nonlocals:
+                scope.locals[name] = None
+
+        for name in scope.nonlocals:
+            if name not in visible:
+                raise Unsupported('no binding for nonlocal %s' % name)
+
+        free = {name for name in scope.used | scope.nonlocals if name in visible if name not in scope.locals if name not in scope.globals}
+        if scope.uses_super:
+            if '__class__' in visible:
+                free.add('__class__')
+        inner = visible - scope.globals | set(scope.locals)
+        child_frees = set()
+        for child in scope.children:
+            child_frees |= resolve(child, inner)
+
+        scope.cells = sorted(name for name in child_frees if name in scope.locals)
+        free |= {name for name in child_frees if name not in scope.locals}
+    elif scope.kind == 'class':
+        free = {name for name in scope.used if name in visible if name not in scope.bound if name not in scope.globals}
+        child_frees = set()
+        for child in scope.children:
+            child_frees |= resolve(child, visible | {'__class__'})
+
+        if '__class__' in child_frees:
+            scope.cells = ['__class__']
+        free |= child_frees - {'__class__'}
+    else:
+        for child in scope.children:
+            resolve(child, set())
+
+        return set()
+    scope.frees = sorted(free)
+    return free
+
+
+def has_annotations(stmts):
+    """Tell whether annotated assignments need the __annotations__ of a module or class body."""
+    for stmt in stmts:
+        if isinstance(stmt, ast.AnnAssign):
+            return True
+        for field in ('body', 'orelse', 'finalbody'):
+            if has_annotations(getattr(stmt, field, ())):
+                return True
+
+        for handler in getattr(stmt, 'handlers', ()):
+            if has_annotations(handler.body):
+                return True
+
+    return False
+
+
+def docstring(stmts):
+    if stmts and isinstance(stmts[0], ast.Expr):
+        if isinstance(stmts[0].value, ast.Constant):
+            if isinstance(stmts[0].value.value, str):
+                return stmts[0].value.value
+
+
+class Compiler(ast.NodeVisitor):
+    __doc__ = '\n    Emits the instructions of one code object: the module, a class body,\n    a function or a lambda. Nested definitions have compilers of their own.\n    '
+
+    def __init__(self, unit, scope, name, qualname, firstlineno):
+        self.unit = unit
+        self.scope = scope
+        self.asm = Assembler(unit.filename, name, qualname, firstlineno)
+        self.blocks = []
+        # items left on the stack by the statements entered
+        self.depth = 0
+        if scope.kind == 'function':
+            self.varnames = list(scope.params) + [name for name in scope.locals if name not in scope.params if name not in scope.cells]
+        else:
+            self.varnames = []
+        localsplus = self.varnames + [name for name in scope.cells if name not in scope.params] + scope.frees
+        self.derefs = {name: localsplus.index(name) for name in scope.cells + scope.frees}
+
+    def visit(self, node):
+        lineno = getattr(node, 'lineno', None)
+        if lineno is None:
+            return super().visit(node)
+        asm = self.asm
+        outer = asm.lineno
+        asm.lineno = lineno
+        super().visit(node)
+        asm.lineno = outer
+
+    def generic_visit(self, node):
+        raise Unsupported(node.__class__.__name__)
+
+    def visit_stmts(self, stmts):
+        for stmt in stmts:
+            self.visit(stmt)
+
+    def emit(self, op, arg=None):
+        self.asm.emit(op, arg)
+
+    def load_const(self, value):
+        self.asm.emit('LOAD_CONST', self.asm.const(value))
+
+    def prologue(self):
+        asm = self.asm
+        lineno = asm.lineno
+        asm.lineno = None
+        if self.scope.frees:
+            self.emit('COPY_FREE_VARS', len(self.scope.frees))
+        for name in self.scope.cells:
+            self.emit('MAKE_CELL', self.derefs[name])
+
+        asm.lineno = lineno
+        if self.scope.generator:
+            self.emit('RETURN_GENERATOR')
+            self.emit('POP_TOP')
+        self.emit('RESUME', 0)
+
+    def assemble(self, *args):
+        return self.asm.assemble(*args, varnames=self.varnames, cellvars=self.scope.cells, freevars=self.scope.frees)
+
+    def access(self, name):
+        """Return how name is accessed in this scope: fast, deref, global, name or classderef."""
+        scope = self.scope
+        if name in scope.globals:
+            return 'global'
+        if scope.kind == 'function':
+            if name in self.derefs:
+                return 'deref'
+            if name in scope.locals:
+                return 'fast'
+            return 'global'
+        if scope.kind == 'class':
+            if name not in scope.bound:
+                if name in self.derefs:
+                    return 'classderef'
+        return 'name'
+
+    def name_op(self, name, ctx):
+        kind = self.access(name)
+        prefix = 'LOAD' if ctx is ast.Load else 'STORE' if ctx is ast.Store else 'DELETE'
+        if kind == 'fast':
+            self.emit(prefix + '_FAST', self.varnames.index(name))
+        elif kind == 'deref':
+            self.emit(prefix + '_DEREF', self.derefs[name])
+        elif kind == 'classderef':
+            self.emit('LOAD_CLASSDEREF', self.derefs[name])
+        elif kind == 'global':
+            index = self.asm.add_name(name)
+            self.emit(prefix + '_GLOBAL', index << 1 if ctx is ast.Load else index)
+        else:
+            self.emit(prefix + '_NAME', self.asm.add_name(name))
+
+    def constant(self, node):
+        """Return the value of a constant expression, folded as python folds it, or NOT_CONSTANT."""
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.BinOp):
+            left = self.constant(node.left)
+            if left is NOT_CONSTANT:
+                return NOT_CONSTANT
+            right = self.constant(node.right)
+            op = type(node.op)
+            if right is NOT_CONSTANT or op not in optimizer.BINOPS or not optimizer.safe_binop(op, left, right):
+                return NOT_CONSTANT
+            try:
+                value = optimizer.BINOPS[op](left, right)
+            except (ArithmeticError, TypeError, ValueError):
+                return NOT_CONSTANT
+        elif isinstance(node, ast.UnaryOp):
+            operand = self.constant(node.operand)
+            if operand is NOT_CONSTANT:
+                return NOT_CONSTANT
+            try:
+                value = optimizer.UNARYOPS[type(node.op)](operand)
+            except (ArithmeticError, TypeError, ValueError):
+                return NOT_CONSTANT
+        elif isinstance(node, ast.Tuple) and isinstance(node.ctx, ast.Load):
+            values = []
+            for elt in node.elts:
+                value = self.constant(elt)
+                if value is NOT_CONSTANT:
+                    return NOT_CONSTANT
+                values.append(value)
+
+            return tuple(values)
+        else:
+            return NOT_CONSTANT
+        if optimizer.make_literal(value, node) is None:
+            return NOT_CONSTANT
+        return value
+
+    def compile_module(self, module):
+        self.prologue()
+        if has_annotations(module.body):
+            self.emit('SETUP_ANNOTATIONS')
+        body = module.body
+        doc = docstring(body)
+        if doc is not None:
+            self.load_const(doc)
+            self.name_op('__doc__', ast.Store)
+            body = body[1:]
+        self.visit_stmts(body)
+        self.load_const(None)
+        self.emit('RETURN_VALUE')
+        return self.assemble()
+
+    def compile_function(self, node):
+        scope = self.scope
+        args = node.args
+        posonly = len(getattr(args, 'posonlyargs', ()))
+        flags = CO_OPTIMIZED | CO_NEWLOCALS
+        if args.vararg is not None:
+            flags |= CO_VARARGS
+        if args.kwarg is not None:
+            flags |= CO_VARKEYWORDS
+        if scope.generator:
+            flags |= CO_GENERATOR
+        if scope.nested:
+            flags |= CO_NESTED
+        self.prologue()
+        if isinstance(node, ast.Lambda):
+            # None first, a lambda has no docstring
+            self.asm.const(None)
+            self.visit(node.body)
+            if not scope.generator:
+                self.emit('RETURN_VALUE')
+            else:
+                self.emit('POP_TOP')
+                self.load_const(None)
+                self.emit('RETURN_VALUE')
+        else:
+            body = node.body
+            doc = docstring(body)
+            self.asm.const(doc)
+            if doc is not None:
+                body = body[1:]
+            self.visit_stmts(body)
+            self.load_const(None)
+            self.emit('RETURN_VALUE')
+        return self.assemble(posonly + len(args.args), posonly, len(args.kwonlyargs), flags)
+
+    def compile_class(self, node):
+        self.prologue()
+        self.name_op('__name__', ast.Load)
+        self.name_op('__module__', ast.Store)
+        self.load_const(self.asm.qualname)
+        self.name_op('__qualname__', ast.Store)
+        if has_annotations(node.body):
+            self.emit('SETUP_ANNOTATIONS')
+        body = node.body
+        doc = docstring(body)
+        if doc is not None:
+            self.load_const(doc)
+            self.name_op('__doc__', ast.Store)
+            body = body[1:]
+        self.visit_stmts(body)
+        if self.scope.cells:
+            self.emit('LOAD_CLOSURE', self.derefs['__class__'])
+            self.emit('COPY', 1)
+            self.name_op('__classcell__', ast.Store)
+        else:
+            self.load_const(None)
+        self.emit('RETURN_VALUE')
+        return self.assemble()
+
+    def child_qualname(self, name):
+        if self.scope.kind == 'module':
+            return name
+        if self.scope.kind == 'function':
+            return self.asm.qualname + '.<locals>.' + name
+        return self.asm.qualname + '.' + name
+
+    def child_code(self, node, name):
+        """Compile the code object of a function, lambda or class defined here."""
+        unit = self.unit
+        if node in unit.broken:
+            return unit.fallback(node)
+        scope = unit.scopes[node]
+        firstlineno = node.lineno
+        if getattr(node, 'decorator_list', None):
+            firstlineno = node.decorator_list[0].lineno
+        compiler = Compiler(unit, scope, name, self.child_qualname(name), firstlineno)
+        types = unit.types
+        counters = types.counters_
+        types.counters_ = set()
+        try:
+            if scope.kind == 'class':
+                return compiler.compile_class(node)
+            return compiler.compile_function(node)
+        finally:
+            types.counters_ = counters
+
+    def make_closure(self, code, flags):
+        if code.co_freevars:
+            for name in code.co_freevars:
+                self.emit('LOAD_CLOSURE', self.derefs[name])
+
+            self.emit('BUILD_TUPLE', len(code.co_freevars))
+            flags |= 8
+        self.load_const(code)
+        self.emit('MAKE_FUNCTION', flags)
+
+    def make_function(self, node, name):
+        args = node.args
+        flags = 0
+        if args.defaults:
+            self.visit_sequence(args.defaults, 'TUPLE')
+            flags |= 1
+        kwdefaults = [(arg.arg, default) for arg, default in zip(args.kwonlyargs, args.kw_defaults) if default is not None]
+        if kwdefaults:
+            for arg, default in kwdefaults:
+                self.load_const(arg)
+                self.visit(default)
+
+            self.emit('BUILD_MAP', len(kwdefaults))
+            flags |= 2
+        if isinstance(node, ast.FunctionDef):
+            annotations = [(arg.arg, arg.annotation) for arg in SymbolTable.arg_nodes(args) if getattr(arg, 'annotation', None) is not None]
+            if getattr(node, 'returns', None) is not None:
+                annotations.append(('return', node.returns))
+            if annotations:
+                for arg, annotation in annotations:
+                    self.load_const(arg)
+                    self.visit(annotation)
+
+                self.emit('BUILD_TUPLE', 2 * len(annotations))
+                flags |= 4
+        self.make_closure(self.child_code(node, name), flags)
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+
+        self.make_function(node, node.name)
+        for decorator in node.decorator_list:
+            self.emit('PRECALL', 0)
+            self.emit('CALL', 0)
+
+        self.name_op(node.name, ast.Store)
+
+    def visit_Lambda(self, node):
+        self.make_function(node, '<lambda>')
+
+    def visit_ClassDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+
+        self.emit('PUSH_NULL')
+        self.emit('LOAD_BUILD_CLASS')
+        self.make_closure(self.child_code(node, node.name), 0)
+        self.load_const(node.name)
+        for base in node.bases:
+            if isinstance(base, ast.Starred):
+                raise Unsupported('starred base')
+            self.visit(base)
+
+        self.call_keywords(node.keywords)
+        count = 2 + len(node.bases) + len(node.keywords)
+        self.emit('PRECALL', count)
+        self.emit('CALL', count)
+        for decorator in node.decorator_list:
+            self.emit('PRECALL', 0)
+            self.emit('CALL', 0)
+
+        self.name_op(node.name, ast.Store)
+
+    def exit_blocks(self, preserve, loop=None):
+        """
+        Emit the cleanup of the blocks left by return, break or continue,
+        innermost first, up to loop. Return the state to restore after.
+        """
+        saved = (self.blocks[:], self.asm.regions[:], self.depth)
+        while self.blocks:
+            if self.blocks[(-1)] is loop:
+                break
+            self.exit_block(self.blocks.pop(), preserve)
+
+        return saved
+
+    def restore(self, saved):
+        self.blocks, self.asm.regions, self.depth = saved
+
+    def exit_block(self, block, preserve):
+        del self.asm.regions[block.regions:]
+        kind = block.kind
+        if kind in ('for', 'value'):
+            if preserve:
+                self.emit('SWAP', 2)
+            self.emit('POP_TOP')
+        elif kind == 'handler':
+            if preserve:
+                self.emit('SWAP', 2)
+            self.emit('POP_EXCEPT')
+            if block.data is not None:
+                self.load_const(None)
+                self.name_op(block.data, ast.Store)
+                self.name_op(block.data, ast.Del)
+        elif kind == 'with':
+            if preserve:
+                self.emit('SWAP', 2)
+            self.call_exit()
+        elif kind == 'finally':
+            self.depth = block.depth
+            if preserve:
+                self.blocks.append(Block('value', len(self.asm.regions), self.depth))
+                self.depth += 1
+            self.visit_stmts(block.data)
+            if preserve:
+                self.blocks.pop()
+        elif kind == 'finally_end':
+            if preserve:
+                self.emit('SWAP', 2)
+            self.emit('POP_TOP')
+            if preserve:
+                self.emit('SWAP', 2)
+            self.emit('POP_EXCEPT')
+
+    def call_exit(self):
+        self.load_const(None)
+        self.load_const(None)
+        self.load_const(None)
+        self.emit('PRECALL', 2)
+        self.emit('CALL', 2)
+        self.emit('POP_TOP')
+
+    def visit_Return(self, node):
+        if self.scope.kind != 'function':
+            raise Unsupported('return outside of a function')
+        value = NOT_CONSTANT if node.value is None else self.constant(node.value)
+        if node.value is None or value is not NOT_CONSTANT:
+            saved = self.exit_blocks(False)
+            self.load_const(None if node.value is None else value)
+        else:
+            self.visit(node.value)
+            saved = self.exit_blocks(True)
+        self.emit('RETURN_VALUE')
+        self.restore(saved)
+
+    def loop_block(self):
+        for block in reversed(self.blocks):
+            if block.kind in ('for', 'while'):
+                return block
+
+        raise Unsupported('break or continue outside of a loop')
+
+    def visit_Break(self, node):
+        loop = self.loop_block()
+        saved = self.exit_blocks(False, loop)
+        if loop.kind == 'for':
+            self.emit('POP_TOP')
+        self.emit('JUMP', loop.end)
+        self.restore(saved)
+
+    def visit_Continue(self, node):
+        loop = self.loop_block()
+        saved = self.exit_blocks(False, loop)
+        self.emit('JUMP', loop.start)
+        self.restore(saved)
+
+    def visit_Pass(self, node):
+        pass
+
+    visit_Global = visit_Pass
+    visit_Nonlocal = visit_Pass
+
+    def visit_Expr(self, node):
+        if isinstance(node.value, ast.Constant):
+            return
+        self.visit(node.value)
+        self.emit('POP_TOP')
+
+    def visit_Assign(self, node):
+        targets = node.targets
+        value = node.value
+        if len(targets) == 1 and isinstance(targets[0], (ast.Tuple, ast.List)) and isinstance(value, (ast.Tuple, ast.List)):
+            elts = targets[0].elts
+            if 2 <= len(elts) == len(value.elts) <= 3:
+                if not any(isinstance(elt, ast.Starred) for elt in elts + value.elts):
+                    # a, b = b, a swaps the values instead of building a tuple
+                    for elt in value.elts:
+                        self.visit(elt)
+
+                    self.emit('SWAP', len(elts))
+                    for elt in elts:
+                        self.visit(elt)
+
+                    return
+        self.visit(value)
+        for target in targets[:-1]:
+            self.emit('COPY', 1)
+            self.visit(target)
+
+        self.visit(targets[(-1)])
+
+    def visit_AugAssign(self, node):
+        target = node.target
+        op = self.binary_arg(node.op, True)
+        if isinstance(target, ast.Name):
+            self.name_op(target.id, ast.Load)
+            self.visit(node.value)
+            self.emit('BINARY_OP', op)
+            self.name_op(target.id, ast.Store)
+        elif isinstance(target, ast.Attribute):
+            self.visit(target.value)
+            self.emit('COPY', 1)
+            self.emit('LOAD_ATTR', self.asm.add_name(target.attr))
+            self.visit(node.value)
+            self.emit('BINARY_OP', op)
+            self.emit('SWAP', 2)
+            self.emit('STORE_ATTR', self.asm.add_name(target.attr))
+        elif isinstance(target, ast.Subscript):
+            self.visit(target.value)
+            self.visit(target.slice)
+            self.emit('COPY', 2)
+            self.emit('COPY', 2)
+            self.emit('BINARY_SUBSCR')
+            self.visit(node.value)
+            self.emit('BINARY_OP', op)
+            self.emit('SWAP', 3)
+            self.emit('SWAP', 2)
+            self.emit('STORE_SUBSCR')
+        else:
+            raise Unsupported('augmented assignment to %s' % target.__class__.__name__)
+
+    def visit_AnnAssign(self, node):
+        target = node.target
+        if not isinstance(target, ast.Name) or not node.simple:
+            raise Unsupported('annotated assignment to %s' % target.__class__.__name__)
+        if node.value is not None:
+            self.visit(node.value)
+            self.visit(target)
+        if self.scope.kind != 'function':
+            self.visit(node.annotation)
+            self.name_op('__annotations__', ast.Load)
+            self.load_const(target.id)
+            self.emit('STORE_SUBSCR')
+
+    def visit_Delete(self, node):
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_If(self, node):
+        test = self.constant(node.test)
+        if test is not NOT_CONSTANT:
+            self.visit_stmts(node.body if test else node.orelse)
+            return
+        orelse = Label()
+        self.jump_if(node.test, False, orelse)
+        self.visit_stmts(node.body)
+        if node.orelse:
+            end = Label()
+            self.emit('JUMP', end)
+            self.asm.mark(orelse)
+            self.visit_stmts(node.orelse)
+            self.asm.mark(end)
+        else:
+            self.asm.mark(orelse)
+
+    def visit_While(self, node):
+        test = self.constant(node.test)
+        if test is not NOT_CONSTANT and not test:
+            self.visit_stmts(node.orelse)
+            return
+        body, start, orelse, end = (Label(), Label(), Label(), Label())
+        if test is NOT_CONSTANT:
+            self.jump_if(node.test, False, orelse)
+        self.asm.mark(body)
+        self.blocks.append(Block('while', len(self.asm.regions), self.depth, start, end))
+        self.visit_stmts(node.body)
+        self.blocks.pop()
+        # the test is repeated at the bottom, one jump per iteration
+        self.asm.mark(start)
+        if test is NOT_CONSTANT:
+            self.jump_if(node.test, True, body)
+        else:
+            self.emit('JUMP', body)
+        self.asm.mark(orelse)
+        self.visit_stmts(node.orelse)
+        self.asm.mark(end)
+
+    def range_items(self, node):
+        """Return the items of a small range with constant bounds, or None."""
+        if not self.unit.types.is_range(node) or not 1 <= len(node.args) <= 3:
+            return
+        values = [self.constant(arg) for arg in node.args]
+        if not all(type(value) is int for value in values):
+            return
+        try:
+            items = range(*values)
+        except ValueError:
+            return
+        if len(items) <= MAX_RANGE_CONST:
+            return tuple(items)
+
+    def visit_For(self, node):
+        items = self.range_items(node.iter)
+        if items is not None:
+            self.load_const(items)
+        else:
+            self.visit(node.iter)
+        self.emit('GET_ITER')
+        start, cleanup, end = (Label(), Label(), Label())
+        self.asm.mark(start)
+        self.emit('FOR_ITER', cleanup)
+        self.visit(node.target)
+        types = self.unit.types
+        counters = types.counters_
+        if types.is_range(node.iter) and isinstance(node.target, ast.Name):
+            if node.target.id not in optimizer.stored_names(node.body):
+                types.counters_ = counters | {node.target.id}
+        self.blocks.append(Block('for', len(self.asm.regions), self.depth, start, end))
+        self.depth += 1
+        self.visit_stmts(node.body)
+        self.depth -= 1
+        self.blocks.pop()
+        types.counters_ = counters
+        self.emit('JUMP', start)
+        self.asm.mark(cleanup)
+        self.visit_stmts(node.orelse)
+        self.asm.mark(end)
+
+    def visit_Raise(self, node):
+        count = 0
+        if node.exc is not None:
+            self.visit(node.exc)
+            count += 1
+            if node.cause is not None:
+                self.visit(node.cause)
+                count += 1
+        self.emit('RAISE_VARARGS', count)
+
+    def visit_Assert(self, node):
+        end = Label()
+        self.jump_if(node.test, True, end)
+        self.emit('LOAD_ASSERTION_ERROR')
+        if node.msg is not None:
+            self.visit(node.msg)
+            self.emit('PRECALL', 0)
+            self.emit('CALL', 0)
+        self.emit('RAISE_VARARGS', 1)
+        self.asm.mark(end)
+
+    def visit_Try(self, node):
+        if node.finalbody:
+            self.try_finally(node)
+        else:
+            self.try_except(node)
+
+    def try_finally(self, node):
+        asm = self.asm
+        depth = self.depth
+        regions = len(asm.regions)
+        handler, cleanup, end = (Label(), Label(), Label())
+        asm.push_region(handler, depth)
+        self.blocks.append(Block('finally', regions, depth, data=(node.finalbody)))
+        if node.handlers:
+            self.try_except(node)
+        else:
+            self.visit_stmts(node.body)
+        self.blocks.pop()
+        asm.pop_region()
+        self.visit_stmts(node.finalbody)
+        self.emit('JUMP', end)
+        asm.mark(handler)
+        asm.push_region(cleanup, depth + 1, True)
+        self.emit('PUSH_EXC_INFO')
+        self.blocks.append(Block('finally_end', regions, depth))
+        self.depth = depth + 2
+        self.visit_stmts(node.finalbody)
+        self.depth = depth
+        self.blocks.pop()
+        self.emit('RERAISE', 0)
+        asm.pop_region()
+        self.pop_except_and_reraise(cleanup)
+        asm.mark(end)
+
+    def pop_except_and_reraise(self, label):
+        self.asm.mark(label)
+        self.emit('COPY', 3)
+        self.emit('POP_EXCEPT')
+        self.emit('RERAISE', 1)
+
+    def try_except(self, node):
+        asm = self.asm
+        depth = self.depth
+        regions = len(asm.regions)
+        handler, cleanup, orelse, end = (Label(), Label(), Label(), Label())
+        asm.push_region(handler, depth)
+        self.blocks.append(Block('try', regions, depth))
+        self.visit_stmts(node.body)
+        self.blocks.pop()
+        asm.pop_region()
+        self.emit('JUMP', orelse)
+        asm.mark(handler)
+        asm.push_region(cleanup, depth + 1, True)
+        self.emit('PUSH_EXC_INFO')
+        self.depth = depth + 1
+        for i, except_handler in enumerate(node.handlers):
+            asm.lineno = except_handler.lineno
+            next_handler = Label()
+            if except_handler.type is None:
+                if i < len(node.handlers) - 1:
+                    raise Unsupported("default 'except:' must be last")
+            if except_handler.type is not None:
+                self.visit(except_handler.type)
+                self.emit('CHECK_EXC_MATCH')
+                self.emit('POP_JUMP_IF_FALSE', next_handler)
+            name = except_handler.name
+            if name:
+                cleanup_end = Label()
+                self.name_op(name, ast.Store)
+                asm.push_region(cleanup_end, depth + 1, True)
+            else:
+                self.emit('POP_TOP')
+            self.blocks.append(Block('handler', regions, depth + 1, data=name))
+            self.visit_stmts(except_handler.body)
+            self.blocks.pop()
+            if name:
+                asm.pop_region()
+            asm.pop_region()
+            self.emit('POP_EXCEPT')
+            if name:
+                self.load_const(None)
+                self.name_op(name, ast.Store)
+                self.name_op(name, ast.Del)
+            self.emit('JUMP', end)
+            asm.push_region(cleanup, depth + 1, True)
+            if name:
+                asm.mark(cleanup_end)
+                self.load_const(None)
+                self.name_op(name, ast.Store)
+                self.name_op(name, ast.Del)
+                self.emit('RERAISE', 1)
+            asm.mark(next_handler)
+
+        asm.lineno = node.lineno
+        self.depth = depth
+        self.emit('RERAISE', 0)
+        asm.pop_region()
+        self.pop_except_and_reraise(cleanup)
+        asm.mark(orelse)
+        self.visit_stmts(node.orelse)
+        asm.mark(end)
+
+    def visit_With(self, node):
+        self.with_item(node, 0)
+
+    def with_item(self, node, i):
+        asm = self.asm
+        depth = self.depth
+        item = node.items[i]
+        final, cleanup, suppress, end = (Label(), Label(), Label(), Label())
+        self.visit(item.context_expr)
+        self.emit('BEFORE_WITH')
+        regions = len(asm.regions)
+        asm.push_region(final, depth + 1, True)
+        self.blocks.append(Block('with', regions, depth + 1))
+        if item.optional_vars is not None:
+            self.visit(item.optional_vars)
+        else:
+            self.emit('POP_TOP')
+        self.depth = depth + 1
+        if i + 1 < len(node.items):
+            self.with_item(node, i + 1)
+        else:
+            self.visit_stmts(node.body)
+        self.depth = depth
+        self.blocks.pop()
+        asm.pop_region()
+        self.call_exit()
+        self.emit('JUMP', end)
+        asm.mark(final)
+        asm.push_region(cleanup, depth + 3, True)
+        self.emit('PUSH_EXC_INFO')
+        self.emit('WITH_EXCEPT_START')
+        self.emit('POP_JUMP_IF_TRUE', suppress)
+        self.emit('RERAISE', 2)
+        asm.pop_region()
+        self.pop_except_and_reraise(cleanup)
+        asm.push_region(cleanup, depth + 3, True)
+        asm.mark(suppress)
+        self.emit('POP_TOP')
+        asm.pop_region()
+        self.emit('POP_EXCEPT')
+        self.emit('POP_TOP')
+        self.emit('POP_TOP')
+        asm.mark(end)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.load_const(0)
+            self.load_const(None)
+            self.emit('IMPORT_NAME', self.asm.add_name(alias.name))
+            if alias.asname is None:
+                self.name_op(alias.name.split('.')[0], ast.Store)
+                continue
+            parts = alias.name.split('.')
+            for j, part in enumerate(parts[1:]):
+                self.emit('IMPORT_FROM', self.asm.add_name(part))
+                if j < len(parts) - 2:
+                    self.emit('SWAP', 2)
+                    self.emit('POP_TOP')
+
+            self.name_op(alias.asname, ast.Store)
+            if len(parts) > 1:
+                self.emit('POP_TOP')
+
+    def visit_ImportFrom(self, node):
+        self.load_const(node.level or 0)
+        self.load_const(tuple(alias.name for alias in node.names))
+        self.emit('IMPORT_NAME', self.asm.add_name(node.module or ''))
+        for alias in node.names:
+            if alias.name == '*':
+                self.emit('IMPORT_STAR')
+                return
+            self.emit('IMPORT_FROM', self.asm.add_name(alias.name))
+            self.name_op(alias.asname or alias.name, ast.Store)
+
+        self.emit('POP_TOP')
+
+    def jump_if(self, node, cond, label):
+        """Emit a jump to label taken when the truth of node is cond."""
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            self.jump_if(node.operand, not cond, label)
+            return
+        if isinstance(node, ast.BoolOp):
+            if isinstance(node.op, ast.And) != cond:
+                for value in node.values:
+                    self.jump_if(value, cond, label)
+
+            else:
+                skip = Label()
+                for value in node.values[:-1]:
+                    self.jump_if(value, not cond, skip)
+
+                self.jump_if(node.values[(-1)], cond, label)
+                self.asm.mark(skip)
+            return
+        value = self.constant(node)
+        if value is not NOT_CONSTANT:
+            if bool(value) == cond:
+                self.emit('JUMP', label)
+            return
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.Is, ast.IsNot)):
+            if isinstance(node.comparators[0], ast.Constant) and node.comparators[0].value is None:
+                self.visit(node.left)
+                is_none = isinstance(node.ops[0], ast.Is) == cond
+                self.emit('POP_JUMP_IF_NONE' if is_none else 'POP_JUMP_IF_NOT_NONE', label)
+                return
+        self.visit(node)
+        self.emit('POP_JUMP_IF_TRUE' if cond else 'POP_JUMP_IF_FALSE', label)
+
+    def visit_Constant(self, node):
+        self.load_const(node.value)
+
+    def visit_Name(self, node):
+        self.name_op(node.id, type(node.ctx))
+
+    def visit_Attribute(self, node):
+        self.visit(node.value)
+        prefix = 'LOAD' if isinstance(node.ctx, ast.Load) else 'STORE' if isinstance(node.ctx, ast.Store) else 'DELETE'
+        self.emit(prefix + '_ATTR', self.asm.add_name(node.attr))
+
+    def visit_Subscript(self, node):
+        self.visit(node.value)
+        self.visit(node.slice)
+        if isinstance(node.ctx, ast.Load):
+            self.emit('BINARY_SUBSCR')
+        elif isinstance(node.ctx, ast.Store):
+            self.emit('STORE_SUBSCR')
+        else:
+            self.emit('DELETE_SUBSCR')
+
+    def visit_Slice(self, node):
+        for part in (node.lower, node.upper):
+            if part is None:
+                self.load_const(None)
+            else:
+                self.visit(part)
+
+        if node.step is not None:
+            self.visit(node.step)
+            self.emit('BUILD_SLICE', 3)
+        else:
+            self.emit('BUILD_SLICE', 2)
+
+    def binary_arg(self, op, inplace=False):
+        name = BINOPS.get(type(op))
+        if name is None:
+            raise Unsupported(op.__class__.__name__)
+        return NB_NAMES.index(('NB_INPLACE_' if inplace else 'NB_') + name)
+
+    def visit_BinOp(self, node):
+        value = self.constant(node)
+        if value is not NOT_CONSTANT:
+            self.load_const(value)
+            return
+        self.visit(node.left)
+        self.visit(node.right)
+        self.emit('BINARY_OP', self.binary_arg(node.op))
+
+    def visit_UnaryOp(self, node):
+        value = self.constant(node)
+        if value is not NOT_CONSTANT:
+            self.load_const(value)
+            return
+        self.visit(node.operand)
+        self.emit(UNARYOPS[type(node.op)])
+
+    def visit_BoolOp(self, node):
+        end = Label()
+        op = 'JUMP_IF_FALSE_OR_POP' if isinstance(node.op, ast.And) else 'JUMP_IF_TRUE_OR_POP'
+        for value in node.values[:-1]:
+            self.visit(value)
+            self.emit(op, end)
+
+        self.visit(node.values[(-1)])
+        self.asm.mark(end)
+
+    def compare(self, op):
+        name, arg = COMPARE[type(op)]
+        if name == 'COMPARE_OP':
+            arg = dis.cmp_op.index(arg)
+        self.emit(name, arg)
+
+    def visit_Compare(self, node):
+        value = self.constant(node)
+        self.visit(node.left)
+        if len(node.ops) == 1:
+            self.visit(node.comparators[0])
+            self.compare(node.ops[0])
+            return
+        cleanup, end = Label(), Label()
+        for op, comparator in zip(node.ops[:-1], node.comparators[:-1]):
+            self.visit(comparator)
+            self.emit('SWAP', 2)
+            self.emit('COPY', 2)
+            self.compare(op)
+            self.emit('JUMP_IF_FALSE_OR_POP', cleanup)
+
+        self.visit(node.comparators[(-1)])
+        self.compare(node.ops[(-1)])
+        self.emit('JUMP', end)
+        self.asm.mark(cleanup)
+        self.emit('SWAP', 2)
+        self.emit('POP_TOP')
+        self.asm.mark(end)
+
+    def visit_IfExp(self, node):
+        test = self.constant(node.test)
+        if test is not NOT_CONSTANT:
+            self.visit(node.body if test else node.orelse)
+            return
+        orelse, end = Label(), Label()
+        self.jump_if(node.test, False, orelse)
+        self.visit(node.body)
+        self.emit('JUMP', end)
+        self.asm.mark(orelse)
+        self.visit(node.orelse)
+        self.asm.mark(end)
+
+    def visit_sequence(self, elts, kind):
+        """Build a tuple, list or set of elts, which may be starred."""
+        if not any(isinstance(elt, ast.Starred) for elt in elts):
+            if kind == 'TUPLE':
+                values = [self.constant(elt) for elt in elts]
+                if NOT_CONSTANT not in values:
+                    self.load_const(tuple(values))
+                    return
+            for elt in elts:
+                self.visit(elt)
+
+            self.emit('BUILD_' + kind, len(elts))
+            return
+        container = 'SET' if kind == 'SET' else 'LIST'
+        count = 0
+        built = False
+        for elt in elts:
+            if isinstance(elt, ast.Starred):
+                if not built:
+                    self.emit('BUILD_' + container, count)
+                    built = True
+                self.visit(elt.value)
+                self.emit('SET_UPDATE' if kind == 'SET' else 'LIST_EXTEND', 1)
+            else:
+                self.visit(elt)
+                if built:
+                    self.emit('SET_ADD' if kind == 'SET' else 'LIST_APPEND', 1)
+                else:
+                    count += 1
+
+        if kind == 'TUPLE':
+            self.emit('LIST_TO_TUPLE')
+
+    def unpack(self, node):
+        elts = node.elts
+        starred = [i for i, elt in enumerate(elts) if isinstance(elt, ast.Starred)]
+        if len(starred) > 1:
+            raise Unsupported('multiple starred expressions in assignment')
+        if starred:
+            before = starred[0]
+            after = len(elts) - before - 1
+            if before > 255:
+                raise Unsupported('too many expressions in star-unpacking assignment')
+            self.emit('UNPACK_EX', before | after << 8)
+        else:
+            self.emit('UNPACK_SEQUENCE', len(elts))
+        for elt in elts:
+            self.visit(elt.value if isinstance(elt, ast.Starred) else elt)
+
+    def visit_Tuple(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.visit_sequence(node.elts, 'TUPLE')
+        elif isinstance(node.ctx, ast.Store):
+            self.unpack(node)
+        else:
+            for elt in node.elts:
+                self.visit(elt)
+
+    def visit_List(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.visit_sequence(node.elts, 'LIST')
+        else:
+            self.visit_Tuple(node)
+
+    def visit_Set(self, node):
+        self.visit_sequence(node.elts, 'SET')
+
+    def visit_Dict(self, node):
+        count = 0
+        built = False
+        for key, value in zip(node.keys, node.values):
+            if key is not None:
+                self.visit(key)
+                self.visit(value)
+                count += 1
+                continue
+            if count:
+                self.emit('BUILD_MAP', count)
+                if built:
+                    self.emit('DICT_UPDATE', 1)
+                built = True
+                count = 0
+            if not built:
+                self.emit('BUILD_MAP', 0)
+                built = True
+            self.visit(value)
+            self.emit('DICT_UPDATE', 1)
+
+        if count or not built:
+            self.emit('BUILD_MAP', count)
+            if built:
+                self.emit('DICT_UPDATE', 1)
+
+    def visit_JoinedStr(self, node):
+        if not node.values:
+            self.load_const('')
+            return
+        for value in node.values:
+            self.visit(value)
+
+        if len(node.values) > 1:
+            self.emit('BUILD_STRING', len(node.values))
+
+    def visit_FormattedValue(self, node):
+        self.visit(node.value)
+        flags = CONVERSIONS[node.conversion]
+        if node.format_spec is not None:
+            self.visit(node.format_spec)
+            flags |= 4
+        self.emit('FORMAT_VALUE', flags)
+
+    def visit_Starred(self, node):
+        raise Unsupported("can't use starred expression here")
+
+    def visit_Yield(self, node):
+        if node.value is None:
+            self.load_const(None)
+        else:
+            self.visit(node.value)
+        self.emit('YIELD_VALUE')
+        self.emit('RESUME', 1)
+
+    def visit_YieldFrom(self, node):
+        start, end = Label(), Label()
+        self.visit(node.value)
+        self.emit('GET_YIELD_FROM_ITER')
+        self.load_const(None)
+        self.asm.mark(start)
+        self.emit('SEND', end)
+        self.emit('YIELD_VALUE')
+        self.emit('RESUME', 2)
+        self.emit('JUMP_BACKWARD_NO_INTERRUPT', start)
+        self.asm.mark(end)
+
+    def divrem(self, node):
+        """
+        Return the BINARY_OP argument replacing a call of __div__ or
+        __rem__ giving the same result, or None.
+        """
+        func = node.func
+        if not isinstance(func, ast.Name) or func.id not in optimizer.DIVREM:
+            return
+        types = self.unit.types
+        if func.id in types.shadowed_ or len(node.args) != 2 or node.keywords:
+            return
+        left, right = node.args
+        if isinstance(left, ast.Starred) or isinstance(right, ast.Starred):
+            return
+        a, b = types.kind(left), types.kind(right)
+        if float in (a, b):
+            return self.binary_arg(ast.Mod() if func.id == '__rem__' else ast.Div())
+        if func.id == '__rem__':
+            if a is not None and b is not None:
+                # int(a % b) of two ints is a % b
+                return self.binary_arg(ast.Mod())
+
+    def call_keywords(self, keywords):
+        if not keywords:
+            return
+        names = tuple(keyword.arg for keyword in keywords)
+        if None in names:
+            raise Unsupported('** in class keywords')
+        if len(set(names)) != len(names):
+            raise Unsupported('keyword argument repeated')
+        for keyword in keywords:
+            self.visit(keyword.value)
+
+        self.emit('KW_NAMES', self.asm.const(names))
+
+    def keyword_map(self, keywords):
+        names = [keyword.arg for keyword in keywords]
+        if len(set(names)) != len(names):
+            raise Unsupported('keyword argument repeated')
+        for keyword in keywords:
+            self.load_const(keyword.arg)
+            self.visit(keyword.value)
+
+        self.emit('BUILD_MAP', len(keywords))
+
+    def call_ex(self, node):
+        args = node.args
+        if len(args) == 1 and isinstance(args[0], ast.Starred):
+            self.visit(args[0].value)
+        else:
+            self.visit_sequence(args, 'TUPLE')
+        if not node.keywords:
+            self.emit('CALL_FUNCTION_EX', 0)
+            return
+        built = False
+        plain = []
+        for keyword in node.keywords:
+            if keyword.arg is not None:
+                plain.append(keyword)
+                continue
+            if plain:
+                self.keyword_map(plain)
+                plain = []
+                if built:
+                    self.emit('DICT_MERGE', 1)
+                built = True
+            if not built:
+                self.emit('BUILD_MAP', 0)
+                built = True
+            self.visit(keyword.value)
+            self.emit('DICT_MERGE', 1)
+
+        if plain:
+            self.keyword_map(plain)
+            if built:
+                self.emit('DICT_MERGE', 1)
+        self.emit('CALL_FUNCTION_EX', 1)
+
+    def visit_Call(self, node):
+        op = self.divrem(node)
+        if op is not None:
+            self.visit(node.args[0])
+            self.visit(node.args[1])
+            self.emit('BINARY_OP', op)
+            return
+        func = node.func
+        star = any(isinstance(arg, ast.Starred) for arg in node.args) or any(keyword.arg is None for keyword in node.keywords)
+        if isinstance(func, ast.Attribute) and not star:
+            self.visit(func.value)
+            self.emit('LOAD_METHOD', self.asm.add_name(func.attr))
+        elif isinstance(func, ast.Name) and self.access(func.id) == 'global':
+            self.emit('LOAD_GLOBAL', self.asm.add_name(func.id) << 1 | 1)
+        else:
+            self.emit('PUSH_NULL')
+            self.visit(func)
+        if star:
+            self.call_ex(node)
+            return
+        for arg in node.args:
+            self.visit(arg)
+
+        self.call_keywords(node.keywords)
+        count = len(node.args) + len(node.keywords)
+        self.emit('PRECALL', count)
+        self.emit('CALL', count)
+
+
+class Unit:
+    __doc__ = '\n    The state shared by the compilers of the code objects of a module:\n    its scopes, the operand types known and the definitions left to\n    compile().\n    '
+
+    def __init__(self, module, filename):
+        self.module = module
+        self.filename = filename
+        self.types = optimizer.Optimizer(module)
+        self.scopes = {}
+        self.broken = set()
+        self.fallbacks = []
+
+    def analyze(self):
+        top = Scope('module', self.module, None)
+        table = SymbolTable(self.scopes, top)
+        for stmt in self.module.body:
+            count = len(top.children)
+            try:
+                table.visit(stmt)
+                for scope in top.children[count:]:
+                    resolve(scope, set())
+
+            except Unsupported:
+                if not isinstance(stmt, (ast.FunctionDef, ast.ClassDef)):
+                    raise
+                del top.children[count:]
+                self.broken.add(stmt)
+
+        return top
+
+    def compile(self):
+        top = self.analyze()
+        return Compiler(self, top, '<module>', '<module>', 1).compile_module(self.module)
+
+    def fallback(self, node):
+        """Return the code object compile() makes of a top level function or class."""
+        self.fallbacks.append(node.name)
+        code = compile(ast.Module(body=[node], type_ignores=[]), self.filename, 'exec')
+        for const in code.co_consts:
+            if isinstance(const, CodeType) and const.co_name == node.name:
+                return const
+
+        raise Unsupported(node.name)
+
+
+def compile_module(module, filename, fallbacks=None):
+    """
+    Compile a module ast to a code object, like compile(module, filename,
+    'exec'). The names of the top level definitions left to compile()
+    are appended to fallbacks, '<module>' if the whole module was.
+    """
+    if not supported:
+        raise RuntimeError('--backend=bytecode requires python 3.11')
+    unit = Unit(module, filename)
+    try:
+        code = unit.compile()
+    except Unsupported:
+        unit.fallbacks = ['<module>']
+        code = compile(module, filename, 'exec')
+
+    if fallbacks is not None:
+        fallbacks.extend(unit.fallbacks)
+    return code
+
+
+def dump(module, filename):
+    """Return the disassembly of the code the backend emits for a module."""
+    import io
+    fallbacks = []
+    code = compile_module(module, filename, fallbacks)
+    out = io.StringIO()
+    dis.dis(code, file=out)
+    if fallbacks:
+        out.write('\ncompiled by compile(): %s\n' % ', '.join(fallbacks))
+    return out.getvalue()
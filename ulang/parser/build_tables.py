@@ -0,0 +1,30 @@
+"""
+Precompile the LR table of the µlang grammar into the binary format
+loaded by ``MappedLRTable``.
+
+Run it once after installing ulang (or after changing the grammar)::
+
+    python -m ulang.parser.build_tables [output_file]
+"""
+import sys
+from ulang.parser.core import Parser
+
+
+def build(path=None):
+    pg = Parser.pg_
+    g = pg.build_grammar()
+    pg.grammar_hash = pg.compute_grammar_hash(g)
+    table = pg.build_table(g, binary=False)
+    path = path or pg.table_file()
+    pg.write_binary_table(table, path)
+    return path
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    print('written %s' % build(argv[1] if len(argv) > 1 else None))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,18 +7,37 @@ from rply.token import SourcePosition
 from rply.errors import LexingError
 from ulang.parser.lexer import RULES, lexer
 from ulang.parser.error import SyntaxError
-from ulang.parser.lrparser import LRParser
+from ulang.parser.lrparser import ArrayLRParser, LRParser
 from ulang.parser.parsergenerator import ParserGenerator
-from ulang.codegen.blockly import randomString
-import ast
+from ulang.parser import parfor, slots
+import ast, random, re, string, threading
+from collections import deque
 from copy import deepcopy
 
+# `\(expr\)` and `` `expr` `` interpolations inside string literals
+FORMAT_PATTERN = re.compile('\\\\\\(([^\\\\\\)]*)\\\\\\)|\\`([^\\`]*)\\`')
+
+def randomString(stringLength=20):
+    """
+    Generate a random name of fixed length for anonymous functions
+    """
+    letters = string.ascii_letters
+    return ''.join((random.choice(letters) for i in range(stringLength)))
+
+
 class NameFixPass(ast.NodeTransformer):
-    __doc__ = "\n    A python NodeVisitor which traverses the generated ast\n    to fix the signature of class methods by adding the\n    implicit argument 'self' and also convert the function\n    name of the class constructors..\n    "
+    __doc__ = "\n    A python NodeVisitor which traverses the generated ast\n    to fix the signature of class methods by adding the\n    implicit argument 'self' and also convert the function\n    name of the class constructors. Types whose fields are\n    known get __slots__, see ulang.parser.slots.\n    "
 
     def __init__(self, filename):
         self.filename = filename
         self.cls = ['']
+        self.outside = None
+        self.slotted = {}
+
+    def visit_Module(self, module):
+        if slots.enabled:
+            self.outside = slots.outside_stores(module)
+        return self.generic_visit(module)
 
     def visit_FunctionDef(self, func):
         if func.name.startswith('$'):
@@ -46,6 +65,8 @@ class NameFixPass(ast.NodeTransformer):
         self.cls.append(cls.name)
         cls = self.generic_visit(cls)
         self.cls.pop(-1)
+        if self.outside is not None:
+            cls = slots.add_slots(cls, self.outside, self.slotted)
         return cls
 
     def visit_Call(self, call):
@@ -78,7 +99,7 @@ class NameFixPass(ast.NodeTransformer):
 
 
 class AnnoFuncInsertPass(ast.NodeTransformer):
-    __doc__ = '\n    Visit all ast to insert each anonymous function\n    just before where it has been referenced.\n    '
+    __doc__ = '\n    Visit all ast to insert each anonymous function just before\n    the statement it belongs to, as recorded by the parser.\n    '
 
     def __init__(self, anonfuncs):
         self.anonfuncs_ = anonfuncs
@@ -115,46 +136,143 @@ class AnnoFuncInsertPass(ast.NodeTransformer):
     def visit_stmts(self, stmts):
         new_stmts = []
         for stmt in stmts:
+            funcs = self.anonfuncs_.pop(stmt, None)
             stmt = self.visit(stmt)
-            for node in ast.walk(stmt):
-                if isinstance(node, ast.Name) and node in self.anonfuncs_:
-                    new_stmts.append(self.anonfuncs_[node])
-                    del self.anonfuncs_[node]
+            if funcs:
+                if len(funcs) > 1:
+                    funcs = self.reference_order(stmt, funcs)
+                for func in funcs:
+                    new_stmts.append(self.visit(func))
 
             new_stmts.append(stmt)
 
         return new_stmts
 
+    def reference_order(self, stmt, funcs):
+        """
+        Sort the anonymous functions of a statement in the breadth first
+        order of their references, skipping the nested statements which
+        have their own functions.
+        """
+        funcs = {func.name: func for func in funcs}
+        ordered = []
+        todo = deque([stmt])
+        while todo:
+            node = todo.popleft()
+            if isinstance(node, ast.Name):
+                if node.id in funcs:
+                    ordered.append(funcs.pop(node.id))
+            for field, value in ast.iter_fields(node):
+                if isinstance(value, list):
+                    if not (value and isinstance(value[0], ast.stmt)):
+                        todo.extend((item for item in value if isinstance(item, ast.AST)))
+                elif isinstance(value, ast.AST):
+                    todo.append(value)
+
+        return ordered + list(funcs.values())
+
 
 class Parser:
     __doc__ = '\n    A simple LR(1) parser to parse the source code of µ\n    and yield the python ast for later using..\n    '
 
-    def __init__(self, lexer=lexer):
+    def __init__(self, lexer=lexer, reference=False):
         self.lexer_ = lexer
         self.filename_ = ''
-        self.anonfuncs_ = {}
+        self.anonfuncs_ = []
+        self.hoisted_ = {}
         self.source_ = None
+        self.reference_ = reference
 
     def parse(self, source, filename=''):
+        nodes, anonfuncs = self.parse_tokens(self.lexer_.lex(source), source.split('\n'), filename)
+        nodes.body[0:0] = anonfuncs
+        nodes = NameFixPass(filename).visit(nodes)
+        return nodes
+
+    def parse_tokens(self, tokens, lines, filename=''):
+        """
+        Parse the tokens of a source given as a list of lines, return
+        the module before NameFixPass and the anonymous functions which
+        belong to no statement, parse() puts them first. The language
+        service parses a file statement by statement with it.
+        """
         self.filename_ = filename
-        self.source_ = source.split('\n')
+        self.source_ = lines
+        self.anonfuncs_ = []
+        self.hoisted_ = {}
         try:
-            tokens = self.lexer_.lex(source)
-            nodes = self.parser_.parse(tokens, state=self)
+            nodes = self.lrparser().parse(tokens, state=self)
+        except LexingError as e:
+            raise self.lexing_error(e)
+
+        anonfuncs, self.anonfuncs_ = self.anonfuncs_, []
+        insert = AnnoFuncInsertPass(self.hoisted_)
+        anonfuncs = insert.visit_stmts(anonfuncs)
+        nodes = insert.visit(nodes)
+        self.hoisted_ = {}
+        return (nodes, anonfuncs)
+
+    def lexing_error(self, e):
+        return SyntaxError(message='unknown token is found here',
+          filename=(self.filename_),
+          lineno=(e.getsourcepos().lineno),
+          colno=(e.getsourcepos().colno),
+          source=(self.source_))
+
+    def lrparser(self):
+        self.build_parser()
+        if self.reference_:
+            return self.reference_parser_
+        return self.parser_
+
+    def parse_expr(self, source, pos):
+        """
+        Parse a single expression embedded in the current source, e.g.
+        an interpolation of a string literal. The expression is parsed
+        by the same parser instance as `___ = expr`, its tokens are placed
+        at the given source position so errors point into the literal.
+        """
+        def relocate(token):
+            sp = token.getsourcepos()
+            return Token(token.gettokentype(), token.getstr(), SourcePosition(pos.idx + sp.idx, pos.lineno + sp.lineno - 1, pos.colno + sp.colno - 1 if sp.lineno == 1 else sp.colno))
+
+        try:
+            tokens = [relocate(token) for token in self.lexer_.lex(source)]
         except LexingError as e:
             try:
+                sp = relocate(Token('', '', e.getsourcepos())).getsourcepos()
                 raise SyntaxError(message='unknown token is found here',
                   filename=(self.filename_),
-                  lineno=(e.getsourcepos().lineno),
-                  colno=(e.getsourcepos().colno),
+                  lineno=(sp.lineno),
+                  colno=(sp.colno),
                   source=(self.source_))
             finally:
                 e = None
                 del e
 
-        nodes = AnnoFuncInsertPass(self.anonfuncs_).visit(nodes)
-        nodes = NameFixPass(filename).visit(nodes)
-        return nodes
+        tokens[0:0] = [Token('IDENTIFIER', '___', pos), Token('=', '=', pos)]
+        module = self.lrparser().parse(iter(tokens), state=self)
+        self.anonfuncs_.extend(self.hoisted_.pop(module.body[0], []))
+        return module.body[0].value
+
+    def hoist(self, p, stmt):
+        """
+        Hand the pending anonymous functions created inside the statement
+        being reduced over to it, AnnoFuncInsertPass will insert them just
+        before the statement. Inner statements are reduced first and take
+        their own functions, so each function is claimed exactly once.
+        """
+        if not self.anonfuncs_ or not isinstance(stmt, ast.stmt):
+            return stmt
+        start = self.getsourcepos(p)
+        if start.lineno == 0:
+            return stmt
+        start = (start.lineno, start.colno)
+        owned = [func for func in self.anonfuncs_ if (func.lineno, func.col_offset) >= start]
+        if owned:
+            self.anonfuncs_ = [func for func in self.anonfuncs_ if (func.lineno, func.col_offset) < start]
+            self.hoisted_.setdefault(stmt, []).extend(owned)
+        return stmt
 
     def getsourcepos(self, p):
         if isinstance(p, list):
@@ -164,7 +282,7 @@ class Parser:
             if p.gettokentype() == '$end':
                 return self.getendpos()
             return p.getsourcepos()
-        if isinstance(p, ast.stmt) or isinstance(p, ast.expr):
+        if isinstance(p, ast.stmt) or isinstance(p, ast.expr) or isinstance(p, ast.arg):
             return SourcePosition(0, p.lineno, p.col_offset)
         return SourcePosition(0, 0, 0)
 
@@ -263,7 +381,7 @@ class Parser:
     @pg_.production('stmt : for_stmt')
     @pg_.production('stmt : declaration')
     def compound_stmt(self, p):
-        return p[0]
+        return self.hoist(p, p[0])
 
     @pg_.production('type_define : TYPE name bases type_body')
     def type_define(self, p):
@@ -309,7 +427,7 @@ class Parser:
     @pg_.production('type_stmt : function')
     @pg_.production('type_stmt : property')
     def type_stmt(self, p):
-        return p[0]
+        return self.hoist(p, p[0])
 
     @pg_.production('property : ATTR IDENTIFIER block')
     @pg_.production('property : ATTR IDENTIFIER ( ) block')
@@ -499,7 +617,7 @@ class Parser:
     @pg_.production('stmt : throw_stmt')
     @pg_.production('stmt : ret_stmt')
     def stmt(self, p):
-        return p[0]
+        return self.hoist(p, p[0])
 
     @pg_.production('throw_stmt : THROW expr')
     def throw_stmt(self, p):
@@ -1022,7 +1140,7 @@ class Parser:
     @pg_.production('primary_expr : ( name : type_name , param_list_not_empty )')
     @pg_.production('primary_expr : ( name , param_list_not_empty )')
     def primary_expr_(self, p):
-        args = ast.arguments(args=[], kwonlyargs=[], kw_defaults=[], defaults=[], vararg=None,
+        args = ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[], vararg=None,
           kwarg=None,
           lineno=(self.getlineno(p)),
           col_offset=(self.getcolno(p)))
@@ -1055,10 +1173,18 @@ class Parser:
           lineno=(self.getlineno(p)),
           col_offset=(self.getcolno(p)))
 
-    @pg_.production('slice : expr : expr ')
-    @pg_.production('slice : expr : ')
-    @pg_.production('slice : : expr')
-    @pg_.production('slice : : ')
+    @pg_.production('slice : span')
+    @pg_.production('dim : expr')
+    @pg_.production('dim : span')
+    def slice_dim(self, p):
+        if isinstance(p[0], ast.Slice):
+            return p[0]
+        return self.slice_index(p)
+
+    @pg_.production('span : expr : expr ')
+    @pg_.production('span : expr : ')
+    @pg_.production('span : : expr')
+    @pg_.production('span : : ')
     def slice_presentation(self, p):
         lower, upper = p[0], p[(-1)]
         if isinstance(lower, Token):
@@ -1071,10 +1197,10 @@ class Parser:
           lineno=(self.getlineno(p)),
           col_offset=(self.getcolno(p)))
 
-    @pg_.production('slice : exprs , expr')
+    @pg_.production('slice : dims , dim')
     def slice_indeces(self, p):
         p[0].append(p[2])
-        return ast.ExtSlice(dims=[self.slice_index([e]) for e in p[0]],
+        return ast.ExtSlice(dims=(p[0]),
           lineno=(self.getlineno(p)),
           col_offset=(self.getcolno(p)))
 
@@ -1114,7 +1240,9 @@ class Parser:
                 args.append(v)
             else:
                 keywords.append(ast.keyword(arg=k,
-                  value=v))
+                  value=v,
+                  lineno=(self.getlineno(p)),
+                  col_offset=(self.getcolno(p))))
 
         return ast.Call(func=(p[0]),
           args=args,
@@ -1159,7 +1287,7 @@ class Parser:
         if isinstance(p[0], ast.Starred):
             p[0] = p[0].value
         if isinstance(p[0], ast.Name):
-            args = ast.arguments(args=[], kwonlyargs=[], kw_defaults=[], defaults=[], vararg=None,
+            args = ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[], vararg=None,
               kwarg=None,
               lineno=(self.getlineno(p)),
               col_offset=(self.getcolno(p)))
@@ -1191,12 +1319,15 @@ class Parser:
     def lambda_expr(self, p):
         if len(p) == 1:
             return p[0]
+        # the parameters are no token, the position is that of the first
+        # one, or of the body: an expression or a block of statements
+        first = p[0].args[0] if getattr(p[0], 'args', None) else p[(-1)]
         if isinstance(p[(-1)], ast.expr):
             return ast.Lambda(args=(p[0]),
               body=(p[(-1)]),
-              lineno=(self.getlineno(p)),
-              col_offset=(self.getcolno(p)))
-        return self.create_anon_func(p, p[0], p[(-1)])
+              lineno=(first.lineno),
+              col_offset=(first.col_offset))
+        return self.create_anon_func(first, p[0], p[(-1)])
 
     @pg_.production('lambda_func : FUNC ( param_list ) block')
     @pg_.production('lambda_func : FUNC block')
@@ -1235,7 +1366,7 @@ class Parser:
           returns=returns,
           lineno=(self.getlineno(p)),
           col_offset=(self.getcolno(p)))
-        self.anonfuncs_[func_name] = func
+        self.anonfuncs_.append(func)
         return func_name
 
     @pg_.production('number : HEX_LITERAL')
@@ -1268,36 +1399,37 @@ class Parser:
           col_offset=(self.getcolno(p)))
 
     def parse_format_str(self, string, p):
-        import re
-        pattern = re.compile('\\\\\\(([^\\\\\\)]*)\\\\\\)|\\`([^\\`]*)\\`')
-        format_string = string
-        exprs = []
+        lineno, colno = self.getlineno(p), self.getcolno(p)
+        values = []
         pos = 0
-        while True:
-            match = pattern.search(string=string,
-              pos=pos)
-            if match is None:
-                break
-            pos = match.span()[1]
-            expr = match.group(1)
-            if expr is None:
-                expr = match.group(2)
-            submo = Parser().parse('str(%s)' % expr)
-            exprs.append(submo.body[0].value)
-            format_string = format_string.replace(match.group(0), '%s')
-
-        if len(exprs) == 0:
+        for match in FORMAT_PATTERN.finditer(string):
+            group = 1 if match.group(1) is not None else 2
+            if match.start() > pos:
+                values.append(ast.Str(string[pos:match.start()],
+                  lineno=lineno,
+                  col_offset=colno))
+            pos = match.end()
+            expr = match.group(group)
+            if expr.strip() == '':
+                continue
+            start = p[0].getsourcepos()
+            offset = match.start(group) + 1
+            value = self.parse_expr(expr, SourcePosition(start.idx + offset, lineno, colno + offset))
+            values.append(ast.FormattedValue(value=value,
+              conversion=(ord('s')),
+              format_spec=None,
+              lineno=lineno,
+              col_offset=colno))
+
+        if pos == 0:
             return
-        return ast.BinOp(left=ast.Str(s=format_string,
-          lineno=(self.getlineno(p)),
-          col_offset=(self.getcolno(p))),
-          op=(ast.Mod()),
-          right=ast.Tuple(elts=exprs,
-          ctx=(ast.Load()),
-          lineno=(self.getlineno(p)),
-          col_offset=(self.getcolno(p))),
-          lineno=(self.getlineno(p)),
-          col_offset=(self.getcolno(p)))
+        if pos < len(string):
+            values.append(ast.Str((string[pos:]),
+              lineno=lineno,
+              col_offset=colno))
+        return ast.JoinedStr(values=values,
+          lineno=lineno,
+          col_offset=colno)
 
     @pg_.production('name_const : TRUE')
     def const_true(self, p):
@@ -1413,6 +1545,8 @@ class Parser:
     @pg_.production('args : args , arg')
     @pg_.production('exprs : expr')
     @pg_.production('exprs : exprs , expr')
+    @pg_.production('dims : dim')
+    @pg_.production('dims : dims , dim')
     def exprs(self, p):
         if len(p) == 3:
             p[0].append(p[2])
@@ -1431,7 +1565,7 @@ class Parser:
     @pg_.production('param_list : param_list_not_empty')
     def param_list(self, p=[]):
         if not p:
-            return ast.arguments(args=[], kwonlyargs=[], kw_defaults=[], defaults=[], vararg=None,
+            return ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[], vararg=None,
               kwarg=None)
         return self.legalize_arguments(p[0])
 
@@ -1500,17 +1634,17 @@ class Parser:
             return []
         else:
             if len(p) == 5:
-                return ast.If(test=(p[1]),
+                return self.hoist(p, ast.If(test=(p[1]),
                   body=(p[2]),
                   orelse=(p[(-1)]),
                   lineno=(self.getlineno(p)),
-                  col_offset=(self.getcolno(p)))
+                  col_offset=(self.getcolno(p))))
             p[-1] = p[-1] if isinstance(p[(-1)], list) else [p[(-1)]]
-        return ast.If(test=(p[1]),
+        return self.hoist(p, ast.If(test=(p[1]),
           body=(p[2]),
           orelse=(p[(-1)]),
           lineno=(self.getlineno(p)),
-          col_offset=(self.getcolno(p)))
+          col_offset=(self.getcolno(p))))
 
     @pg_.production('if_stmt : stmt IF expr')
     def single_if(self, p):
@@ -1590,6 +1724,47 @@ class Parser:
         np.append([p[0]])
         return self.for_stmt(np)
 
+    @pg_.production('for_stmt : PAR pragma FOR iterator IN loop_range block')
+    @pg_.production('for_stmt : PAR pragma FOR iterator : loop_range block')
+    def par_for_stmt(self, p):
+        return self.par_for(p[1], self.for_stmt(p[2:]))
+
+    @pg_.production('for_stmt : stmt PAR pragma FOR iterator IN loop_range')
+    @pg_.production('for_stmt : stmt PAR pragma FOR iterator : loop_range')
+    def single_par_for_stmt(self, p):
+        return self.par_for(p[2], self.single_for_stmt([p[0]] + p[3:]))
+
+    @pg_.production('pragma : ')
+    @pg_.production('pragma : ( name )')
+    @pg_.production('pragma : ( name , expr )')
+    def pragma(self, p):
+        if not p:
+            return (parfor.POOLS[0], None)
+        if not isinstance(p[1], ast.Name) or p[1].id not in parfor.POOLS:
+            raise SyntaxError(message=('a par for loop runs in a %s pool' % ' or '.join(parfor.POOLS)),
+              filename=(self.filename_),
+              lineno=(self.getlineno(p[1])),
+              colno=(self.getcolno(p[1])),
+              source=(self.source_))
+        return (p[1].id, p[3] if len(p) == 5 else None)
+
+    def par_for(self, pragma, loop):
+        """
+        Compile a par for loop into the function of its body, hoisted like
+        an anonymous function, and the statement running it.
+        """
+
+        def error(message, node):
+            raise SyntaxError(message=message,
+              filename=(self.filename_),
+              lineno=(node.lineno),
+              colno=(node.col_offset),
+              source=(self.source_))
+
+        func, stmt = parfor.compile_loop(loop, randomString(), pragma[0], pragma[1], error)
+        self.anonfuncs_.append(func)
+        return stmt
+
     @pg_.production('name : IDENTIFIER')
     def identifier(self, p):
         id = p[0].getstr()
@@ -1640,9 +1815,26 @@ class Parser:
           lineno=(self.getlineno(args)),
           col_offset=(self.getcolno(args)))
 
-    parser_ = LRParser(pg_.build())
-    if len(parser_.lr_table.rr_conflicts) > 0:
-        print(parser_.lr_table.rr_conflicts)
-    if len(parser_.lr_table.sr_conflicts) > 0:
-        print(parser_.lr_table.sr_conflicts)
+    reference_parser_ = None
+    parser_ = None
+    build_lock_ = threading.Lock()
+
+    @classmethod
+    def build_parser(cls):
+        """
+        Build the LR parsers from the grammar on first use,
+        so importing this module stays cheap.
+        """
+        if cls.parser_ is not None:
+            return cls.parser_
+        with cls.build_lock_:
+            if cls.parser_ is None:
+                reference_parser = LRParser(cls.pg_.build())
+                if len(reference_parser.lr_table.rr_conflicts) > 0:
+                    print(reference_parser.lr_table.rr_conflicts)
+                if len(reference_parser.lr_table.sr_conflicts) > 0:
+                    print(reference_parser.lr_table.sr_conflicts)
+                cls.reference_parser_ = reference_parser
+                cls.parser_ = ArrayLRParser(reference_parser)
+        return cls.parser_
 # okay decompiling E:\ulang\ulang-0.2.2.exe_extracted\PYZ-00.pyz_extracted\ulang.parser.core.pyc
@@ -13,6 +13,11 @@ class SyntaxError(ValueError):
         self.colno_ = colno if colno > 0 else 1
         self.source_ = source
 
+    def __reduce__(self):
+        # raised with keywords, args is empty: rebuilt from the fields
+        # when a worker of ``ulang build`` sends it back
+        return (self.__class__, (self.message_, self.filename_, self.lineno_, self.colno_, self.source_))
+
     def __str__(self):
         msg = 'File "%s", line %d:%d, %s' % (
          self.filename_, self.lineno_, self.colno_, self.message_)
@@ -3,6 +3,8 @@
 # Decompiled from: Python 3.7.2rc1 (tags/v3.7.2rc1:75a402a217, Dec 11 2018, 22:09:03) [MSC v.1916 32 bit (Intel)]
 # Embedded file name: ulang\parser\lexer.py
 from rply import LexerGenerator
+from rply.errors import LexingError
+from rply.token import SourcePosition, Token
 import rply, re
 RULES = [
  'FLOAT_LITERAL',
@@ -23,6 +25,7 @@ RULES = [
  'WHILE',
  'LOOP',
  'FOR',
+ 'PAR',
  'BREAK',
  'CONTINUE',
  'RETURN',
@@ -108,6 +111,7 @@ lg.add('ELSE', '\\r*\\n*\\s*else\\s*\\r*\\n*', flags=(re.DOTALL))
 lg.add('WHILE', '\\bwhile\\b')
 lg.add('LOOP', '\\bloop\\b')
 lg.add('FOR', '\\bfor\\b')
+lg.add('PAR', '\\bpar\\b')
 lg.add('RETURN', '\\breturn\\b')
 lg.add('BREAK', '\\bbreak\\b')
 lg.add('CONTINUE', '\\bcontinue\\b')
@@ -179,5 +183,122 @@ lg.ignore('^#!.*')
 lg.ignore('[ \t\r]+')
 lg.ignore('//[^\n]*')
 lg.ignore('/\\*.*?\\*/', flags=(re.DOTALL))
-lexer = lg.build()
+rply_lexer = lg.build()
+
+# the string rules refer to their quote by a backreference, which would
+# point to the wrong group inside the master regex
+MASTER_PATTERNS = {
+ 'STRING_LITERAL': '"(?:(?<!\\\\)\\\\"|.)*?"',
+ 'STRING_LITERAL_II': "'(?:(?<!\\\\)\\\\'|.)*?'"}
+KEYWORD_PATTERN = re.compile('\\\\b([a-z]+)\\\\b$')
+WORD = re.compile('\\w')
+
+
+class Lexer(object):
+    __doc__ = "\n    A lexer matching all the rules of a rply LexerGenerator with one\n    master regex.\n\n    The rules are joined into a single alternation in their original\n    order, ignored rules first, so the first alternative that matches\n    wins just like in rply.  Keyword rules of the form '\\\\bword\\\\b' are\n    resolved by a dict lookup on the IDENTIFIER matches instead, and the\n    source can be read from a file object chunk by chunk.\n    "
+    MARGIN = 16
+
+    def __init__(self, generator, identifier='IDENTIFIER'):
+        self.keywords = {}
+        self.names = [None]
+        alternatives = []
+        for rule in generator.ignore_rules:
+            alternatives.append((None, rule.re.pattern, rule.re.flags))
+
+        for rule in generator.rules:
+            keyword = KEYWORD_PATTERN.match(rule.re.pattern)
+            if keyword:
+                self.keywords.setdefault(keyword.group(1), rule.name)
+            else:
+                pattern = MASTER_PATTERNS.get(rule.name, rule.re.pattern)
+                alternatives.append((rule.name, pattern, rule.re.flags))
+
+        groups = []
+        for name, pattern, flags in alternatives:
+            if flags & re.DOTALL:
+                pattern = '(?s:%s)' % pattern
+            groups.append('(%s)' % pattern)
+            self.names.append(name)
+
+        self.identifier = identifier
+        self.regex = re.compile('|'.join(groups))
+        assert self.regex.groups == len(groups)
+
+    def lex(self, s):
+        return self._lex(s, None, 0)
+
+    def lex_file(self, f, chunk_size=65536):
+        """
+        Lex the text read from the file object f in chunks,
+        so the whole source never has to be in memory.
+        """
+        return self._lex(f.read(chunk_size), f, chunk_size)
+
+    def _safe_end(self, buf):
+        # a match ending past here might still change with more input,
+        # e.g. '\n  els' may become ELSE once the rest of the word arrives
+        end = len(buf.rstrip())
+        i = end
+        while i > 0 and end - i < self.MARGIN and not buf[i - 1].isspace():
+            i -= 1
+
+        if end - i < self.MARGIN:
+            while i > 0 and buf[i - 1].isspace():
+                i -= 1
+
+        return i - self.MARGIN
+
+    def _lex(self, buf, f, chunk_size):
+        match = self.regex.match
+        word = WORD.match
+        names = self.names
+        keywords = self.keywords
+        identifier = self.identifier
+        eof = f is None
+        limit = len(buf) if eof else self._safe_end(buf)
+        base = 0
+        pos = 0
+        lineno = 1
+        colno = 1
+        last_nl = -1
+        while True:
+            if eof and pos >= len(buf):
+                return
+            m = match(buf, pos)
+            if not eof:
+                if m is None or m.end() > limit or buf.startswith('/*', pos) and names[m.lastindex] == '/':
+                    more = f.read(chunk_size)
+                    if pos > chunk_size:
+                        # keep one char for lookbehinds and '^'
+                        base += pos - 1
+                        buf = buf[pos - 1:]
+                        pos = 1
+                    buf += more
+                    if more:
+                        limit = self._safe_end(buf)
+                    else:
+                        eof = True
+                        limit = len(buf)
+                    continue
+            if m is None:
+                raise LexingError(None, SourcePosition(base + pos, lineno, colno))
+            start, pos = m.span()
+            value = m.group()
+            name = names[m.lastindex]
+            if name is not None:
+                if name == identifier:
+                    if value in keywords:
+                        if base + start == 0 or not word(buf, start - 1):
+                            if not word(buf, pos):
+                                name = keywords[value]
+                colno = base + start - last_nl
+                token = Token(name, value, SourcePosition(base + start, lineno, colno))
+            if '\n' in value:
+                lineno += value.count('\n')
+                last_nl = base + buf.rfind('\n', start, pos)
+            if name is not None:
+                yield token
+
+
+lexer = Lexer(lg)
 # okay decompiling E:\ulang\ulang-0.2.2.exe_extracted\PYZ-00.pyz_extracted\ulang.parser.lexer.pyc
@@ -2,7 +2,9 @@
 # Python bytecode 3.7 (3394)
 # Decompiled from: Python 3.7.2rc1 (tags/v3.7.2rc1:75a402a217, Dec 11 2018, 22:09:03) [MSC v.1916 32 bit (Intel)]
 # Embedded file name: ulang\parser\lrparser.py
+from array import array
 from rply.errors import ParsingError
+from ulang.parser.parsergenerator import MappedLRTable
 
 class LRParser:
 
@@ -81,4 +83,123 @@ class LRParser:
         current_state = self.lr_table.lr_goto[statestack[(-1)]][pname]
         statestack.append(current_state)
         return current_state
+
+
+class ArrayLRParser:
+    __doc__ = '\n    A LR driver over dense int tables.\n\n    Token types are mapped to small ints once as each token is read,\n    actions and gotos are looked up in flat arrays indexed by\n    state * width + symbol, and the state and symbol stacks are\n    preallocated and reused between parses.  LRParser stays the\n    reference implementation for differential testing.\n    '
+    ERROR = MappedLRTable.ERROR
+
+    def __init__(self, lrparser):
+        table = lrparser.lr_table
+        self.lr_table = table
+        self.error_handler = lrparser.error_handler
+        if isinstance(table, MappedLRTable):
+            self.token_ids = table.terminal_ids
+            nonterminal_ids = table.nonterminal_ids
+            self.action = array('i', table.action.tobytes())
+            self.goto = array('i', table.goto.tobytes())
+        else:
+            grammar = table.grammar
+            self.token_ids = {name: i for i, name in enumerate(sorted(set(grammar.terminals) | {'$end'}))}
+            nonterminal_ids = {name: i for i, name in enumerate(sorted(grammar.nonterminals))}
+            self.action = array('i', [self.ERROR]) * (len(table.lr_action) * len(self.token_ids))
+            self.goto = array('i', [-1]) * (len(table.lr_goto) * len(nonterminal_ids))
+            for st, actions in enumerate(table.lr_action):
+                for name, t in actions.items():
+                    self.action[st * len(self.token_ids) + self.token_ids[name]] = t
+
+            for st, gotos in enumerate(table.lr_goto):
+                for name, j in gotos.items():
+                    self.goto[st * len(nonterminal_ids) + nonterminal_ids[name]] = j
+
+        self.width = len(self.token_ids)
+        self.goto_width = len(nonterminal_ids)
+        self.default_reductions = array('i', table.default_reductions)
+        productions = table.grammar.productions
+        self.prod_length = array('i', [p.getlength() for p in productions])
+        self.prod_goto = array('i', [nonterminal_ids.get(p.name, -1) for p in productions])
+        self.prod_func = [p.func for p in productions]
+        self.end_id = self.token_ids['$end']
+        self.free_stacks = []
+
+    def parse(self, tokenizer, state=None):
+        from rply.token import Token
+        # concurrent or nested parses (e.g. from a production) never share stacks
+        try:
+            stacks = self.free_stacks.pop()
+        except IndexError:
+            stacks = ([0] * 256, [None] * 256)
+        statestack, symstack = stacks
+        try:
+            return self._parse(tokenizer, state, statestack, symstack, Token)
+        finally:
+            # only the room is reused, not the tokens and nodes of the parse
+            symstack[:] = [None] * len(symstack)
+            self.free_stacks.append(stacks)
+
+    def _parse(self, tokenizer, state, statestack, symstack, Token):
+        action = self.action
+        goto = self.goto
+        width = self.width
+        goto_width = self.goto_width
+        default_reductions = self.default_reductions
+        prod_length = self.prod_length
+        prod_goto = self.prod_goto
+        prod_func = self.prod_func
+        token_ids = self.token_ids
+        ERROR = self.ERROR
+        lookahead = None
+        ltype = -1
+        sp = 0
+        statestack[0] = 0
+        symstack[0] = Token('$end', '$end')
+        current_state = 0
+        while True:
+            t = default_reductions[current_state]
+            if not t:
+                if lookahead is None:
+                    lookahead = next(tokenizer, None)
+                    if lookahead is None:
+                        lookahead = Token('$end', '$end')
+                        ltype = self.end_id
+                    else:
+                        ltype = token_ids.get(lookahead.name, -1)
+                t = action[current_state * width + ltype] if ltype >= 0 else ERROR
+                if t > 0:
+                    sp += 1
+                    if sp == len(statestack):
+                        statestack.extend(statestack)
+                        symstack.extend(symstack)
+                    statestack[sp] = t
+                    symstack[sp] = lookahead
+                    current_state = t
+                    lookahead = None
+                    continue
+                if t == 0:
+                    return symstack[sp]
+                if t == ERROR:
+                    if self.error_handler is None:
+                        raise ParsingError(None, lookahead.getsourcepos())
+                    if state is None:
+                        self.error_handler(lookahead)
+                    else:
+                        self.error_handler(state, lookahead)
+                    lookahead = None
+                    continue
+            # reduce by production -t, whose function gets a list of its own:
+            # productions write into it and may keep it
+            plen = prod_length[-t]
+            targ = symstack[sp - plen + 1:sp + 1]
+            sp -= plen
+            if state is None:
+                value = prod_func[-t](targ)
+            else:
+                value = prod_func[-t](state, targ)
+            current_state = goto[statestack[sp] * goto_width + prod_goto[-t]]
+            sp += 1
+            if sp == len(statestack):
+                statestack.extend(statestack)
+                symstack.extend(symstack)
+            statestack[sp] = current_state
+            symstack[sp] = value
 # okay decompiling E:\ulang\ulang-0.2.2.exe_extracted\PYZ-00.pyz_extracted\ulang.parser.lrparser.pyc
@@ -0,0 +1,288 @@
+"""
+An optional optimisation pass over the python ast generated by the parser,
+run between ``Parser.parse`` and ``compile()`` (``ulang -O``).
+
+It folds constant expressions, replaces the runtime ``__div__`` and
+``__rem__`` helpers by plain operators when the types of both operands are
+known (``__div__`` only with a float operand, that of two ints going
+through a float quotient), and so precomputes the bounds of ``a..b by step`` ranges whose step
+is a literal.
+"""
+import ast, math, operator
+
+# switched on by ``ulang -O``, also applies to imported modules
+enabled = False
+
+NOT_CONSTANT = object()
+MAX_SIZE = 4096
+
+BINOPS = {ast.Add: operator.add,
+ ast.Sub: operator.sub,
+ ast.Mult: operator.mul,
+ ast.Div: operator.truediv,
+ ast.FloorDiv: operator.floordiv,
+ ast.Mod: operator.mod,
+ ast.Pow: operator.pow,
+ ast.LShift: operator.lshift,
+ ast.RShift: operator.rshift,
+ ast.BitOr: operator.or_,
+ ast.BitXor: operator.xor,
+ ast.BitAnd: operator.and_}
+
+UNARYOPS = {ast.UAdd: operator.pos,
+ ast.USub: operator.neg,
+ ast.Invert: operator.invert,
+ ast.Not: operator.not_}
+
+CMPOPS = {ast.Eq: operator.eq,
+ ast.NotEq: operator.ne,
+ ast.Lt: operator.lt,
+ ast.LtE: operator.le,
+ ast.Gt: operator.gt,
+ ast.GtE: operator.ge}
+
+
+def builtin_div(a, b):
+    if isinstance(a, int):
+        if isinstance(b, int):
+            return math.floor(a / b)
+    return a / b
+
+
+def builtin_rem(a, b):
+    if isinstance(a, int):
+        if isinstance(b, int):
+            return int(a % b)
+    return a % b
+
+
+DIVREM = {'__div__': builtin_div,
+ '__rem__': builtin_rem}
+
+
+def literal(node):
+    """Return the value of a literal node, or NOT_CONSTANT."""
+    if isinstance(node, ast.Num):
+        return node.n
+    if isinstance(node, ast.Str):
+        return node.s
+    if isinstance(node, ast.NameConstant):
+        return node.value
+    return NOT_CONSTANT
+
+
+def make_literal(value, node):
+    """Return a literal node holding value at the location of node, or None if too large."""
+    if value is None or isinstance(value, bool):
+        new_node = ast.NameConstant(value=value)
+    elif isinstance(value, (int, float, complex)):
+        if isinstance(value, int):
+            if value.bit_length() > MAX_SIZE:
+                return
+        new_node = ast.Num(value)
+    elif isinstance(value, str):
+        if len(value) > MAX_SIZE:
+            return
+        new_node = ast.Str(value)
+    else:
+        return
+    return ast.copy_location(new_node, node)
+
+
+def safe_binop(op, left, right):
+    """
+    Refuse to fold operations whose result could be huge
+    before computing it.
+    """
+    if op is ast.Pow:
+        if isinstance(left, int) and isinstance(right, int):
+            if right > 128 or left.bit_length() > 128:
+                return False
+    if op is ast.LShift:
+        if isinstance(right, int) and right > MAX_SIZE:
+            return False
+    if op is ast.Mult:
+        for seq, count in ((left, right), (right, left)):
+            if isinstance(seq, str) and isinstance(count, int):
+                if len(seq) * count > MAX_SIZE:
+                    return False
+    return True
+
+
+def stored_names(nodes):
+    """Return the names assigned or deleted anywhere in the given nodes."""
+    names = set()
+    for root in nodes:
+        for node in ast.walk(root):
+            if isinstance(node, ast.Name):
+                if not isinstance(node.ctx, ast.Load):
+                    names.add(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                names.add(node.name)
+            elif isinstance(node, ast.alias):
+                names.add((node.asname or node.name).split('.')[0])
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                names.update(node.names)
+
+    return names
+
+
+class Optimizer(ast.NodeTransformer):
+    __doc__ = '\n    A python NodeTransformer which folds constants bottom up and\n    specialises the division and remainder of ulang for operands\n    known to be int or float: literals and counters of range loops.\n    '
+
+    def __init__(self, module):
+        self.shadowed_ = stored_names([module]) & ({'range'} | set(DIVREM))
+        self.counters_ = set()
+
+    def kind(self, node):
+        """Return int or float if the value of node is known to be of that type."""
+        value = literal(node)
+        if value is not NOT_CONSTANT:
+            if isinstance(value, bool):
+                return
+            if isinstance(value, (int, float)):
+                return type(value)
+            return
+        if isinstance(node, ast.Name):
+            if node.id in self.counters_:
+                return int
+            return
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, (ast.UAdd, ast.USub)):
+                return self.kind(node.operand)
+            return
+        if isinstance(node, ast.BinOp):
+            left, right = self.kind(node.left), self.kind(node.right)
+            if left is None or right is None:
+                return
+            if isinstance(node.op, ast.Div):
+                return float
+            if isinstance(node.op, (ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod)):
+                if left is int and right is int:
+                    return int
+                return float
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        left, right = literal(node.left), literal(node.right)
+        op = type(node.op)
+        if left is NOT_CONSTANT or right is NOT_CONSTANT or op not in BINOPS:
+            return node
+        if not safe_binop(op, left, right):
+            return node
+        try:
+            value = BINOPS[op](left, right)
+        except (ArithmeticError, TypeError, ValueError):
+            return node
+        return make_literal(value, node) or node
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        operand = literal(node.operand)
+        op = type(node.op)
+        if operand is NOT_CONSTANT or op not in UNARYOPS:
+            return node
+        try:
+            value = UNARYOPS[op](operand)
+        except (ArithmeticError, TypeError, ValueError):
+            return node
+        return make_literal(value, node) or node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) != 1 or type(node.ops[0]) not in CMPOPS:
+            return node
+        left, right = literal(node.left), literal(node.comparators[0])
+        if left is NOT_CONSTANT or right is NOT_CONSTANT:
+            return node
+        try:
+            value = CMPOPS[type(node.ops[0])](left, right)
+        except TypeError:
+            return node
+        return make_literal(value, node) or node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        test = literal(node.test)
+        if test is NOT_CONSTANT:
+            return node
+        if test:
+            return node.body
+        return node.orelse
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.func, ast.Name) or node.func.id not in DIVREM:
+            return node
+        if node.func.id in self.shadowed_ or len(node.args) != 2 or node.keywords:
+            return node
+        left, right = node.args
+        a, b = literal(left), literal(right)
+        if a is not NOT_CONSTANT and b is not NOT_CONSTANT:
+            try:
+                value = DIVREM[node.func.id](a, b)
+            except (ArithmeticError, TypeError, ValueError):
+                return node
+            new_node = make_literal(value, node)
+            if new_node is not None:
+                return new_node
+        a, b = self.kind(left), self.kind(right)
+        if a is None or b is None:
+            if a is not float and b is not float:
+                return node
+        if node.func.id == '__rem__':
+            op = ast.Mod()
+        elif a is int and b is int:
+            # the runtime floors a float quotient, // differs above 2 ** 53
+            return node
+        else:
+            op = ast.Div()
+        return ast.copy_location(ast.BinOp(left=left, op=op, right=right), node)
+
+    def visit_For(self, node):
+        node.target = self.visit(node.target)
+        node.iter = self.visit(node.iter)
+        counters = self.counters_
+        if self.is_range(node.iter):
+            if isinstance(node.target, ast.Name):
+                if node.target.id not in stored_names(node.body):
+                    self.counters_ = counters | {node.target.id}
+        node.body = self.visit_stmts(node.body)
+        self.counters_ = counters
+        node.orelse = self.visit_stmts(node.orelse)
+        return node
+
+    def visit_stmts(self, stmts):
+        new_stmts = []
+        for stmt in stmts:
+            stmt = self.visit(stmt)
+            if isinstance(stmt, list):
+                new_stmts.extend(stmt)
+            elif stmt is not None:
+                new_stmts.append(stmt)
+
+        return new_stmts
+
+    def is_range(self, node):
+        if not isinstance(node, ast.Call) or node.keywords:
+            return False
+        if not isinstance(node.func, ast.Name) or node.func.id != 'range':
+            return False
+        return 'range' not in self.shadowed_
+
+    def visit_scope(self, node):
+        counters = self.counters_
+        self.counters_ = set()
+        self.generic_visit(node)
+        self.counters_ = counters
+        return node
+
+    visit_FunctionDef = visit_scope
+    visit_AsyncFunctionDef = visit_scope
+    visit_Lambda = visit_scope
+    visit_ClassDef = visit_scope
+
+
+def optimize(module):
+    """Optimize the module ast in place and return it."""
+    return Optimizer(module).visit(module)
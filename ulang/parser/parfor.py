@@ -0,0 +1,234 @@
+"""
+``par for`` loops, whose iterations run in parallel.
+
+    par for x in items { ... }
+    par(process) for x in items { ... }
+    par(thread, 8) for line in lines { ... }
+    println(f(x)) par for x in items
+
+The pragma in parentheses picks the pool running the iterations, threads
+by default or processes, and its number of workers, the number of cpus
+by default (see ulang.runtime.parallel).
+
+The parser compiles the body into an anonymous function of the loop
+variables, called once per item, and the loop into a call of the
+``__par__`` builtin. The iterations must be independent: the names the
+body assigns are local to an iteration and are not set after the loop.
+
+A name the body only updates with augmented assignments, like
+``total += x`` (``-=``, ``*=``, ``/=``, ``%=``, ...), is a reduction: the
+iterations record the values of each of these statements, which are
+applied with the operator of their statement once all of them are done,
+in the order of the items and, within an item, in the order they ran. The result is the one of a sequential
+loop, whatever the number of workers or the order the iterations ran
+in. The body can not read such a name, nor ``break`` or ``return``;
+``continue`` ends an iteration.
+"""
+import ast
+from copy import deepcopy
+
+POOLS = ('thread', 'process')
+
+# the names used by the generated code
+RESULTS = '__par_results__'
+ITEM = '__par_item__'
+SLOT = '__par_slot__'
+VALUE = '__par_value__'
+
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+
+def walk(body):
+    """Walk the nodes of a list of statements, without entering nested functions and types."""
+    todo = list(body)[::-1]
+    while todo:
+        node = todo.pop()
+        yield node
+        if not isinstance(node, SCOPES):
+            todo.extend(list(ast.iter_child_nodes(node))[::-1])
+
+
+def reduction(stmt):
+    """
+    Return the name a statement updates with an augmented assignment and
+    the node of its value, or None. ``/=`` and ``%=`` are compiled into
+    ``x = __div__(x, value)`` and ``x = __rem__(x, value)``.
+    """
+    if isinstance(stmt, ast.AugAssign):
+        if isinstance(stmt.target, ast.Name):
+            return (stmt.target.id, stmt.value)
+    elif isinstance(stmt, ast.Assign):
+        if len(stmt.targets) == 1:
+            target, call = stmt.targets[0], stmt.value
+            if isinstance(target, ast.Name) and isinstance(call, ast.Call):
+                if isinstance(call.func, ast.Name) and call.func.id in ('__div__', '__rem__'):
+                    if len(call.args) == 2 and isinstance(call.args[0], ast.Name):
+                        if call.args[0].id == target.id:
+                            return (target.id, call.args[1])
+
+
+def with_value(stmt, value):
+    """Return a copy of a reduction statement applying value."""
+    stmt = deepcopy(stmt)
+    if isinstance(stmt, ast.AugAssign):
+        stmt.value = value
+    else:
+        stmt.value.args[1] = value
+    return stmt
+
+
+def locate(node, where):
+    """Give the nodes below node without a position that of where."""
+    for child in ast.walk(node):
+        if 'lineno' in child._attributes and not hasattr(child, 'lineno'):
+            child.lineno = where.lineno
+            child.col_offset = where.col_offset
+
+    return node
+
+
+def reductions(body, error):
+    """Return the (name, statement) of the reduction statements of body, in order."""
+    found = []
+    bound = set()
+    loads = {}
+    parts = set()
+    for node in walk(body):
+        reduced = reduction(node)
+        if reduced is not None:
+            found.append((reduced[0], node))
+            # the target and the operand of x = __div__(x, value)
+            parts.update(id(name) for name in ast.walk(node) if isinstance(name, ast.Name) if name.id == reduced[0] if name is not reduced[1])
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, ast.Name):
+            if id(node) in parts:
+                continue
+            if isinstance(node.ctx, ast.Load):
+                loads.setdefault(node.id, node)
+            else:
+                bound.add(node.id)
+
+    names = [name for name, _ in found if name not in bound]
+    for name in dict.fromkeys(names):
+        if name in loads:
+            error('"%s" is reduced by the par for loop, its body can not read it' % name, loads[name])
+
+    return [(name, stmt) for name, stmt in found if name not in bound]
+
+
+class BodyPass(ast.NodeTransformer):
+    __doc__ = '\n    Turn the body of a par for loop into that of its function: the\n    reductions record their slot and value, continue returns the recorded\n    ones. slots maps the id of each reduction statement to its slot.\n    '
+
+    def __init__(self, slots, error):
+        self.slots = slots
+        self.error = error
+        self.depth = 0
+
+    def results(self):
+        if self.slots:
+            return ast.Name(id=RESULTS, ctx=(ast.Load()))
+        return None
+
+    def visit_scope(self, node):
+        return node
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_Lambda = visit_ClassDef = visit_scope
+
+    def visit_loop(self, node):
+        self.depth += 1
+        node = self.generic_visit(node)
+        self.depth -= 1
+        return node
+
+    visit_For = visit_AsyncFor = visit_While = visit_loop
+
+    def visit_Continue(self, node):
+        if self.depth:
+            return node
+        return locate(ast.Return(value=(self.results())), node)
+
+    def visit_Break(self, node):
+        if not self.depth:
+            self.error('break is not allowed in a par for loop', node)
+        return node
+
+    def visit_Return(self, node):
+        self.error('return is not allowed in a par for loop', node)
+
+    def visit_Yield(self, node):
+        self.error('yield is not allowed in a par for loop', node)
+
+    visit_YieldFrom = visit_Await = visit_Yield
+
+    def visit_reduction(self, node):
+        if id(node) not in self.slots:
+            return self.generic_visit(node)
+        value = reduction(node)[1]
+        record = ast.Call(func=ast.Attribute(value=ast.Name(id=RESULTS, ctx=(ast.Load())),
+          attr='append',
+          ctx=(ast.Load())),
+          args=[
+         ast.Tuple(elts=[ast.Constant(value=(self.slots[id(node)])), self.visit(value)], ctx=(ast.Load()))],
+          keywords=[])
+        return locate(ast.Expr(value=record), node)
+
+    visit_AugAssign = visit_Assign = visit_reduction
+
+
+def compile_loop(loop, name, pool, workers, error):
+    """
+    Compile the ast.For of a par for loop into the function of its body,
+    named name, and the statement running it. error(message, node) raises
+    the syntax error of a node.
+    """
+    reduced = reductions(loop.body, error)
+    slots = {id(stmt): slot for slot, (_, stmt) in enumerate(reduced)}
+    body = BodyPass(slots, error)
+    stmts = []
+    for stmt in loop.body:
+        stmt = body.visit(stmt)
+        if stmt is not None:
+            stmts.append(stmt)
+
+    target = loop.target
+    if isinstance(target, ast.Name):
+        args = [ast.arg(arg=(target.id), annotation=None)]
+    else:
+        args = [ast.arg(arg=ITEM, annotation=None)]
+        stmts.insert(0, ast.Assign(targets=[target], value=ast.Name(id=ITEM, ctx=(ast.Load()))))
+    if slots:
+        stmts.insert(0, ast.Assign(targets=[ast.Name(id=RESULTS, ctx=(ast.Store()))], value=ast.List(elts=[], ctx=(ast.Load()))))
+        stmts.append(ast.Return(value=ast.Name(id=RESULTS, ctx=(ast.Load()))))
+    if not stmts:
+        stmts.append(ast.Pass())
+    func = ast.FunctionDef(name=name,
+      args=ast.arguments(posonlyargs=[], args=args, vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]),
+      body=stmts,
+      decorator_list=[],
+      returns=None)
+    call = ast.Call(func=ast.Name(id='__par__', ctx=(ast.Load())),
+      args=[
+     ast.Name(id=name, ctx=(ast.Load())), loop.iter, ast.Constant(value=pool),
+     workers if workers is not None else ast.Constant(value=None)],
+      keywords=[])
+    if not slots:
+        stmt = ast.Expr(value=call)
+    else:
+        # the reductions are applied by the loop, in the order of the items,
+        # each with the statement it was recorded by
+        fold = []
+        for slot, (_, stmt) in reversed(list(enumerate(reduced))):
+            apply = [with_value(stmt, ast.Name(id=VALUE, ctx=(ast.Load())))]
+            if fold:
+                test = ast.Compare(left=ast.Name(id=SLOT, ctx=(ast.Load())),
+                  ops=[ast.Eq()],
+                  comparators=[ast.Constant(value=slot)])
+                apply = [ast.If(test=test, body=apply, orelse=fold)]
+            fold = apply
+
+        stmt = ast.For(target=ast.Tuple(elts=[ast.Name(id=SLOT, ctx=(ast.Store())), ast.Name(id=VALUE, ctx=(ast.Store()))], ctx=(ast.Store())),
+          iter=call,
+          body=fold,
+          orelse=[])
+    return (locate(func, loop), locate(stmt, loop))
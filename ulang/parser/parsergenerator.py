@@ -2,12 +2,12 @@
 # Python bytecode 3.7 (3394)
 # Decompiled from: Python 3.7.2rc1 (tags/v3.7.2rc1:75a402a217, Dec 11 2018, 22:09:03) [MSC v.1916 32 bit (Intel)]
 # Embedded file name: ulang\parser\parsergenerator.py
-import errno, hashlib, json, os, sys, tempfile, warnings
+import array, errno, hashlib, json, mmap, os, struct, sys, tempfile, warnings
 from appdirs import AppDirs
 from rply.errors import ParserGeneratorError, ParserGeneratorWarning
 from rply.grammar import Grammar
 from rply.parser import LRParser
-from rply.utils import Counter, IdentityDict, iteritems, itervalues
+from rply.utils import iteritems, itervalues
 LARGE_VALUE = sys.maxsize
 
 class ParserGenerator(object):
@@ -20,6 +20,7 @@ class ParserGenerator(object):
         self.precedence = precedence
         self.cache_id = cache_id
         self.error_handler = None
+        self.grammar_hash = None
 
     def production(self, rule, precedence=None):
         """
@@ -125,7 +126,7 @@ class ParserGenerator(object):
 
         return True
 
-    def build(self):
+    def build_grammar(self):
         g = Grammar(self.tokens)
         for level, (assoc, terms) in enumerate(self.precedence, 1):
             for term in terms:
@@ -138,21 +139,53 @@ class ParserGenerator(object):
         for unused_term in g.unused_terminals():
             warnings.warn(('Token %r is unused' % unused_term),
               ParserGeneratorWarning,
-              stacklevel=2)
+              stacklevel=3)
 
         for unused_prod in g.unused_productions():
             warnings.warn(('Production %r is not reachable' % unused_prod),
               ParserGeneratorWarning,
-              stacklevel=2)
+              stacklevel=3)
+
+        return g
+
+    def get_grammar_hash(self):
+        """
+        Return the hash of the grammar, which only needs the productions
+        and not the LR table.
+        """
+        if self.grammar_hash is None:
+            self.grammar_hash = self.compute_grammar_hash(self.build_grammar())
+        return self.grammar_hash
+
+    def cache_file(self, ext):
+        """
+        Return the path of the user level cache file
+        with the given extension for the current grammar.
+        """
+        return os.path.join(AppDirs('rply').user_cache_dir, '%s-%s-%s.%s' % (
+         self.cache_id, self.VERSION, self.grammar_hash, ext))
 
-        g.build_lritems()
-        g.compute_first()
-        g.compute_follow()
+    def table_file(self):
+        """
+        Return the path of the precompiled binary table shipped
+        next to this module, see ``ulang.parser.build_tables``.
+        """
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), '%s.lrt' % self.cache_id)
+
+    def build_table(self, g, binary=True):
+        """
+        Load the LR table of the grammar from the binary table,
+        the json cache or finally build it from scratch.
+        """
         table = None
         if self.cache_id is not None:
-            cache_dir = AppDirs('rply').user_cache_dir
-            cache_file = os.path.join(cache_dir, '%s-%s-%s.json' % (
-             self.cache_id, self.VERSION, self.compute_grammar_hash(g)))
+            if binary:
+                for path in (self.table_file(), self.cache_file('lrt')):
+                    table = MappedLRTable.load(g, path, self.grammar_hash)
+                    if table is not None:
+                        return table
+
+            cache_file = self.cache_file('json')
             if os.path.exists(cache_file):
                 with open(cache_file) as (f):
                     data = json.load(f)
@@ -161,7 +194,16 @@ class ParserGenerator(object):
         if table is None:
             table = LRTable.from_grammar(g)
             if self.cache_id is not None:
-                self._write_cache(cache_dir, cache_file, table)
+                self._write_cache(os.path.dirname(cache_file), cache_file, table)
+        if self.cache_id is not None:
+            if binary:
+                self._write_binary_cache(self.cache_file('lrt'), table)
+        return table
+
+    def build(self):
+        g = self.build_grammar()
+        self.grammar_hash = self.compute_grammar_hash(g)
+        table = self.build_table(g)
         if table.sr_conflicts:
             warnings.warn(('%d shift/reduce conflict%s' % (
              len(table.sr_conflicts),
@@ -176,6 +218,20 @@ class ParserGenerator(object):
               stacklevel=2)
         return LRParser(table, self.error_handler)
 
+    def write_binary_table(self, table, path):
+        with open(path, 'wb') as (f):
+            f.write(MappedLRTable.serialize(table, self.grammar_hash))
+
+    def _write_binary_cache(self, cache_file, table):
+        cache_dir = os.path.dirname(cache_file)
+        try:
+            os.makedirs(cache_dir, mode=448, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as (f):
+                f.write(MappedLRTable.serialize(table, self.grammar_hash))
+            os.replace(f.name, cache_file)
+        except OSError:
+            pass
+
     def _write_cache(self, cache_dir, cache_file, table):
         if not os.path.exists(cache_dir):
             try:
@@ -194,39 +250,280 @@ class ParserGenerator(object):
         os.rename(f.name, cache_file)
 
 
-def digraph(X, R, FP):
+class TerminalSet(object):
+    __doc__ = '\n    A set of terminals keeping their order of insertion, which decides the\n    order of the entries of the tables, with a bitset of their ids for the\n    membership tests and unions.\n    '
+    __slots__ = ('names', 'bits')
+
+    def __init__(self):
+        self.names = []
+        self.bits = 0
+
+    def add(self, name, ids):
+        bit = ids[name]
+        if not self.bits & bit:
+            self.names.append(name)
+            self.bits |= bit
+
+    def update(self, other, ids):
+        new = other.bits & ~self.bits
+        if new:
+            for name in other.names:
+                if new & ids[name]:
+                    self.names.append(name)
+
+            self.bits |= new
+
+
+def digraph(X, R, FP, ids):
+    """
+    Compute F(x) = FP(x) + the union of F(y) for y in R(x) for every x
+    in X, the nodes of a strongly connected component sharing one set.
+    This is the traversal of DeRemer and Pennello with an explicit stack.
+    """
     N = dict.fromkeys(X, 0)
     stack = []
     F = {}
-    for x in X:
-        if N[x] == 0:
-            traverse(x, N, stack, F, X, R, FP)
+    for root in X:
+        if N[root] != 0:
+            continue
+        stack.append(root)
+        N[root] = len(stack)
+        F[root] = FP(root)
+        frames = [(root, len(stack), iter(R(root)))]
+        while frames:
+            x, d, rel = frames[(-1)]
+            for y in rel:
+                if N[y] == 0:
+                    stack.append(y)
+                    N[y] = len(stack)
+                    F[y] = FP(y)
+                    frames.append((y, len(stack), iter(R(y))))
+                    break
+                if N[y] < N[x]:
+                    N[x] = N[y]
+                F[x].update(F[y], ids)
+            else:
+                frames.pop()
+                if N[x] == d:
+                    fx = F[x]
+                    element = None
+                    while element != x:
+                        element = stack.pop()
+                        N[element] = LARGE_VALUE
+                        F[element] = fx
+
+                if frames:
+                    parent = frames[(-1)][0]
+                    if N[x] < N[parent]:
+                        N[parent] = N[x]
+                    F[parent].update(F[x], ids)
 
     return F
 
 
-def traverse(x, N, stack, F, X, R, FP):
-    stack.append(x)
-    d = len(stack)
-    N[x] = d
-    F[x] = FP(x)
-    rel = R(x)
-    for y in rel:
-        if N[y] == 0:
-            traverse(y, N, stack, F, X, R, FP)
-        N[x] = min(N[x], N[y])
-        for a in F.get(y, []):
-            if a not in F[x]:
-                F[x].append(a)
-
-    if N[x] == d:
-        N[stack[(-1)]] = LARGE_VALUE
-        F[stack[(-1)]] = F[x]
-        element = stack.pop()
-        while element != x:
-            N[stack[(-1)]] = LARGE_VALUE
-            F[stack[(-1)]] = F[x]
-            element = stack.pop()
+class LR0Automaton(object):
+    __doc__ = "\n    The LR(0) states of a grammar and their LALR(1) lookaheads.\n\n    Items are ints, numbered production after production, a state is the\n    list of its items and is interned by its kernel, the tuple of the items\n    it was reached with. Lookaheads are TerminalSets. The states, their\n    order and the order of the lookaheads are those of rply's LRTable.\n    "
+
+    def __init__(self, grammar):
+        self.grammar = grammar
+        terminals = grammar.terminals
+        nonterminals = grammar.nonterminals
+        self.ids = {name: 1 << i for i, name in enumerate(list(terminals) + ['$end'])}
+        # per item: its production, the index of the dot and the symbol after it
+        self.prod = prod = []
+        self.index = index = []
+        self.sym = sym = []
+        # per item: the first items of the productions of the nonterminal after the dot
+        self.after = after = []
+        self.first = first = []
+        for p in grammar.productions:
+            first.append(len(prod))
+            for i in range(len(p.prod) + 1):
+                prod.append(p.number)
+                index.append(i)
+                sym.append(p.prod[i] if i < len(p.prod) else None)
+
+        for s in sym:
+            after.append([first[p.number] for p in grammar.prod_names.get(s, ())] if s in nonterminals else [])
+
+        self.states = []
+        self.gotos = []
+        self.lr0_items()
+        self.nullable = self.compute_nullable_nonterminals()
+        self.trans = self.find_nonterminal_transitions()
+        self.lookaheads = {}
+        self.add_lalr_lookaheads()
+
+    def closure(self, kernel):
+        after = self.after
+        J = list(kernel)
+        added = set()
+        for j in J:
+            for item in after[j]:
+                if item not in added:
+                    added.add(item)
+                    J.append(item)
+
+        return J
+
+    def lr0_items(self):
+        productions = self.grammar.productions
+        prod, sym = self.prod, self.sym
+        states, gotos = self.states, self.gotos
+        kernels = {}
+        states.append(self.closure([self.first[0]]))
+        i = 0
+        while i < len(states):
+            I = states[i]
+            i += 1
+            asyms = set()
+            shifted = {}
+            for item in I:
+                asyms.update(productions[prod[item]].unique_syms)
+                s = sym[item]
+                if s is not None:
+                    shifted.setdefault(s, []).append(item + 1)
+
+            goto = {}
+            for x in asyms:
+                kernel = shifted.get(x)
+                if not kernel:
+                    continue
+                kernel = tuple(kernel)
+                j = kernels.get(kernel)
+                if j is None:
+                    j = kernels[kernel] = len(states)
+                    states.append(self.closure(kernel))
+                goto[x] = j
+
+            gotos.append(goto)
+
+    def compute_nullable_nonterminals(self):
+        nullable = set()
+        num_nullable = 0
+        while True:
+            for p in self.grammar.productions[1:]:
+                if p.getlength() == 0:
+                    nullable.add(p.name)
+                    continue
+                for t in p.prod:
+                    if t not in nullable:
+                        break
+                else:
+                    nullable.add(p.name)
+
+            if len(nullable) == num_nullable:
+                break
+            num_nullable = len(nullable)
+
+        return nullable
+
+    def find_nonterminal_transitions(self):
+        nonterminals = self.grammar.nonterminals
+        sym = self.sym
+        trans = []
+        seen = set()
+        for idx, state in enumerate(self.states):
+            for item in state:
+                t = (
+                 idx, sym[item])
+                if t[1] in nonterminals and t not in seen:
+                    seen.add(t)
+                    trans.append(t)
+
+        return trans
+
+    def add_lalr_lookaheads(self):
+        ids = self.ids
+        readsets = digraph((self.trans), R=(self.reads_relation), FP=(self.dr_relation), ids=ids)
+        lookd, included = self.compute_lookback_includes()
+        followsets = digraph((self.trans), R=(lambda x: included.get(x, [])), FP=(lambda x: readsets[x]), ids=ids)
+        empty = TerminalSet()
+        lookaheads = self.lookaheads
+        for trans, lb in iteritems(lookd):
+            f = followsets.get(trans, empty)
+            for state, item in lb:
+                laheads = lookaheads.get((state, item))
+                if laheads is None:
+                    laheads = lookaheads[(state, item)] = TerminalSet()
+                laheads.update(f, ids)
+
+    def dr_relation(self, trans):
+        state, N = trans
+        terminals = self.grammar.terminals
+        sym = self.sym
+        terms = TerminalSet()
+        for item in self.states[self.gotos[state][N]]:
+            a = sym[item]
+            if a in terminals:
+                terms.add(a, self.ids)
+
+        if state == 0:
+            if N == self.grammar.productions[0].prod[0]:
+                terms.add('$end', self.ids)
+        return terms
+
+    def reads_relation(self, trans):
+        state, N = trans
+        j = self.gotos[state][N]
+        nullable = self.nullable
+        sym = self.sym
+        return [(j, sym[item]) for item in self.states[j] if sym[item] in nullable]
+
+    def dotted(self, item):
+        syms = self.grammar.productions[self.prod[item]].prod
+        i = self.index[item]
+        return syms[:i] + ['.'] + syms[i:]
+
+    def compute_lookback_includes(self):
+        productions = self.grammar.productions
+        prod, index = self.prod, self.index
+        states, gotos, nullable = self.states, self.gotos, self.nullable
+        lookdict = {}
+        includedict = {}
+        dtrans = set(self.trans)
+        groups = {}
+        for state, N in self.trans:
+            lookb = []
+            includes = []
+            for item in states[state]:
+                p = productions[prod[item]]
+                if p.name != N:
+                    continue
+                syms = p.prod
+                j = state
+                for li in range(index[item], len(syms)):
+                    t = syms[li]
+                    if (j, t) in dtrans:
+                        for s in syms[li + 1:]:
+                            if s not in nullable:
+                                break
+                        else:
+                            includes.append((j, t))
+
+                    j = gotos[j][t]
+
+                # the items of the same length and nonterminal in the last
+                # state whose symbols before the dot are those of the item
+                # shifted by one, the dot of the item included, like rply
+                key = (j, N, len(syms))
+                candidates = groups.get(key)
+                if candidates is None:
+                    candidates = groups[key] = [r for r in states[j] if productions[prod[r]].name == N and len(productions[prod[r]].prod) == len(syms)]
+                if candidates:
+                    dotted = self.dotted(item)
+                    for r in candidates:
+                        i = index[r]
+                        if productions[prod[r]].prod[:i] == dotted[1:i + 1]:
+                            lookb.append((j, r))
+
+            for i in includes:
+                includedict.setdefault(i, []).append((state, N))
+
+            lookdict[(state, N)] = lookb
+
+        return (
+         lookdict, includedict)
 
 
 class LRTable(object):
@@ -247,112 +544,104 @@ class LRTable(object):
 
     @classmethod
     def from_grammar(cls, grammar):
-        cidhash = IdentityDict()
-        goto_cache = {}
-        add_count = Counter()
-        C = cls.lr0_items(grammar, add_count, cidhash, goto_cache)
-        cls.add_lalr_lookaheads(grammar, C, add_count, cidhash, goto_cache)
-        lr_action = [
-         None] * len(C)
-        lr_goto = [None] * len(C)
+        """
+        Build the LALR(1) table of a grammar, the same table as rply's
+        LRTable.from_grammar.
+        """
+        auto = LR0Automaton(grammar)
+        productions = grammar.productions
+        terminals = grammar.terminals
+        nonterminals = grammar.nonterminals
+        precedence = grammar.precedence
+        prod, sym = auto.prod, auto.sym
+        lr_action = [None] * len(auto.states)
+        lr_goto = [None] * len(auto.states)
         sr_conflicts = []
         rr_conflicts = []
-        for st, I in enumerate(C):
+        for st, I in enumerate(auto.states):
             st_action = {}
             st_actionp = {}
             st_goto = {}
-            for p in I:
-                if p.getlength() == p.lr_index + 1:
+            goto = auto.gotos[st]
+            for item in I:
+                p = productions[prod[item]]
+                a = sym[item]
+                if a is None:
                     if p.name == "S'":
                         st_action['$end'] = 0
                         st_actionp['$end'] = p
                     else:
-                        laheads = p.lookaheads[st]
-                        for a in laheads:
+                        for a in auto.lookaheads[(st, item)].names:
                             if a in st_action:
                                 r = st_action[a]
                                 if r > 0:
-                                    product = repr(grammar.productions[st_actionp[a].number])
-                                    sprec, slevel = grammar.productions[st_actionp[a].number].prec
-                                    rprec, rlevel = grammar.precedence.get(a, ('right',
-                                                                               0))
-                                    if not (slevel < rlevel or slevel) == rlevel or rprec == 'left':
+                                    product = repr(productions[st_actionp[a].number])
+                                    sprec, slevel = productions[st_actionp[a].number].prec
+                                    rprec, rlevel = precedence.get(a, ('right', 0))
+                                    if slevel < rlevel or slevel == rlevel and rprec == 'left':
                                         st_action[a] = -p.number
                                         st_actionp[a] = p
                                         if not slevel:
                                             if not rlevel:
                                                 sr_conflicts.append((st, repr(a), 'reduce', product))
-                                        grammar.productions[p.number].reduced += 1
-                                    else:
-                                        pass
-                                    if slevel == rlevel:
-                                        if not (rprec == 'nonassoc' or rlevel):
+                                        productions[p.number].reduced += 1
+                                    elif not (slevel == rlevel and rprec == 'nonassoc'):
+                                        if not rlevel:
                                             sr_conflicts.append((st, repr(a), 'shift', product))
-                                else:
-                                    if r < 0:
-                                        oldp = grammar.productions[(-r)]
-                                        pp = grammar.productions[p.number]
-                                        if oldp.number > pp.number:
-                                            st_action[a] = -p.number
-                                            st_actionp[a] = p
-                                            chosenp, rejectp = pp, oldp
-                                            grammar.productions[p.number].reduced += 1
-                                            grammar.productions[oldp.number].reduced -= 1
-                                        else:
-                                            chosenp, rejectp = oldp, pp
-                                        rr_conflicts.append((st, repr(chosenp), repr(rejectp)))
+                                elif r < 0:
+                                    oldp = productions[(-r)]
+                                    if oldp.number > p.number:
+                                        st_action[a] = -p.number
+                                        st_actionp[a] = p
+                                        chosenp, rejectp = p, oldp
+                                        p.reduced += 1
+                                        oldp.reduced -= 1
                                     else:
-                                        raise ParserGeneratorError('Unknown conflict in state %d' % st)
+                                        chosenp, rejectp = oldp, p
+                                    rr_conflicts.append((st, repr(chosenp), repr(rejectp)))
+                                else:
+                                    raise ParserGeneratorError('Unknown conflict in state %d' % st)
                             else:
                                 st_action[a] = -p.number
                                 st_actionp[a] = p
-                                grammar.productions[p.number].reduced += 1
-
-                else:
-                    i = p.lr_index
-                    a = p.prod[(i + 1)]
-                    if a in grammar.terminals:
-                        g = cls.lr0_goto(I, a, add_count, goto_cache)
-                        j = cidhash.get(g, -1)
-                        if j >= 0:
-                            if a in st_action:
-                                r = st_action[a]
-                                if r > 0:
-                                    if r != j:
-                                        raise ParserGeneratorError('Shift/shift conflict in state %d' % st)
-                    if r < 0:
-                        product = grammar.productions[st_actionp[a].number]
-                        product = repr(product)
-                        rprec, rlevel = grammar.productions[st_actionp[a].number].prec
-                        sprec, slevel = grammar.precedence.get(a, ('right', 0))
-                        if not (slevel > rlevel or slevel) == rlevel or rprec == 'right':
-                            grammar.productions[st_actionp[a].number].reduced -= 1
-                            st_action[a] = j
-                            st_actionp[a] = p
-                            rlevel or sr_conflicts.append((st, repr(a), 'shift', product))
-                        else:
-                            pass
-                        if not (slevel == rlevel and rprec == 'nonassoc'):
-                            if not slevel:
+                                p.reduced += 1
+
+                elif a in terminals:
+                    j = goto[a]
+                    if a in st_action:
+                        r = st_action[a]
+                        if r > 0:
+                            if r != j:
+                                raise ParserGeneratorError('Shift/shift conflict in state %d' % st)
+                        elif r < 0:
+                            product = repr(productions[st_actionp[a].number])
+                            rprec, rlevel = productions[st_actionp[a].number].prec
+                            sprec, slevel = precedence.get(a, ('right', 0))
+                            if slevel > rlevel or slevel == rlevel and rprec == 'right':
+                                productions[st_actionp[a].number].reduced -= 1
+                                st_action[a] = j
+                                st_actionp[a] = p
                                 if not rlevel:
-                                    sr_conflicts.append((st, repr(a), 'reduce', product))
-                                else:
-                                    raise ParserGeneratorError('Unknown conflict in state %d' % st)
+                                    sr_conflicts.append((st, repr(a), 'shift', product))
+                            elif not (slevel == rlevel and rprec == 'nonassoc'):
+                                if not slevel:
+                                    if not rlevel:
+                                        sr_conflicts.append((st, repr(a), 'reduce', product))
+                        else:
+                            raise ParserGeneratorError('Unknown conflict in state %d' % st)
                     else:
                         st_action[a] = j
                         st_actionp[a] = p
 
             nkeys = set()
-            for ii in I:
-                for s in ii.unique_syms:
-                    if s in grammar.nonterminals:
+            for item in I:
+                for s in productions[prod[item]].unique_syms:
+                    if s in nonterminals:
                         nkeys.add(s)
 
             for n in nkeys:
-                g = cls.lr0_goto(I, n, add_count, goto_cache)
-                j = cidhash.get(g, -1)
-                if j >= 0:
-                    st_goto[n] = j
+                if n in goto:
+                    st_goto[n] = goto[n]
 
             lr_action[st] = st_action
             lr_goto[st] = st_goto
@@ -365,217 +654,144 @@ class LRTable(object):
 
         return LRTable(grammar, lr_action, lr_goto, default_reductions, sr_conflicts, rr_conflicts)
 
-    @classmethod
-    def lr0_items(cls, grammar, add_count, cidhash, goto_cache):
-        C = [cls.lr0_closure([grammar.productions[0].lr_next], add_count)]
-        for i, I in enumerate(C):
-            cidhash[I] = i
-
-        i = 0
-        while i < len(C):
-            I = C[i]
-            i += 1
-            asyms = set()
-            for ii in I:
-                asyms.update(ii.unique_syms)
-
-            for x in asyms:
-                g = cls.lr0_goto(I, x, add_count, goto_cache)
-                if not g:
-                    continue
-                if g in cidhash:
-                    continue
-                cidhash[g] = len(C)
-                C.append(g)
-
-        return C
-
-    @classmethod
-    def lr0_closure(cls, I, add_count):
-        add_count.incr()
-        J = I[:]
-        added = True
-        while added:
-            added = False
-            for j in J:
-                for x in j.lr_after:
-                    if x.lr0_added == add_count.value:
-                        continue
-                    J.append(x.lr_next)
-                    x.lr0_added = add_count.value
-                    added = True
-
-        return J
-
-    @classmethod
-    def lr0_goto(cls, I, x, add_count, goto_cache):
-        s = goto_cache.setdefault(x, IdentityDict())
-        gs = []
-        for p in I:
-            n = p.lr_next
-            if n:
-                if n.lr_before == x:
-                    s1 = s.get(n)
-                    if not s1:
-                        s1 = {}
-                        s[n] = s1
-                gs.append(n)
-                s = s1
-
-        g = s.get('$end')
-        if not g:
-            if gs:
-                g = cls.lr0_closure(gs, add_count)
-                s['$end'] = g
-            else:
-                s['$end'] = gs
-        return g
-
-    @classmethod
-    def add_lalr_lookaheads(cls, grammar, C, add_count, cidhash, goto_cache):
-        nullable = cls.compute_nullable_nonterminals(grammar)
-        trans = cls.find_nonterminal_transitions(grammar, C)
-        readsets = cls.compute_read_sets(grammar, C, trans, nullable, add_count, cidhash, goto_cache)
-        lookd, included = cls.compute_lookback_includes(grammar, C, trans, nullable, add_count, cidhash, goto_cache)
-        followsets = cls.compute_follow_sets(trans, readsets, included)
-        cls.add_lookaheads(lookd, followsets)
-
-    @classmethod
-    def compute_nullable_nonterminals(cls, grammar):
-        nullable = set()
-        num_nullable = 0
-        while 1:
-            for p in grammar.productions[1:]:
-                if p.getlength() == 0:
-                    nullable.add(p.name)
-                    continue
-                for t in p.prod:
-                    if t not in nullable:
-                        break
-                    nullable.add(p.name)
-
-                if len(nullable) == num_nullable:
-                    break
-                num_nullable = len(nullable)
-
-        return nullable
 
-    @classmethod
-    def find_nonterminal_transitions(cls, grammar, C):
-        trans = []
-        for idx, state in enumerate(C):
-            for p in state:
-                if p.lr_index < p.getlength() - 1:
-                    t = (
-                     idx, p.prod[(p.lr_index + 1)])
-                    if t[1] in grammar.nonterminals and t not in trans:
-                        trans.append(t)
-
-        return trans
-
-    @classmethod
-    def compute_read_sets(cls, grammar, C, ntrans, nullable, add_count, cidhash, goto_cache):
-        return digraph(ntrans,
-          R=(lambda x: cls.reads_relation(C, x, nullable, add_count, cidhash, goto_cache)),
-          FP=(lambda x: cls.dr_relation(grammar, C, x, nullable, add_count, goto_cache)))
-
-    @classmethod
-    def compute_follow_sets(cls, ntrans, readsets, includesets):
-        return digraph(ntrans,
-          R=(lambda x: includesets.get(x, [])),
-          FP=(lambda x: readsets[x]))
-
-    @classmethod
-    def dr_relation(cls, grammar, C, trans, nullable, add_count, goto_cache):
-        state, N = trans
-        terms = []
-        g = cls.lr0_goto(C[state], N, add_count, goto_cache)
-        for p in g:
-            if p.lr_index < p.getlength() - 1:
-                a = p.prod[(p.lr_index + 1)]
-                if a in grammar.terminals and a not in terms:
-                    terms.append(a)
+class MappedLRTable(object):
+    __doc__ = '\n    A LR table loaded from the compact binary format by mmap.\n\n    The file holds a header with the grammar hash, the interned names of\n    the terminals and nonterminals, and the action, goto and default\n    reduction tables as flat native int arrays which are used in place,\n    so loading does no per-entry work at all.\n    '
+    MAGIC = b'ULRT'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHH20s6I')
+    ERROR = -2147483648
 
-        if state == 0:
-            if N == grammar.productions[0].prod[0]:
-                terms.append('$end')
-        return terms
+    def __init__(self, grammar, terminals, nonterminals, action, goto, default_reductions, sr_conflicts, rr_conflicts, buf=None):
+        self.grammar = grammar
+        self.terminals = terminals
+        self.nonterminals = nonterminals
+        self.terminal_ids = {name: i for i, name in enumerate(terminals)}
+        self.nonterminal_ids = {name: i for i, name in enumerate(nonterminals)}
+        self.action = action
+        self.goto = goto
+        self.default_reductions = default_reductions
+        self.sr_conflicts = sr_conflicts
+        self.rr_conflicts = rr_conflicts
+        self.lr_action = _TableView(action, self.terminal_ids, self.ERROR)
+        self.lr_goto = _TableView(goto, self.nonterminal_ids, -1)
+        self._buf = buf
 
     @classmethod
-    def reads_relation(cls, C, trans, empty, add_count, cidhash, goto_cache):
-        rel = []
-        state, N = trans
-        g = cls.lr0_goto(C[state], N, add_count, goto_cache)
-        j = cidhash.get(g, -1)
-        for p in g:
-            if p.lr_index < p.getlength() - 1:
-                a = p.prod[(p.lr_index + 1)]
-                if a in empty:
-                    rel.append((j, a))
-
-        return rel
+    def serialize(cls, table, grammar_hash):
+        """
+        Pack a dict based LRTable into the binary format.
+        """
+        g = table.grammar
+        terminals = sorted(set(g.terminals) | {'$end'})
+        nonterminals = sorted(g.nonterminals)
+        tids = {name: i for i, name in enumerate(terminals)}
+        ntids = {name: i for i, name in enumerate(nonterminals)}
+        nstates = len(table.lr_action)
+        action = array.array('i', [cls.ERROR]) * (nstates * len(terminals))
+        goto = array.array('i', [-1]) * (nstates * len(nonterminals))
+        for st in range(nstates):
+            for name, t in iteritems(table.lr_action[st]):
+                action[st * len(terminals) + tids[name]] = t
+            for name, j in iteritems(table.lr_goto[st]):
+                goto[st * len(nonterminals) + ntids[name]] = j
+
+        default_reductions = array.array('i', table.default_reductions)
+        names = '\n'.join(terminals + nonterminals).encode('utf-8')
+        names += b'\x00' * (-len(names) % 4)
+        conflicts = json.dumps([table.sr_conflicts, table.rr_conflicts]).encode('utf-8')
+        conflicts += b' ' * (-len(conflicts) % 4)
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, sys.byteorder == 'big', bytes.fromhex(grammar_hash), nstates, len(terminals), len(nonterminals), len(g.productions), len(names), len(conflicts))
+        return b''.join((header, names, conflicts,
+         action.tobytes(), goto.tobytes(), default_reductions.tobytes()))
 
     @classmethod
-    def compute_lookback_includes(cls, grammar, C, trans, nullable, add_count, cidhash, goto_cache):
-        lookdict = {}
-        includedict = {}
-        dtrans = dict.fromkeys(trans, 1)
-        for state, N in trans:
-            lookb = []
-            includes = []
-            for p in C[state]:
-                if p.name != N:
-                    continue
-                lr_index = p.lr_index
-                j = state
-                while lr_index < p.getlength() - 1:
-                    lr_index += 1
-                    t = p.prod[lr_index]
-                    if (
-                     j, t) in dtrans:
-                        li = lr_index + 1
-                        while 1:
-                            if li < p.getlength():
-                                if p.prod[li] in grammar.terminals:
-                                    break
-                                if p.prod[li] not in nullable:
-                                    break
-                                li += 1
-                        else:
-                            includes.append((j, t))
-
-                    g = cls.lr0_goto(C[j], t, add_count, goto_cache)
-                    j = cidhash.get(g, -1)
-
-                for r in C[j]:
-                    if r.name != p.name:
-                        continue
-                    if r.getlength() != p.getlength():
-                        continue
-                    i = 0
-                    while 1:
-                        if i < r.lr_index:
-                            if r.prod[i] != p.prod[(i + 1)]:
-                                break
-                            i += 1
-                    else:
-                        lookb.append((j, r))
-
-            for i in includes:
-                includedict.setdefault(i, []).append((state, N))
-
-            lookdict[(state, N)] = lookb
-
-        return (
-         lookdict, includedict)
+    def load(cls, grammar, path, grammar_hash):
+        """
+        Map the binary table at the given path, return None if it is
+        missing or was built for another grammar or platform.
+        """
+        try:
+            with open(path, 'rb') as (f):
+                buf = mmap.mmap(f.fileno(), 0, access=(mmap.ACCESS_READ))
+        except (OSError, ValueError):
+            return
+        table = None
+        try:
+            table = cls.unpack(grammar, buf, grammar_hash)
+        except (ValueError, struct.error):
+            # a corrupt file, rebuilt like a stale one
+            pass
+        finally:
+            if table is None:
+                buf.close()
+        return table
 
     @classmethod
-    def add_lookaheads(cls, lookbacks, followset):
-        for trans, lb in iteritems(lookbacks):
-            for state, p in lb:
-                f = followset.get(trans, [])
-                laheads = p.lookaheads.setdefault(state, [])
-                for a in f:
-                    if a not in laheads:
-                        laheads.append(a)
+    def unpack(cls, grammar, buf, grammar_hash):
+        """Return the table held by buf, or None if it does not match."""
+        if len(buf) < cls.HEADER.size:
+            return
+        magic, version, bigendian, ghash, nstates, nterms, nnonterms, nprods, names_len, conflicts_len = cls.HEADER.unpack_from(buf)
+        if magic != cls.MAGIC or version != cls.VERSION or bigendian != (sys.byteorder == 'big'):
+            return
+        if ghash != bytes.fromhex(grammar_hash) or nprods != len(grammar.productions):
+            return
+        if array.array('i').itemsize != 4:
+            return
+        offset = cls.HEADER.size
+        sizes = (nstates * nterms, nstates * nnonterms, nstates)
+        if len(buf) != offset + names_len + conflicts_len + 4 * sum(sizes):
+            return
+        names = bytes(buf[offset:offset + names_len]).rstrip(b'\x00').decode('utf-8').split('\n')
+        offset += names_len
+        sr_conflicts, rr_conflicts = json.loads(bytes(buf[offset:offset + conflicts_len]))
+        offset += conflicts_len
+        view = memoryview(buf)
+        tables = []
+        for size in sizes:
+            tables.append(view[offset:offset + 4 * size].cast('i'))
+            offset += 4 * size
+
+        return cls(grammar, names[:nterms], names[nterms:], *tables, sr_conflicts, rr_conflicts, buf=buf)
+
+
+class _TableView(object):
+    __doc__ = '\n    A read only list-of-dicts facade over one of the flat tables of\n    MappedLRTable, so it can be used wherever a dict based table is.\n    '
+
+    def __init__(self, table, ids, missing):
+        self.table = table
+        self.ids = ids
+        self.missing = missing
+        self.width = len(ids)
+
+    def __len__(self):
+        return len(self.table) // self.width
+
+    def __getitem__(self, state):
+        return _TableRow(self, state * self.width)
+
+
+class _TableRow(object):
+
+    def __init__(self, view, base):
+        self.view = view
+        self.base = base
+
+    def __contains__(self, name):
+        i = self.view.ids.get(name)
+        return i is not None and self.view.table[self.base + i] != self.view.missing
+
+    def __getitem__(self, name):
+        value = self.view.table[self.base + self.view.ids[name]]
+        if value == self.view.missing:
+            raise KeyError(name)
+        return value
+
+    def items(self):
+        view = self.view
+        for name, i in iteritems(view.ids):
+            value = view.table[self.base + i]
+            if value != view.missing:
+                yield (name, value)
 # okay decompiling E:\ulang\ulang-0.2.2.exe_extracted\PYZ-00.pyz_extracted\ulang.parser.parsergenerator.pyc
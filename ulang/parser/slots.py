@@ -0,0 +1,148 @@
+"""
+Automatic ``__slots__`` for ulang types, added by ``NameFixPass``.
+
+The fields of a type are the attributes its constructor and its ``attr``
+properties assign on ``$``. When they are all the attributes the module
+ever assigns on its instances, the type gets ``__slots__`` listing them
+and its instances have no ``__dict__``. A type keeps its ``__dict__``
+when one of these does not hold:
+
+* its other methods assign no attribute of ``$`` besides the fields;
+* no attribute other than a field is assigned on other objects anywhere
+  in the module, since those might be instances of the type;
+* the fields are not names of methods or variables of the type body;
+* it does not use ``__dict__``, ``vars``, ``setattr`` or ``delattr``;
+* it has no base, or one base given ``__slots__`` in the same module:
+  python refuses nonempty ``__slots__`` for subtypes of ``int``, ``tuple``
+  or ``bytes``, and the layout of other types is not known.
+
+A type declaring ``__slots__`` itself is left alone, so
+``__slots__ = ["__dict__"]`` keeps a ``__dict__`` for one type, and
+``ulang --no-slots`` turns the feature off. Instances of a type which is
+extended from another module or gets attributes set by python code need
+one of these.
+"""
+import ast
+
+# switched off by ``ulang --no-slots``, also applies to imported modules
+enabled = True
+
+DYNAMIC = {'vars', 'setattr', 'delattr'}
+
+
+def walk(node):
+    """Walk the nodes below node, without entering nested types."""
+    todo = list(ast.iter_child_nodes(node))[::-1]
+    while todo:
+        node = todo.pop()
+        yield node
+        if not isinstance(node, ast.ClassDef):
+            todo.extend(list(ast.iter_child_nodes(node))[::-1])
+
+
+def is_self(node):
+    return isinstance(node, ast.Name) and node.id == 'self'
+
+
+def self_stores(func):
+    """Return the attributes assigned or deleted on $ in func, in order."""
+    names = {}
+    for node in walk(func):
+        if isinstance(node, ast.Attribute):
+            if not isinstance(node.ctx, ast.Load):
+                if is_self(node.value):
+                    names[node.attr] = None
+    return list(names)
+
+
+def outside_stores(module):
+    """Return the attributes assigned or deleted on anything but $ in module."""
+    names = set()
+    for node in ast.walk(module):
+        if isinstance(node, ast.Attribute):
+            if not isinstance(node.ctx, ast.Load):
+                if not is_self(node.value):
+                    names.add(node.attr)
+    return names
+
+
+def is_property(func):
+    for decorator in func.decorator_list:
+        if isinstance(decorator, ast.Name) and decorator.id == 'property':
+            return True
+        if isinstance(decorator, ast.Attribute) and decorator.attr == 'setter':
+            return True
+    return False
+
+
+def body_names(cls):
+    """Return the names bound by the statements of a type body."""
+    names = set()
+    for stmt in cls.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.ClassDef)):
+            names.add(stmt.name)
+        elif isinstance(stmt, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+            for target in targets:
+                names.update(node.id for node in ast.walk(target) if isinstance(node, ast.Name))
+    return names
+
+
+def is_dynamic(cls):
+    for node in walk(cls):
+        if isinstance(node, ast.Attribute) and node.attr == '__dict__':
+            return True
+        if isinstance(node, ast.Name) and node.id in DYNAMIC:
+            return True
+    return False
+
+
+def fields(cls, outside, slotted):
+    """
+    Return the slots of a type, or None if it keeps its __dict__.
+    Slotted maps the types of the module already given __slots__ to
+    all their fields, including those of their bases.
+    """
+    if len(cls.bases) > 1 or cls.keywords:
+        return
+    inherited = []
+    if cls.bases:
+        base = cls.bases[0]
+        if not isinstance(base, ast.Name) or base.id not in slotted:
+            return
+        inherited = slotted[base.id]
+    names = body_names(cls)
+    if '__slots__' in names or is_dynamic(cls):
+        return
+    found = {}
+    others = []
+    for stmt in cls.body:
+        if isinstance(stmt, ast.FunctionDef):
+            stores = self_stores(stmt)
+            if stmt.name == '__init__' or is_property(stmt):
+                found.update(dict.fromkeys(stores))
+            else:
+                others.extend(stores)
+    all_fields = set(found) | set(inherited)
+    if not set(others) <= all_fields or not outside <= all_fields:
+        return
+    if names & set(found):
+        return
+    slotted[cls.name] = list(inherited) + [name for name in found if name not in inherited]
+    return [name for name in found if name not in inherited]
+
+
+def add_slots(cls, outside, slotted):
+    """Give a type __slots__ when its fields are known, see fields()."""
+    names = fields(cls, outside, slotted)
+    if names is None:
+        slotted.pop(cls.name, None)
+        return cls
+    slots = ast.Assign(targets=[ast.Name(id='__slots__', ctx=(ast.Store()), lineno=(cls.lineno), col_offset=(cls.col_offset))],
+      value=ast.Tuple(elts=[ast.Constant(value=name, lineno=(cls.lineno), col_offset=(cls.col_offset)) for name in names], ctx=(ast.Load()),
+      lineno=(cls.lineno),
+      col_offset=(cls.col_offset)),
+      lineno=(cls.lineno),
+      col_offset=(cls.col_offset))
+    cls.body.insert(0, slots)
+    return cls
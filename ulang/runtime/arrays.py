@@ -0,0 +1,296 @@
+"""
+The numeric ``array`` type of µlang, backed by NumPy, and ``vec``, the
+namespace of the math of arrays.
+
+    a = array([1, 2, 3, 4])
+    b = a * 2 + 1            // elementwise
+    println(a[1:3], b / 2)   // [2, 3] [1, 2, 3, 4]
+    println(vec.sum(a), vec.sqrt(a), a.mean())
+
+This module imports numpy and is only imported by the runtime when a
+program first calls ``array`` or uses ``vec`` (see ``create_globals``),
+the scalar builtins like ``sqrt`` or ``max`` then also take arrays (see
+``install``). Programs without arrays do not pay for any of it.
+
+An array is a subclass of ``numpy.ndarray``: the operators ulang types
+define with ``operator`` (``+``, ``-``, ``*``, ``^``, comparisons,
+``[]``, ``#``) apply elementwise, with broadcasting. ``/`` and ``%``
+follow ulang, ``/`` of integers being a floor division. An index gives
+a python int or float, a slice (``a[1:3]``, ``m[0:2, 1]``) a view of the
+array, iterating a one dimensional array gives python numbers, and so
+do the reductions of a whole array, like ``sum`` or ``max``.
+"""
+import builtins, functools
+try:
+    import numpy
+except ImportError:
+    raise ImportError('arrays need numpy, install it with: install("numpy")') from None
+
+# the names of vec, the rest are helpers. all, any, max, min, sum, abs and
+# pow hide the builtins of python in this module, use builtins.any
+__all__ = ['array', 'zeros', 'ones', 'full', 'arange', 'linspace',
+ 'sqrt', 'exp', 'log', 'log10', 'sin', 'cos', 'tan', 'asin', 'acos', 'atan', 'atan2',
+ 'fabs', 'abs', 'sign', 'floor', 'ceil', 'pow', 'minimum', 'maximum', 'where', 'clip',
+ 'dot', 'cumsum', 'sort', 'all', 'any', 'argmax', 'argmin', 'max', 'mean', 'min',
+ 'prod', 'std', 'sum', 'var']
+
+
+def wrap(x):
+    """Return a numpy result as a ulang value: an array or a python number."""
+    if isinstance(x, numpy.generic):
+        return x.item()
+    if isinstance(x, numpy.ndarray):
+        if x.ndim == 0:
+            return x.item()
+        if type(x) is numpy.ndarray:
+            return x.view(array)
+    return x
+
+
+def reduction(name):
+    method = getattr(numpy.ndarray, name)
+
+    def reduce(self, *args, **kw):
+        return wrap(method(self, *args, **kw))
+
+    reduce.__name__ = name
+    reduce.__doc__ = method.__doc__
+    return reduce
+
+
+def is_integral(x):
+    return numpy.asarray(x).dtype.kind in 'biu'
+
+
+def divide(a, b):
+    """The ``/`` of ulang: a floor division of integers."""
+    if is_integral(a) and is_integral(b):
+        return numpy.floor_divide(a, b)
+    return numpy.true_divide(a, b)
+
+
+# the items of an array are printed like numbers and booleans of ulang
+FORMATTER = {'bool':lambda x: 'true' if x else 'false',
+ 'int':lambda x: str(int(x)),
+ 'float':lambda x: str(float(x))}
+
+
+def text(x):
+    return numpy.array2string(x, separator=', ', formatter=FORMATTER)
+
+
+class array(numpy.ndarray):
+    __doc__ = '\n    A numeric array: array([1, 2, 3]), array([[1, 2], [3, 4]], float).\n    '
+
+    def __new__(cls, data=(), dtype=None):
+        return numpy.array(data, dtype=dtype).view(cls)
+
+    def __getitem__(self, key):
+        return wrap(numpy.ndarray.__getitem__(self, key))
+
+    def __iter__(self):
+        if self.ndim == 1:
+            return iter(self.tolist())
+        return numpy.ndarray.__iter__(self)
+
+    def __truediv__(self, other):
+        return divide(self, other)
+
+    def __rtruediv__(self, other):
+        return divide(other, self)
+
+    def __itruediv__(self, other):
+        self[...] = divide(self, other)
+        return self
+
+    def __str__(self):
+        return text(self)
+
+    def __repr__(self):
+        return 'array(%s)' % text(self)
+
+    all = reduction('all')
+    any = reduction('any')
+    argmax = reduction('argmax')
+    argmin = reduction('argmin')
+    max = reduction('max')
+    mean = reduction('mean')
+    min = reduction('min')
+    prod = reduction('prod')
+    std = reduction('std')
+    sum = reduction('sum')
+    var = reduction('var')
+
+
+def vectorized(ufunc):
+    """Return ufunc taking ulang values and returning ulang values."""
+
+    def call(*args, **kw):
+        return wrap(ufunc(*args, **kw))
+
+    call.__name__ = ufunc.__name__
+    call.__doc__ = ufunc.__doc__
+    return call
+
+
+sqrt = vectorized(numpy.sqrt)
+exp = vectorized(numpy.exp)
+log10 = vectorized(numpy.log10)
+sin = vectorized(numpy.sin)
+cos = vectorized(numpy.cos)
+tan = vectorized(numpy.tan)
+asin = vectorized(numpy.arcsin)
+acos = vectorized(numpy.arccos)
+atan = vectorized(numpy.arctan)
+atan2 = vectorized(numpy.arctan2)
+fabs = vectorized(numpy.fabs)
+abs = vectorized(numpy.absolute)
+sign = vectorized(numpy.sign)
+floor = vectorized(numpy.floor)
+ceil = vectorized(numpy.ceil)
+pow = vectorized(numpy.power)
+minimum = vectorized(numpy.minimum)
+maximum = vectorized(numpy.maximum)
+where = vectorized(numpy.where)
+clip = vectorized(numpy.clip)
+dot = vectorized(numpy.dot)
+cumsum = vectorized(numpy.cumsum)
+sort = vectorized(numpy.sort)
+
+
+def log(x, base=None):
+    """The natural logarithm of x, or its logarithm in base."""
+    if base is None:
+        return wrap(numpy.log(x))
+    return wrap(numpy.log(x) / numpy.log(base))
+
+
+def whole(name):
+    """Return the reduction name of numpy, on any array like value."""
+    function = getattr(numpy, name)
+
+    def reduce(x, *args, **kw):
+        return wrap(function(x, *args, **kw))
+
+    reduce.__name__ = name
+    reduce.__doc__ = function.__doc__
+    return reduce
+
+
+all = whole('all')
+any = whole('any')
+argmax = whole('argmax')
+argmin = whole('argmin')
+max = whole('max')
+mean = whole('mean')
+min = whole('min')
+prod = whole('prod')
+std = whole('std')
+sum = whole('sum')
+var = whole('var')
+
+
+def zeros(shape, dtype=float):
+    return numpy.zeros(shape, dtype).view(array)
+
+
+def ones(shape, dtype=float):
+    return numpy.ones(shape, dtype).view(array)
+
+
+def full(shape, value, dtype=None):
+    return numpy.full(shape, value, dtype).view(array)
+
+
+def arange(*args, dtype=None):
+    """arange(stop), arange(start, stop[, step]): like range, as an array."""
+    return numpy.arange(*args, dtype=dtype).view(array)
+
+
+def linspace(start, stop, num=50):
+    """num numbers from start to stop, both included, evenly spaced."""
+    return numpy.linspace(start, stop, num).view(array)
+
+
+def greatest(*args):
+    """The max builtin on arrays: the max of one, the elementwise max of several."""
+    # max is the reduction of numpy of this module
+    if len(args) == 1:
+        return max(args[0])
+    return functools.reduce(maximum, args)
+
+
+def least(*args):
+    """The min builtin on arrays: the min of one, the elementwise min of several."""
+    # min is the reduction of numpy of this module
+    if len(args) == 1:
+        return min(args[0])
+    return functools.reduce(minimum, args)
+
+
+# the scalar builtins of ulang calling a function of this module on arrays
+BUILTINS = {'ceil':'ceil', 
+ 'floor':'floor', 
+ 'fabs':'fabs', 
+ 'sqrt':'sqrt', 
+ 'log10':'log10', 
+ 'exp':'exp', 
+ 'sin':'sin', 
+ 'cos':'cos', 
+ 'tan':'tan', 
+ 'asin':'asin', 
+ 'acos':'acos', 
+ 'atan':'atan'}
+
+# the builtins with more than one argument
+VARIADIC = {'log':'log', 
+ 'pow':'pow', 
+ 'max':'greatest', 
+ 'min':'least'}
+
+
+def fallback(scalar, vector):
+    """Return the builtin scalar, calling vector instead on arrays."""
+
+    def call(x):
+        if isinstance(x, numpy.ndarray):
+            return vector(x)
+        return scalar(x)
+
+    call.__name__ = scalar.__name__
+    call.__doc__ = scalar.__doc__
+    return call
+
+
+def variadic_fallback(scalar, vector):
+    """Return the builtin scalar of several arguments, calling vector instead on arrays."""
+
+    def call(*args, **kw):
+        if not (args and isinstance(args[0], numpy.ndarray)):
+            try:
+                return scalar(*args, **kw)
+            except (TypeError, ValueError):
+                # comparing arrays fails too, like in max(1, array)
+                if not builtins.any(isinstance(arg, numpy.ndarray) for arg in args):
+                    raise
+
+        return vector(*args, **kw)
+
+    call.__name__ = scalar.__name__
+    call.__doc__ = scalar.__doc__
+    return call
+
+
+def install(builtins):
+    """
+    Make the scalar builtins of a program, like ``sqrt`` or ``max``, work
+    on arrays. It is only done once the program uses arrays, the checks
+    slowing down every call.
+    """
+    for name, vector in BUILTINS.items():
+        if name in builtins:
+            builtins[name] = fallback(builtins[name], globals()[vector])
+
+    for name, vector in VARIADIC.items():
+        if name in builtins:
+            builtins[name] = variadic_fallback(builtins[name], globals()[vector])
@@ -0,0 +1,169 @@
+"""
+Ahead-of-time compilation of a tree of µlang modules, ``ulang build``.
+
+Every ``.ul`` file below the source directory is parsed, optimised when
+``-O`` is given and compiled to a ``.pyc`` file at the same place below the
+output directory. The compiled modules import ``ulang.runtime.shim`` for
+their builtins, so a built program runs with ``python out/main.pyc`` or
+``python -m main`` without loading the parser, the lexer or the LR table.
+The code is the one the interpreter would run, line numbers still point
+into the ulang sources.
+
+Files are compiled in parallel worker processes. A manifest in the output
+directory records the state of every compiled source, so unchanged files
+are skipped by the next build and outputs of removed sources are deleted.
+"""
+import ast, hashlib, json, marshal, os, sys
+from importlib.util import MAGIC_NUMBER
+from ulang.parser import error, optimizer, slots
+from ulang.runtime import compiler, tasks, ulcache
+
+MANIFEST = 'ulang-build.json'
+MANIFEST_FORMAT = 1
+SUFFIX = '.ul'
+PROLOGUE = 'from ulang.runtime.shim import *'
+
+
+class BuildError(Exception):
+    __doc__ = '\n    Raised when a tree can not be built.\n    '
+
+
+def sources(src_dir):
+    """Return the paths of the ulang files below src_dir, relative to it."""
+    found = []
+    for root, dirs, files in os.walk(src_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '__')))
+        for name in sorted(files):
+            if name.endswith(SUFFIX):
+                found.append(os.path.relpath(os.path.join(root, name), src_dir))
+
+    return found
+
+
+def output_path(out_dir, rel):
+    return os.path.join(out_dir, rel[:-len(SUFFIX)] + '.pyc')
+
+
+def compile_file(src_dir, out_dir, rel, optimize, backend, slotted):
+    """
+    Compile one source into its .pyc file, return the relative path
+    and the sha1 of the source. Runs in the worker processes.
+    """
+    from ulang.parser.core import Parser
+    compiler.backend = backend
+    slots.enabled = slotted
+    with open(os.path.join(src_dir, rel), 'rb') as (f):
+        source = f.read()
+    filename = rel.replace(os.sep, '/')
+    module = Parser().parse(source=(source.decode('utf-8').strip('\ufeff')), filename=filename)
+    if optimize:
+        module = optimizer.optimize(module)
+    module.body[0:0] = ast.parse(PROLOGUE).body
+    code = compiler.compile_module(module, filename)
+    path = output_path(out_dir, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as (f):
+        # a sourceless pyc, python checks neither mtime nor source hash
+        f.write(MAGIC_NUMBER + bytes(12))
+        f.write(marshal.dumps(code))
+    os.replace(path + '.tmp', path)
+    return (rel, hashlib.sha1(source).hexdigest())
+
+
+def compile_all(src_dir, out_dir, files, optimize, workers):
+    if workers <= 1 or len(files) <= 1:
+        return [compile_file(src_dir, out_dir, rel, optimize, compiler.backend, slots.enabled) for rel in files]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as (pool):
+        return list(pool.map(compile_file, [src_dir] * len(files), [out_dir] * len(files), files, [
+         optimize] * len(files), [compiler.backend] * len(files), [slots.enabled] * len(files)))
+
+
+def load_manifest(path, header):
+    try:
+        with open(path, 'r', encoding='utf-8') as (f):
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get('header') != header:
+        return {}
+    return manifest.get('files', {})
+
+
+def build(src_dir, out_dir, workers=None, log=None):
+    """
+    Compile the ulang tree src_dir into out_dir and return the numbers
+    of compiled, unchanged and removed modules.
+    """
+    from ulang.parser.core import Parser
+    if tasks.mode != 'thread':
+        raise BuildError('modules compiled for --tasks=%s can not be imported, build them without it' % tasks.mode)
+    if not os.path.isdir(src_dir):
+        raise BuildError('"%s" is not a directory' % src_dir)
+    src_dir, out_dir = os.path.abspath(src_dir), os.path.abspath(out_dir)
+    if src_dir == out_dir:
+        raise BuildError('the output directory must differ from the source directory')
+    os.makedirs(out_dir, exist_ok=True)
+    header = {'format':MANIFEST_FORMAT,
+     'magic':MAGIC_NUMBER.hex(),
+     'grammar':Parser.pg_.get_grammar_hash(),
+     'compiler':ulcache.compiler_hash().hex(),
+     'optimize':optimizer.enabled,
+     'backend':compiler.backend,
+     'slots':slots.enabled}
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    old = load_manifest(manifest_path, header)
+    files = {}
+    todo = []
+    for rel in sources(src_dir):
+        st = os.stat(os.path.join(src_dir, rel))
+        state = {'mtime':st.st_mtime_ns,  'size':st.st_size}
+        entry = old.get(rel)
+        files[rel] = state
+        if entry is not None and os.path.exists(output_path(out_dir, rel)):
+            if entry['size'] == st.st_size:
+                if entry['mtime'] == st.st_mtime_ns:
+                    state['sha1'] = entry['sha1']
+                    continue
+                with open(os.path.join(src_dir, rel), 'rb') as (f):
+                    sha1 = hashlib.sha1(f.read()).hexdigest()
+                if sha1 == entry['sha1']:
+                    # touched but not modified
+                    state['sha1'] = sha1
+                    continue
+        todo.append(rel)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    for rel, sha1 in compile_all(src_dir, out_dir, todo, optimizer.enabled, workers):
+        files[rel]['sha1'] = sha1
+        if log is not None:
+            log('compiled %s\n' % rel)
+
+    removed = 0
+    for rel in old:
+        if rel not in files:
+            try:
+                os.unlink(output_path(out_dir, rel))
+                removed += 1
+            except OSError:
+                pass
+
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as (f):
+        json.dump({'header':header,  'files':files}, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return (len(todo), len(files) - len(todo), removed)
+
+
+def main(args):
+    """Run ``ulang build <src_dir> <out_dir>``."""
+    if len(args) != 2:
+        sys.stderr.write('usage: ulang build <src_dir> <out_dir>\n')
+        return 2
+    try:
+        compiled, unchanged, removed = build(args[0], args[1], log=(sys.stderr.write))
+    except (BuildError, error.SyntaxError, SyntaxError, OSError) as e:
+        sys.stderr.write('%s: %s\n' % (e.__class__.__name__, str(e)))
+        return 1
+    sys.stderr.write('%d compiled, %d unchanged, %d removed\n' % (compiled, unchanged, removed))
+    return 0
@@ -0,0 +1,277 @@
+"""
+Bounded channels for the communication between ulang tasks, the
+``channel`` and ``select`` builtins.
+
+A channel is a FIFO queue holding at most ``capacity`` values. Blocking
+operations register a waiter with the channel and are woken when its state
+changes, so no task polls. Waiters of OS threads are locks, waiters of
+green tasks (``--tasks=async``) are futures of their event loop: threads and
+tasks can talk over the same channel, a task waiting on a channel suspends
+and lets the others run.
+"""
+import time
+from collections import deque
+from threading import Lock
+from ulang.runtime.tasks import GreenBuiltin
+
+# longest uninterrupted wait of a thread, so that kill() takes effect
+WAIT_SLICE = 0.1
+
+
+class ChannelClosed(Exception):
+    __doc__ = '\n    Raised when sending to a closed channel, or receiving from\n    a channel which is closed and empty.\n    '
+
+
+class Waiter:
+    __doc__ = '\n    Wakes one blocked operation, registered with all channels it\n    waits for. A thread waits for a lock held until wake() releases\n    it, a green task for a future of its event loop.\n    '
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        if loop is None:
+            self.lock = Lock()
+            self.lock.acquire()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            try:
+                self.lock.release()
+            except RuntimeError:
+                # already woken by another channel
+                pass
+
+        else:
+            from asyncio import _get_running_loop
+            if _get_running_loop() is self.loop:
+                self.notify()
+            else:
+                self.loop.call_soon_threadsafe(self.notify)
+
+    def notify(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def wait(self, timeout):
+        if timeout is None or timeout > WAIT_SLICE:
+            timeout = WAIT_SLICE
+        self.lock.acquire(timeout=(max(timeout, 0)))
+
+    async def wait_async(self, timeout):
+        handle = None
+        if timeout is not None:
+            handle = self.loop.call_later(max(timeout, 0), self.notify)
+        try:
+            await self.future
+        finally:
+            if handle is not None:
+                handle.cancel()
+
+
+class Channel:
+    __doc__ = '\n    A bounded FIFO channel. send() blocks while it is full, recv()\n    while it is empty; both raise ChannelClosed once it is closed,\n    recv() only after the remaining values are consumed. Iterating\n    over a channel receives until it is closed.\n    '
+
+    def __init__(self, capacity=1):
+        if not isinstance(capacity, int) or capacity < 1:
+            raise ValueError('channel capacity must be a positive integer, not %r' % (capacity,))
+        self.capacity = capacity
+        self.closed = False
+        self.lock_ = Lock()
+        self.items_ = deque()
+        self.senders_ = set()
+        self.receivers_ = set()
+        self.send = GreenBuiltin(self.send_, self.send_async)
+        self.recv = GreenBuiltin(self.recv_, self.recv_async)
+
+    def __len__(self):
+        return len(self.items_)
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.recv_()
+            except ChannelClosed:
+                return
+
+    async def __aiter__(self):
+        while True:
+            try:
+                yield await self.recv_async()
+            except ChannelClosed:
+                return
+
+    def __repr__(self):
+        return '<channel %d/%d%s>' % (len(self.items_), self.capacity, ' closed' if self.closed else '')
+
+    def try_send(self, value):
+        """Send value if the channel is not full, return whether it was sent."""
+        return poll(((self, True, value),)) is not None
+
+    def try_recv(self):
+        """Return (true, value) if the channel holds a value, (false, nil) otherwise."""
+        result = poll(((self, False, None),))
+        if result is None:
+            return (False, None)
+        return (True, result[1])
+
+    def send_(self, value, timeout=None):
+        """ Send value, waiting at most timeout seconds while the channel is full. """
+        if select_((self, True, value), timeout=timeout) is None:
+            raise TimeoutError('channel is full')
+
+    async def send_async(self, value, timeout=None):
+        if await select_async((self, True, value), timeout=timeout) is None:
+            raise TimeoutError('channel is full')
+
+    def recv_(self, timeout=None):
+        """ Receive a value, waiting at most timeout seconds while the channel is empty. """
+        result = select_((self, False, None), timeout=timeout)
+        if result is None:
+            raise TimeoutError('channel is empty')
+        return result[1]
+
+    async def recv_async(self, timeout=None):
+        result = await select_async((self, False, None), timeout=timeout)
+        if result is None:
+            raise TimeoutError('channel is empty')
+        return result[1]
+
+    def close(self):
+        """Close the channel and wake all waiting tasks, closing twice is allowed."""
+        with self.lock_:
+            self.closed = True
+            wake(self.senders_)
+            wake(self.receivers_)
+
+
+def wake(waiters):
+    for waiter in waiters:
+        waiter.wake()
+
+    waiters.clear()
+
+
+def poll(cases, waiter=None):
+    """
+    Perform the first ready case and return (index, value), or
+    None and register the waiter with the channels of all cases.
+    """
+    closed = 0
+    for index, (channel, is_send, value) in enumerate(cases):
+        with channel.lock_:
+            if is_send:
+                if channel.closed:
+                    raise ChannelClosed('send on closed channel')
+                if len(channel.items_) < channel.capacity:
+                    channel.items_.append(value)
+                    wake(channel.receivers_)
+                    return (index, None)
+                if waiter is not None:
+                    channel.senders_.add(waiter)
+            elif channel.items_:
+                value = channel.items_.popleft()
+                wake(channel.senders_)
+                return (index, value)
+            elif channel.closed:
+                closed += 1
+            elif waiter is not None:
+                channel.receivers_.add(waiter)
+
+    if closed == len(cases):
+        raise ChannelClosed('receive from closed channel')
+
+
+def unregister(cases, waiter):
+    for channel, is_send, value in cases:
+        with channel.lock_:
+            if is_send:
+                channel.senders_.discard(waiter)
+            else:
+                channel.receivers_.discard(waiter)
+
+
+def remaining(deadline):
+    if deadline is None:
+        return
+    return deadline - time.monotonic()
+
+
+def select_(*cases, timeout=None):
+    result = poll(cases)
+    if result is not None or timeout is not None and timeout <= 0:
+        return result
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        waiter = Waiter()
+        try:
+            result = poll(cases, waiter)
+            if result is not None:
+                return result
+            left = remaining(deadline)
+            if left is not None and left <= 0:
+                return
+            waiter.wait(left)
+        finally:
+            unregister(cases, waiter)
+
+
+async def select_async(*cases, timeout=None):
+    result = poll(cases)
+    if result is not None or timeout is not None and timeout <= 0:
+        return result
+    deadline = None if timeout is None else time.monotonic() + timeout
+    from asyncio import get_running_loop
+    loop = get_running_loop()
+    while True:
+        waiter = Waiter(loop)
+        try:
+            result = poll(cases, waiter)
+            if result is not None:
+                return result
+            left = remaining(deadline)
+            if left is not None and left <= 0:
+                return
+            await waiter.wait_async(left)
+        finally:
+            unregister(cases, waiter)
+
+
+def make_cases(args):
+    """
+    Convert the arguments of select: a channel to receive from,
+    or a (channel, value) pair to send a value.
+    """
+    cases = []
+    for arg in args:
+        if isinstance(arg, Channel):
+            cases.append((arg, False, None))
+        elif isinstance(arg, (tuple, list)) and len(arg) == 2 and isinstance(arg[0], Channel):
+            cases.append((arg[0], True, arg[1]))
+        else:
+            raise TypeError('select expects channels or (channel, value) pairs, not %r' % (arg,))
+
+    if not cases:
+        raise TypeError('select expects at least one channel')
+    return tuple(cases)
+
+
+def select(*args, timeout=None):
+    """
+    Wait until one of the cases is ready and perform it: receive from a
+    channel, or send to it for a (channel, value) pair. Return the pair
+    (index of the case, received value or nil), or nil after timeout
+    seconds. Closed channels are skipped by receiving cases, ChannelClosed
+    is raised when all of them are closed.
+    """
+    return select_(*make_cases(args), timeout=timeout)
+
+
+async def select_green(*args, timeout=None):
+    return await select_async(*make_cases(args), timeout=timeout)
+
+
+def builtins():
+    """Return the channel builtins of create_globals."""
+    return {'channel':Channel,
+     'select':GreenBuiltin(select, select_green),
+     'ChannelClosed':ChannelClosed}
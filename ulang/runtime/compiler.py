@@ -0,0 +1,22 @@
+"""
+Compilation of the ast of a ulang module into a code object.
+
+Code is compiled by ``compile()`` or, with ``ulang --backend=bytecode``,
+by ulang.codegen.bytecode. Code for ``--tasks=async`` is compiled by
+ulang.runtime.tasks, the bytecode backend not supporting it.
+"""
+from ulang.runtime import tasks
+
+# switched by ``ulang --backend=bytecode``, see ulang.codegen.bytecode
+backend = 'compile'
+BACKENDS = ('compile', 'bytecode')
+
+
+def compile_module(nodes, filename):
+    """Compile a module ast with the backend, for the current task mode."""
+    if tasks.mode == 'async':
+        return tasks.compile_async(nodes, filename)
+    if backend == 'bytecode':
+        from ulang.codegen import bytecode
+        return bytecode.compile_module(nodes, filename)
+    return compile(nodes, filename, 'exec')
@@ -0,0 +1,438 @@
+"""
+A language service for editors, ``ulang daemon [socket]``.
+
+The daemon listens on a Unix socket and answers requests made of one JSON
+object per line, like ``{"id": 1, "method": "check", "file": "a.ul"}``,
+with ``{"id": 1, "result": ...}`` or ``{"id": 1, "error": "..."}``:
+
+* ``check`` returns the syntax errors of a file, each with its ``line``,
+  ``column`` and ``message``, an empty list when the file parses;
+* ``ast`` returns the ast of a file as printed by ``ulang --dump-ast``;
+* ``close`` forgets a file, ``ping`` answers ``"pong"`` and ``shutdown``
+  stops the daemon.
+
+The current content of the file is given as ``text``, or as ``edits``
+replacing ``[start, end)`` ranges of the previous content, each with its
+``text``. Without either the file is read from disk, again when its mtime
+changes, until a client sends its content.
+
+The parser and its tables are built once. Each file is kept as a list of
+chunks, the top level statements up to a line break outside of brackets,
+with their tokens and ast. A change lexes and parses again the chunks it
+touches and their neighbours. A chunk ending in the middle of a statement,
+e.g. after an unclosed ``{``, is parsed again with the next one merged.
+The chunks after the change are only moved by the lines added or removed.
+"""
+import ast, bisect, copy, json, os, socket, socketserver, sys, tempfile, threading
+from rply import Token
+from rply.errors import LexingError
+from rply.token import SourcePosition
+from ulang.parser.core import NameFixPass, Parser
+from ulang.parser.error import SyntaxError
+from ulang.parser.lexer import lexer
+
+OPEN = {'LBRACE', '(', '['}
+CLOSE = {'RBRACE', ')', ']'}
+AT_END = 'unexpected token "$end"'
+
+
+class DaemonError(Exception):
+    __doc__ = '\n    Raised by Client.call when the daemon answers with an error.\n    '
+
+
+def default_path():
+    """Return the socket of the daemon: $ULANG_DAEMON, or one per user in the temp directory."""
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.environ.get('ULANG_DAEMON') or os.path.join(tempfile.gettempdir(), 'ulang-%d.sock' % uid)
+
+
+def move(token, idx, lines):
+    """Return a copy of token moved by idx characters and lines lines."""
+    sp = token.getsourcepos()
+    return Token(token.gettokentype(), token.getstr(), SourcePosition(sp.idx + idx, sp.lineno + lines, sp.colno))
+
+
+def shift_lines(nodes, lines):
+    """Move nodes by lines lines, those made up by the parser at line 0 stay there."""
+    seen = set()
+    for node in nodes:
+        for child in ast.walk(node):
+            # the parser shares some nodes between two places of the tree
+            if id(child) in seen:
+                continue
+            seen.add(id(child))
+            if getattr(child, 'lineno', None):
+                child.lineno += lines
+            if getattr(child, 'end_lineno', None):
+                child.end_lineno += lines
+
+
+def common_ends(old, new):
+    """Return the lengths of the common prefix and suffix of two texts, which do not overlap."""
+    limit = min(len(old), len(new))
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[:mid] == new[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    prefix = lo
+    lo, hi = 0, limit - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return (prefix, lo)
+
+
+def find_boundary(tokens, pos, depth=0):
+    """
+    Return the index after the first line break outside of brackets from
+    pos, or None, and the depth of brackets there or at the end of tokens.
+    """
+    for k in range(pos, len(tokens)):
+        kind = tokens[k].gettokentype()
+        if kind in OPEN:
+            depth += 1
+        elif kind in CLOSE:
+            depth = max(depth - 1, 0)
+        elif kind == 'NEWLINE':
+            if depth == 0:
+                return (k + 1, 0)
+
+    return (None, depth)
+
+
+def is_broken(chunk):
+    """Tell if the statements of a chunk fail before their end, where more tokens cannot help."""
+    e = chunk.error
+    return e is not None and not (isinstance(e, SyntaxError) and e.message_ == AT_END)
+
+
+class Chunk:
+    __doc__ = '\n    Top level statements of a file from start to end, with their\n    tokens, placed relative to the start of the chunk, and their ast.\n    '
+    __slots__ = ('start', 'end', 'line', 'tokens', 'body', 'anonfuncs', 'error', 'parsed_line')
+
+    def __init__(self, start, end, line, tokens):
+        self.start = start
+        self.end = end
+        self.line = line
+        self.tokens = tokens
+        self.body = []
+        self.anonfuncs = []
+        self.error = None
+        self.parsed_line = line
+
+
+class Document:
+    __doc__ = '\n    A file known to the daemon, its text split into chunks.\n    '
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.text = ''
+        self.mtime = None
+        self.chunks = []
+        # chunks parsed so far, for the benchmarks
+        self.parsed = 0
+
+    def replace(self, parser, text):
+        """Set the text of the document, parsing again the region which changed."""
+        prefix, suffix = common_ends(self.text, text)
+        if prefix == len(self.text) == len(text) and self.chunks:
+            return
+        self.edit(parser, prefix, len(self.text) - suffix, text[prefix:len(text) - suffix])
+
+    def edit(self, parser, start, end, new):
+        """Replace the text from start to end by new."""
+        old = self.text
+        if not 0 <= start <= end <= len(old):
+            raise ValueError('edit [%d, %d) out of range' % (start, end))
+        text = old[:start] + new + old[end:]
+        self.text = text
+        chunks = self.chunks
+        # block comments may span chunks, their changes are parsed in full
+        around = old[max(start - 1, 0):end + 1] + ' ' + text[max(start - 1, 0):start + len(new) + 1]
+        if not chunks or '/*' in around or '*/' in around:
+            self.chunks = self.parse(parser, 0, 1, [])
+            return
+        starts = [chunk.start for chunk in chunks]
+        # one more chunk on both sides, an edit may join the line break before
+        # it to an 'else' or break a statement continued on the next line
+        first = max(bisect.bisect_right(starts, start) - 2, 0)
+        last = min(bisect.bisect_right(starts, max(start, end - 1)), len(chunks) - 1)
+        delta = len(new) - (end - start)
+        lines = new.count('\n') - old.count('\n', start, end)
+        for chunk in chunks[last + 1:]:
+            chunk.start += delta
+            chunk.end += delta
+            chunk.line += lines
+
+        if chunks[first].start > 0 and text.startswith('#!', chunks[first].start):
+            self.chunks = self.parse(parser, 0, 1, [])
+            return
+        self.chunks = chunks[:first] + self.parse(parser, chunks[first].start, chunks[first].line, chunks[last + 1:], chunks[last].end + delta)
+
+    def parse(self, parser, start, line, following, end=None):
+        """
+        Lex and parse the text from start, at line, to end, return its
+        chunks followed by those of following not merged into them.
+        """
+        text = self.text
+        lines = text.split('\n')
+        following = list(following)
+        if end is None:
+            end = len(text)
+        try:
+            tokens = list(lexer.lex(text[start:end]))
+        except LexingError as e:
+            # the chunks up to the end of the file hold the error
+            sp = e.getsourcepos()
+            chunk = Chunk(start, len(text), line, [])
+            parser.filename_ = self.filename
+            parser.source_ = lines
+            chunk.error = parser.lexing_error(LexingError(None, SourcePosition(start + sp.idx, line + sp.lineno - 1, sp.colno)))
+            return [chunk]
+
+        end -= start
+        chunks = []
+        # index of the first token, offset and line of the next chunk, relative to start
+        pos = 0
+        offset, first_line = 0, 1
+        # tokens already scanned for brackets, chunks merged before parsing again
+        scanned = depth = 0
+        pulled = tries = 0
+
+        def cut(boundary, chunk_end):
+            chunk = Chunk(start + offset, start + chunk_end, line + first_line - 1, [move(token, -offset, 1 - first_line) for token in tokens[pos:boundary]])
+            self.parse_chunk(parser, chunk, lines)
+            return chunk
+
+        while True:
+            boundary, depth = find_boundary(tokens, scanned, depth)
+            scanned = len(tokens) if boundary is None else boundary
+            if boundary is None:
+                chunk = None
+                if following:
+                    if pulled >= tries and pos < len(tokens):
+                        # an unclosed bracket, parse again after 1, 2, 4... merged
+                        # chunks in case the statement is broken before the end
+                        tries = tries * 2 or 1
+                        chunk = cut(len(tokens), end)
+                        if not is_broken(chunk):
+                            chunk = None
+                    if chunk is None:
+                        nxt = following.pop(0)
+                        tokens.extend(move(token, nxt.start - start, nxt.line - line) for token in nxt.tokens)
+                        end = nxt.end - start
+                        pulled += 1
+                        continue
+                boundary = len(tokens)
+                if chunk is None:
+                    chunk = cut(boundary, end)
+            else:
+                chunk = cut(boundary, tokens[(boundary - 1)].getsourcepos().idx + 1)
+                if isinstance(chunk.error, SyntaxError) and chunk.error.message_ == AT_END:
+                    # the statement goes on after the line break
+                    continue
+            chunks.append(chunk)
+            pos = boundary
+            offset = chunk.end - start
+            pulled = tries = 0
+            if pos > 0:
+                first_line = tokens[(pos - 1)].getsourcepos().lineno + 1
+            if pos == len(tokens):
+                chunks[(-1)].end = start + end
+                break
+
+        return chunks + following
+
+    def parse_chunk(self, parser, chunk, lines):
+        tokens = [move(token, chunk.start, chunk.line - 1) for token in chunk.tokens]
+        self.parsed += 1
+        try:
+            module, chunk.anonfuncs = parser.parse_tokens(iter(tokens), lines, self.filename)
+            chunk.body = module.body
+        except Exception as e:
+            chunk.error = e
+            chunk.body, chunk.anonfuncs = [], []
+
+    def errors(self):
+        """Return the syntax errors of the document."""
+        found = []
+        for chunk in self.chunks:
+            e = chunk.error
+            if e is not None:
+                found.append({'line':getattr(e, 'lineno_', chunk.line),
+                 'column':getattr(e, 'colno_', 1),
+                 'message':getattr(e, 'message_', '%s: %s' % (e.__class__.__name__, e)),
+                 'text':str(e)})
+        return found
+
+    def module(self):
+        """Return the ast of the document as Parser.parse returns it."""
+        anonfuncs, body = [], []
+        for chunk in self.chunks:
+            if chunk.error is not None:
+                raise chunk.error
+            if chunk.parsed_line != chunk.line:
+                shift_lines(chunk.anonfuncs + chunk.body, chunk.line - chunk.parsed_line)
+                chunk.parsed_line = chunk.line
+            anonfuncs.extend(chunk.anonfuncs)
+            body.extend(chunk.body)
+
+        module = copy.deepcopy(ast.Module(body=(anonfuncs + body), type_ignores=[]))
+        return NameFixPass(self.filename).visit(module)
+
+
+class Service:
+    __doc__ = '\n    Answers the requests of the clients, the documents and the parser\n    are shared by all of them.\n    '
+
+    def __init__(self):
+        Parser.build_parser()
+        self.parser = Parser()
+        self.documents = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def document(self, request):
+        """Return the document of a request, brought up to date with its text or edits."""
+        filename = request.get('file')
+        if not isinstance(filename, str):
+            raise ValueError('the request has no file')
+        doc = self.documents.get(filename)
+        new = doc is None
+        if new:
+            doc = Document(filename)
+        if 'edits' in request:
+            for edit in request['edits']:
+                doc.edit(self.parser, edit['start'], edit['end'], edit['text'])
+
+            doc.mtime = None
+        elif 'text' in request:
+            doc.replace(self.parser, request['text'])
+            doc.mtime = None
+        elif new or doc.mtime is not None:
+            # the file is read from disk until a client sends its text
+            mtime = os.stat(filename).st_mtime_ns
+            if mtime != doc.mtime:
+                with open(filename, 'r', encoding='utf-8') as (f):
+                    doc.replace(self.parser, f.read().strip('\ufeff'))
+                doc.mtime = mtime
+        if new:
+            self.documents[filename] = doc
+        return doc
+
+    def handle(self, request):
+        """Return the response to a request."""
+        response = {'id': request.get('id')}
+        method = request.get('method')
+        try:
+            with self.lock:
+                if method == 'check':
+                    response['result'] = self.document(request).errors()
+                elif method == 'ast':
+                    response['result'] = ast.dump(self.document(request).module(), True, True)
+                elif method == 'close':
+                    response['result'] = self.documents.pop(request.get('file'), None) is not None
+                elif method == 'ping':
+                    response['result'] = 'pong'
+                elif method == 'shutdown':
+                    response['result'] = True
+                    if self.server is not None:
+                        threading.Thread(target=(self.server.shutdown)).start()
+                else:
+                    raise ValueError('unknown method "%s"' % method)
+        except Exception as e:
+            response['error'] = '%s: %s' % (e.__class__.__name__, str(e))
+
+        return response
+
+
+class Handler(socketserver.StreamRequestHandler):
+    __doc__ = '\n    Reads the requests of one client, a JSON object per line.\n    '
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+                if not isinstance(request, dict):
+                    raise ValueError('a request is a JSON object')
+            except ValueError as e:
+                response = {'id':None,  'error':'%s: %s' % (e.__class__.__name__, str(e))}
+            else:
+                response = self.server.service.handle(request)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path=None):
+    """Run the daemon on the socket path until a client asks it to shut down."""
+    path = path or default_path()
+    if os.path.exists(path):
+        try:
+            Client(path).call('ping')
+        except OSError:
+            # left by a daemon which did not stop cleanly
+            os.unlink(path)
+        else:
+            raise OSError('a daemon already listens on %s' % path)
+    service = Service()
+    server = Server(path, Handler)
+    server.service = service
+    service.server = server
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+class Client:
+    __doc__ = '\n    A connection to the daemon, used by editor plugins written in\n    python and by the benchmarks.\n    '
+
+    def __init__(self, path=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path or default_path())
+        self.rfile = self.sock.makefile('rb')
+        self.next_id = 0
+
+    def call(self, method, **params):
+        """Send a request and return its result."""
+        self.next_id += 1
+        params.update(id=(self.next_id), method=method)
+        self.sock.sendall(json.dumps(params).encode('utf-8') + b'\n')
+        response = json.loads(self.rfile.readline().decode('utf-8'))
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return response['result']
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def main(args):
+    """Run ``ulang daemon [socket]``."""
+    if len(args) > 1:
+        sys.stderr.write('usage: ulang daemon [socket]\n')
+        return 2
+    if not hasattr(socket, 'AF_UNIX'):
+        sys.stderr.write('ulang daemon needs Unix sockets\n')
+        return 1
+    try:
+        serve(args[0] if args else None)
+    except OSError as e:
+        sys.stderr.write('%s: %s\n' % (e.__class__.__name__, str(e)))
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
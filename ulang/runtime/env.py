@@ -2,81 +2,72 @@
 # Python bytecode 3.7 (3394)
 # Decompiled from: Python 3.7.2rc1 (tags/v3.7.2rc1:75a402a217, Dec 11 2018, 22:09:03) [MSC v.1916 32 bit (Intel)]
 # Embedded file name: ulang\runtime\env.py
-import ast, dis, imp, math, os, sys, getopt, time, threading, trace
+import math, os, sys, time, threading
 from datetime import datetime
-from ulang.parser.core import Parser
+from ulang.parser import optimizer, slots
+from ulang.runtime import channels, compiler, importer, parallel, printer, processes, tasks, ulcache
+
+def cache_variant():
+    variant = ''
+    if optimizer.enabled:
+        variant += '.opt-1'
+    if not slots.enabled:
+        variant += '.noslots'
+    if tasks.mode != 'thread':
+        variant += '.' + tasks.mode
+    elif compiler.backend != 'compile':
+        variant += '.' + compiler.backend
+    return variant
+
 
 def parse_and_compile(input_file):
-    with open(input_file, 'r') as (file):
-        parser = Parser()
-        nodes = parser.parse(source=(file.read()),
-          filename=input_file)
-        return compile(nodes, input_file, 'exec')
-
-
-def load_ulang_module(name, globals, fromlist=(), level=0):
-    path = name.replace('.', '/') + '.ul'
-    if sys.platform == 'win32':
-        path = path.replace('/', '\\')
-    code = parse_and_compile(path)
-    if code is None:
-        raise ModuleNotFoundError(name)
-    modules = []
-    tail = name
-
-    # Avoid dead code: name
-    def _modname(name):
-        if modules:
-            return modules[(-1)].__name__ + '.' + name
-        else:
-            return name
-    module_name = _modname
-    
-    index = 0
-    while index != -1:
-        index = tail.find('.')
-        head, tail = tail[:index], tail[index + 1:]
-        if index == -1:
-            head = tail
-            module = imp.new_module(module_name(tail))
-            globals_ = create_globals(argv=(globals['ARGV']))
-            module.__dict__.update(globals_)
-            module.__dict__['__file__'] = os.path.abspath(path)
-            exec(code, module.__dict__)
-        else:
-            module = imp.new_module(module_name(head))
-        if modules:
-            modules[(-1)].__dict__[head] = module
-        modules.append(module)
-
-    result = modules[0]
-    if len(modules) > 1:
-        if fromlist is not None:
-            for sym in fromlist:
-                if sym == '*':
-                    for k in module.__dict__:
-                        if k not in globals:
-                            result.__dict__[k] = module.__dict__[k]
-
-                    break
-                else:
-                    result.__dict__[sym] = module.__dict__[sym]
-
-    return result
+    from ulang.parser.core import Parser
+    if ulcache.enabled:
+        code = ulcache.load(input_file, Parser.pg_.get_grammar_hash(), cache_variant())
+        if code is not None:
+            return code
+    with open(input_file, 'rb') as (file):
+        source = file.read()
+    parser = Parser()
+    nodes = parser.parse(source=(source.decode('utf-8').strip('\ufeff')),
+      filename=input_file)
+    if optimizer.enabled:
+        nodes = optimizer.optimize(nodes)
+    code = compiler.compile_module(nodes, input_file)
+    if ulcache.enabled:
+        ulcache.store(input_file, source, code, Parser.pg_.get_grammar_hash(), cache_variant())
+    return code
+
+
+try:
+    from ctypes import c_ulong, py_object, pythonapi
+    set_async_exc = pythonapi.PyThreadState_SetAsyncExc
+    set_async_exc.argtypes = (c_ulong, py_object)
+except (ImportError, AttributeError):
+    # no access to the C api (e.g. pypy), killable threads are traced
+    set_async_exc = None
 
 
 class Thread(threading.Thread):
-    __doc__ = '\n    A traced thread wrapper.\n    '
+    __doc__ = '\n    A killable thread wrapper. kill() raises SystemExit asynchronously\n    in the thread, so it runs without any tracing cost. It is only traced\n    where the C api to raise the exception is not available.\n    '
 
     def __init__(self, *args, **kw):
         (threading.Thread.__init__)(self, *args, **kw)
         self.killed = False
+        self.finished = False
 
     def start(self):
-        self._Thread__run_backup = self.run
-        self.run = self._Thread__run
+        if set_async_exc is None:
+            self._Thread__run_backup = self.run
+            self.run = self._Thread__run
         threading.Thread.start(self)
 
+    def run(self):
+        try:
+            threading.Thread.run(self)
+        finally:
+            self.finished = True
+
     def __run(self):
         sys.settrace(self.globaltrace)
         self._Thread__run_backup()
@@ -95,12 +86,37 @@ class Thread(threading.Thread):
 
     def kill(self):
         self.killed = True
+        if set_async_exc is None or self.finished or self.ident is None:
+            return
+        if set_async_exc(self.ident, SystemExit) > 1:
+            set_async_exc(self.ident, None)
+
+
+class Vec:
+    __doc__ = '\n    The ``vec`` namespace of the math of arrays, the names of\n    ulang.runtime.arrays. It imports numpy on first use, and then makes\n    the scalar builtins of the program work on arrays.\n    '
+
+    def __init__(self, builtins):
+        self._Vec__builtins = builtins
+
+    def __getattr__(self, name):
+        from ulang.runtime import arrays
+        if self._Vec__builtins is not None:
+            arrays.install(self._Vec__builtins)
+            self._Vec__builtins = None
+        if name not in arrays.__all__:
+            raise AttributeError("vec has no attribute '%s'" % name)
+        value = getattr(arrays, name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        from ulang.runtime import arrays
+        return list(arrays.__all__)
 
 
 def fix_builtins(builtins):
-    from inspect import isclass
     for k, v in __builtins__.items():
-        if isclass(v) and issubclass(v, BaseException):
+        if isinstance(v, type) and issubclass(v, BaseException):
             builtins[k] = v
 
     return builtins
@@ -122,59 +138,22 @@ def __builtin_rem(a, b):
 
 def create_globals(argv=[], fname=''):
     """
-    Create the global runtime enviroment for the µlang program.
+    Create the global runtime enviroment for the µlang program. The
+    builtins live in its __builtins__, shared with imported modules.
     """
 
-    def local_str(x):
-
-        def container_to_str(c, start='', end='', ptr=None):
-            _str = start
-            for i, item in enumerate(c):
-                if i:
-                    _str += ', '
-                if ptr is None:
-                    _str += local_str(item)
-                else:
-                    _str += ptr(c, item)
-
-            _str += end
-            return _str
-
-        if x is None:
-            return 'nil'
-        if isinstance(x, bool):
-            if x:
-                return 'true'
-            return 'false'
-        if isinstance(x, list):
-            return container_to_str(x, '[', ']')
-        if isinstance(x, tuple):
-            return container_to_str(x)
-        if isinstance(x, dict):
-            return container_to_str(x, '{', '}', lambda c, k: '%s: %s' % (k, c[k]))
-        if isinstance(x, set):
-            return container_to_str(x, '{', '}')
-        return str(x)
-
-    def local_print(*objs, sep=' ', end='', file=sys.stdout, flush=False):
-        """Prints thy values to a stream, or to stdout by default."""
-        for obj in objs:
-            file.write(local_str(obj))
-            if obj != objs[(-1)]:
-                file.write(sep)
-
-        file.write(end)
+    def local_print(*objs, sep=' ', end='', file=None, flush=False, limit=None):
+        """Prints thy values to a stream, or to stdout by default.
+        At most limit items of each container are printed.
+        """
+        file = file if file is not None else sys.stdout
+        printer.print_values(objs, sep, end, file, limit)
         if flush:
             file.flush()
 
-    def local_import(name, globals=None, locals=None, fromlist=(), level=0):
-        """Import a ulang module, if no ulang module is found, 
-        import the python modules.
-        """
-        try:
-            return load_ulang_module(name, globals, fromlist, level)
-        except:
-            return __import__(name, globals, locals, fromlist, level)
+    def local_println(*objs, **kw):
+        kw.setdefault('end', '\n')
+        local_print(*objs, **kw)
 
     def local_assert(expr, msg=None):
         assert expr, msg
@@ -188,15 +167,21 @@ def create_globals(argv=[], fname=''):
     def builtin_kill(th):
         """ Kill a given task if it is running. """
         if isinstance(th, Thread):
-            if th == threading.currentThread():
+            if th == threading.current_thread():
                 sys.exit()
             else:
-                if th.isAlive():
+                if th.is_alive():
                     th.kill()
+        elif hasattr(th, 'cancel'):
+            th.cancel()
+
+    def builtin_array(data=(), dtype=None):
+        """ Make a numeric array, backed by numpy. """
+        return vec.array(data, dtype)
 
     def builtin_self():
         """ Return the task id of current task. """
-        return threading.currentThread()
+        return threading.current_thread()
 
     def pip_install(*packages, cmd='install'):
         """ Trigger a pip command. """
@@ -214,8 +199,17 @@ def create_globals(argv=[], fname=''):
     cwd = os.getcwd()
     if cwd not in sys.path:
         sys.path.append(cwd)
-    return {'print':local_print, 
-     'println':lambda *objs: local_print(*objs, **{'end': '\n'}), 
+    builtins = fix_builtins({'__import__':importer.ulang_import, 
+     '__build_class__':__build_class__, 
+     '__name__':'__main__', 
+     '__file__':fname, 
+     '__print__':eval_print, 
+     '___':None, 
+     '__div__':__builtin_div, 
+     '__rem__':__builtin_rem, 
+     '__par__':parallel.par})
+    builtins.update({'print':local_print, 
+     'println':local_println, 
      'assert':local_assert, 
      'len':len, 
      'enumerate':enumerate, 
@@ -261,7 +255,10 @@ def create_globals(argv=[], fname=''):
      'asin':math.asin, 
      'acos':math.acos, 
      'atan':math.atan, 
+     'array':builtin_array, 
      'spawn':builtin_spawn, 
+     'spawn_process':processes.spawn_process, 
+     'pmap':processes.pmap, 
      'kill':builtin_kill, 
      'self':builtin_self, 
      'quit':sys.exit, 
@@ -279,14 +276,15 @@ def create_globals(argv=[], fname=''):
      'delay':lambda ms: time.sleep(ms / 1000), 
      'delayMicroseconds':lambda us: time.sleep(us / 1000000), 
      'PI':math.pi, 
-     'ARGV':argv, 
-     '__builtins__':fix_builtins({'__import__':local_import, 
-      '__build_class__':__build_class__, 
-      '__name__':'__main__', 
-      '__file__':fname, 
-      '__print__':eval_print, 
-      '___':None, 
-      '__div__':__builtin_div, 
-      '__rem__':__builtin_rem})
-      }
+     'ARGV':argv})
+    builtins.update(channels.builtins())
+    if tasks.mode == 'async':
+        builtins.update(tasks.builtins())
+        builtins.update({'__acall__':tasks.acall, 
+         '__green__':tasks.GreenFunction, 
+         '__aiterate__':tasks.GreenIterator})
+    vec = Vec(builtins)
+    builtins['vec'] = vec
+    importer.install(builtins, fname)
+    return {'__builtins__': builtins}
 # okay decompiling E:\ulang\ulang-0.2.2.exe_extracted\PYZ-00.pyz_extracted\ulang.runtime.env.pyc
@@ -0,0 +1,163 @@
+"""
+Import of µlang modules through the python import system.
+
+The ``__import__`` builtin of ulang (``ulang_import``) looks for
+``name.ul`` in the current directory, the directory of the main program
+and the directories of the ``ULANGPATH`` environment variable, so ulang
+modules take precedence over python modules of the same name. Directories
+holding ulang modules are packages. The content of the searched
+directories is cached and only listed again when their mtime changes, so
+failed lookups, like those of every python module imported from ulang,
+cost a stat per directory.
+
+Ulang modules are imported as the submodules of the ``__ulang__`` package
+(``using queue`` loads ``__ulang__.queue``), which a finder on
+``sys.meta_path`` serves. They stay out of the names python imports: a
+``queue.ul`` or ``select.ul`` next to a program neither replaces the
+modules of the standard library for python code, nor is replaced by them
+for ulang code.
+
+Loaded modules are registered in ``sys.modules`` and run once. All of them
+share the builtins namespace of the program created by ``create_globals``.
+"""
+import os, sys
+from importlib.machinery import ModuleSpec, PathFinder
+from importlib.util import spec_from_file_location
+from ulang.runtime import tasks
+
+SUFFIX = '.ul'
+
+# the package holding the ulang modules in sys.modules
+PREFIX = '__ulang__'
+
+# directories searched for top level modules, the path of PREFIX
+dirs = []
+
+# the builtins namespace shared by all modules of the program
+builtins = None
+
+# directory -> (mtime, names of its entries)
+listings = {}
+
+
+def search_path(fname=''):
+    """Return the directories searched for the modules of the program fname."""
+    found = [os.getcwd()]
+    if fname and not fname.startswith('<'):
+        found.append(os.path.dirname(os.path.abspath(fname)))
+    found.extend(os.path.abspath(d) for d in os.environ.get('ULANGPATH', '').split(os.pathsep) if d)
+    return list(dict.fromkeys(found))
+
+
+def listing(directory):
+    """Return the names of the entries of a directory, cached until it changes."""
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return frozenset()
+    cached = listings.get(directory)
+    if cached is not None:
+        if cached[0] == mtime:
+            return cached[1]
+    try:
+        entries = frozenset(os.listdir(directory))
+    except OSError:
+        entries = frozenset()
+    listings[directory] = (mtime, entries)
+    return entries
+
+
+def ulang_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """
+    The __import__ of ulang code: a ulang module is imported under
+    PREFIX, any other name is left to python.
+    """
+    if level or name == PREFIX or name.startswith(PREFIX + '.'):
+        # relative to a ulang package, or shipped to a worker process
+        return __import__(name, globals, locals, fromlist, level)
+    top = PREFIX + '.' + name.partition('.')[0]
+    if top not in sys.modules:
+        if finder.find_spec(top, dirs) is None:
+            return __import__(name, globals, locals, fromlist, level)
+    module = __import__(PREFIX + '.' + name, globals, locals, fromlist, level)
+    if fromlist:
+        return module
+    return sys.modules[top]
+
+
+class UlangLoader:
+    __doc__ = '\n    Runs a ulang module in a namespace using the shared builtins,\n    a package directory without module file has no code.\n    '
+
+    def __init__(self, filename=None):
+        self.filename = filename
+
+    def create_module(self, spec):
+        pass
+
+    def exec_module(self, module):
+        if builtins is None:
+            from ulang.runtime.env import create_globals
+            create_globals()
+        module.__dict__['__builtins__'] = builtins
+        if self.filename is None:
+            return
+        from ulang.runtime.env import parse_and_compile
+        tasks.execute(parse_and_compile(self.filename), module.__dict__)
+
+
+class UlangFinder:
+    __doc__ = '\n    Finds ulang modules and packages on the ulang search path, or in\n    the directories of the parent package for submodules.\n    '
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname == PREFIX:
+            spec = ModuleSpec(fullname, (UlangLoader()), is_package=True)
+            spec.submodule_search_locations = dirs
+            return spec
+        if not fullname.startswith(PREFIX + '.'):
+            return
+        name = fullname.rpartition('.')[2]
+        filename = name + SUFFIX
+        packages = []
+        for directory in (dirs if path is None else path):
+            entries = listing(directory)
+            if filename in entries:
+                origin = os.path.join(directory, filename)
+                package = os.path.join(directory, name)
+                locations = [package] if name in entries and os.path.isdir(package) else None
+                return spec_from_file_location(fullname, origin, loader=(UlangLoader(origin)),
+                  submodule_search_locations=locations)
+            if name in entries:
+                package = os.path.join(directory, name)
+                if os.path.isdir(package):
+                    if '__init__.py' not in listing(package):
+                        packages.append(package)
+
+        if not packages:
+            return
+        name = fullname[len(PREFIX) + 1:]
+        spec = PathFinder.find_spec(name, path if '.' in name else None)
+        if spec is not None:
+            if spec.origin not in (None, 'namespace'):
+                # a python module or package comes first
+                return
+        spec = ModuleSpec(fullname, (UlangLoader()), is_package=True)
+        spec.submodule_search_locations = packages
+        return spec
+
+    def invalidate_caches(self):
+        listings.clear()
+
+
+finder = UlangFinder()
+
+
+def install(namespace, fname=''):
+    """
+    Share the builtins namespace with the modules imported by the
+    program fname and put the finder on sys.meta_path.
+    """
+    global builtins
+    builtins = namespace
+    dirs[:] = search_path(fname)
+    if finder not in sys.meta_path:
+        sys.meta_path.insert(0, finder)
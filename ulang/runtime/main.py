@@ -2,30 +2,85 @@
 # Python bytecode 3.7 (3394)
 # Decompiled from: Python 3.7.2rc1 (tags/v3.7.2rc1:75a402a217, Dec 11 2018, 22:09:03) [MSC v.1916 32 bit (Intel)]
 # Embedded file name: ulang\runtime\main.py
-import ast, dis, imp, os, sys, getopt, time, threading, trace
-from datetime import datetime
+import ast, os, sys, getopt, time
 from ulang.runtime.env import create_globals
 from ulang.runtime.repl import repl
+from ulang.runtime import compiler, tasks, ulcache
 from ulang.parser.core import Parser
+from ulang.parser import optimizer, slots
 from ulang.parser.lexer import lexer
-from ulang.codegen import blockly, python, ulgen
 import ulang
-from pprint import pprint
 
 def usage(prog):
-    info = 'usage: %s [-apbcidsDth] input_file\nOptions and arguments:\n --dump-ast,        -a   dump ast info\n --dump-python,     -p   dump python source code\n --dump-blockly,    -b   dump blockly xml (experimental)\n --dump-bytecode,   -c   dump donsok bytecode (experimental)\n --python-to-ulang, -s   convert python to ulang\n --debug,           -D   debug with Pdb (experimental)\n --interact,        -i   inspect interactively after running script\n --disassemble,     -d   disassemble the python bytecode\n --exec-code=<code> -e   run code from cli argument\n --show-backtrace,  -t   show backtrace for errors\n --version,         -v   show the version\n --help,            -h   show this message\n'
+    info = 'usage: %s [-apbcidsDthO] input_file\nOptions and arguments:\n --dump-ast,        -a   dump ast info\n --dump-python,     -p   dump python source code\n --dump-blockly,    -b   dump blockly xml (experimental)\n --dump-bytecode,   -c   disassemble the code of --backend=bytecode\n --python-to-ulang, -s   convert python to ulang\n --debug,           -D   debug with Pdb (experimental)\n --interact,        -i   inspect interactively after running script\n --disassemble,     -d   disassemble the python bytecode\n --exec-code=<code> -e   run code from cli argument\n --show-backtrace,  -t   show backtrace for errors\n --optimize,        -O   fold constants and specialise arithmetic before compiling\n --tasks=<mode>          run spawned tasks as threads (default) or async\n --backend=<name>        compile with python (default) or bytecode (python 3.11, not with --tasks=async)\n --no-cache              do not read or write __ulcache__ for imported modules\n --no-slots              do not give types __slots__ (see ulang.parser.slots)\n --profile[=out]         report where the program spends its time, write flame graph stacks to out\n --startup-profile       report the import time of each module at startup\n build <src> <out>       compile the .ul files below src to .pyc files in out\n daemon [socket]         serve syntax checks and asts to editors (see ulang.runtime.daemon)\n --version,         -v   show the version\n --help,            -h   show this message\n'
     sys.stderr.write(info % os.path.basename(prog))
     sys.exit(-1)
 
 
+def startup_profile(argv):
+    """
+    Run ulang again with the given arguments under `python -X importtime`
+    and report where the startup time goes.
+    """
+    import subprocess
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(ulang.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    cmd = [sys.executable, '-X', 'importtime', '-m', 'ulang'] + [arg for arg in argv[1:] if arg != '--startup-profile']
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, stderr=(subprocess.PIPE), universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            sys.stderr.write(line + '\n')
+            continue
+        fields = line[len('import time:'):].split('|')
+        if fields[0].strip().isdigit():
+            imports.append((int(fields[0]), int(fields[1]), fields[2].strip()))
+
+    total = sum(item[0] for item in imports)
+    sys.stderr.write('\nstartup profile: %.1f ms in total, %.1f ms importing %d modules\n' % (
+     elapsed * 1000, total / 1000, len(imports)))
+    sys.stderr.write('%10s %10s  %s\n' % ('self [ms]', 'cumul [ms]', 'module'))
+    for self_us, cumulative_us, name in sorted(imports, reverse=True)[:25]:
+        sys.stderr.write('%10.2f %10.2f  %s\n' % (self_us / 1000, cumulative_us / 1000, name))
+
+    return proc.returncode
+
+
+def profile_option(argv):
+    """
+    Take --profile[=out] out of the options of argv, getopt cannot parse
+    an optional value. Return the other arguments and None without the
+    option, else out or ''.
+    """
+    i = 1
+    while i < len(argv):
+        arg = argv[i]
+        if arg == '--profile' or arg.startswith('--profile='):
+            return (argv[:i] + argv[i + 1:], arg[len('--profile='):])
+        if arg == '--' or arg == '-' or not arg.startswith('-'):
+            break
+        if arg == '--exec-code' or not arg.startswith('--') and arg.find('e') == len(arg) - 1:
+            # skip the code to run
+            i += 1
+        i += 1
+
+    return (argv, None)
+
+
 def main(argv=None):
     if argv is None:
         argv = sys.argv
     if '/?' in argv or '-?' in argv:
         usage(argv[0])
+    if '--startup-profile' in argv:
+        sys.exit(startup_profile(argv))
+    argv, profile_out = profile_option(argv)
 
     try:
-        opts, args = getopt.getopt(argv[1:], 'hdapbctisDTe:v', [
+        opts, args = getopt.getopt(argv[1:], 'hdapbctisDTe:vO', [
          'dump-ast',
          'dump-python',
          'dump-blockly',
@@ -38,7 +93,13 @@ def main(argv=None):
          'show-backtrace',
          'help',
          'version',
-         'interact'])
+         'interact',
+         'optimize',
+         'tasks=',
+         'backend=',
+         'no-cache',
+         'no-slots',
+         'startup-profile'])
     except BaseException as e:
         raise
         try:
@@ -81,6 +142,22 @@ def main(argv=None):
             trace_exception = True
         elif opt in ('-T', '--dump-tokens'):
             dump_tokens = True
+        elif opt in ('-O', '--optimize'):
+            optimizer.enabled = True
+        elif opt == '--tasks':
+            if value not in tasks.MODES:
+                sys.stderr.write('unknown task mode "%s"\n' % value)
+                usage(argv[0])
+            tasks.mode = value
+        elif opt == '--backend':
+            if value not in compiler.BACKENDS:
+                sys.stderr.write('unknown backend "%s"\n' % value)
+                usage(argv[0])
+            compiler.backend = value
+        elif opt == '--no-cache':
+            ulcache.enabled = False
+        elif opt == '--no-slots':
+            slots.enabled = False
         elif opt in ('-h', '--help'):
             usage(argv[0])
         elif opt in ('-v', '--version'):
@@ -90,6 +167,15 @@ def main(argv=None):
             if opt in ('-e', '--exec-code'):
                 exec_code = value
 
+    if tasks.mode == 'async' and compiler.backend != 'compile':
+        sys.stderr.write('--backend=%s can not compile --tasks=async code\n' % compiler.backend)
+        usage(argv[0])
+    if len(args) > 0 and args[0] == 'build' and not os.path.isfile(args[0]):
+        from ulang.runtime import build
+        sys.exit(build.main(args[1:]))
+    if len(args) > 0 and args[0] == 'daemon' and not os.path.isfile(args[0]):
+        from ulang.runtime import daemon
+        sys.exit(daemon.main(args[1:]))
     if input_file is None:
         if len(args) > 0:
             input_file = args[0]
@@ -117,34 +203,43 @@ def main(argv=None):
             sys.exit(-1)
 
         if python2ulang:
+            from ulang.codegen import ulgen
             nodes = ast.parse(source, input_file)
             print(ulgen.dump(nodes))
             return
-            if dump_tokens:
-                tokens = lexer.lex(source)
-                for token in tokens:
-                    print((token.gettokentype()), end=' ')
+        if dump_tokens:
+            tokens = lexer.lex(source)
+            for token in tokens:
+                print((token.gettokentype()), end=' ')
 
-                return
+            print()
+            return
         else:
             parser = Parser()
             nodes = parser.parse(source, input_file)
+            if optimizer.enabled:
+                nodes = optimizer.optimize(nodes)
             if dump_ast:
+                from pprint import pprint
                 pprint(ast.dump(nodes, True, True))
                 return
             if dump_python:
+                from pprint import pprint
+                from ulang.codegen import python
                 pprint(python.dump(nodes))
                 return
             if dump_blockly:
-                pprint(blockly.dump(nodes))
+                from ulang.codegen import blockly
+                blockly.CodeGen().write(nodes, sys.stdout)
                 return
             if dump_bytecode:
-                from pygen.compiler import Compiler
-                pprint(Compiler().compile(nodes, input_file).dump())
+                from ulang.codegen import bytecode
+                print(bytecode.dump(nodes, input_file), end='')
                 return
 
-            code = compile(nodes, input_file, 'exec')
+            code = compiler.compile_module(nodes, input_file)
             if disassemble:
+                import dis
                 dis.dis(code)
                 return
             globals = create_globals(argv=(args[1:]),
@@ -159,13 +254,19 @@ def main(argv=None):
                     else:
                         break
 
+            elif profile_out is not None:
+                from ulang.runtime import profiler
+                profiler.run((tasks.execute), (code, globals), out=profile_out, sources=[input_file])
             else:
-                exec(code, globals)
+                tasks.execute(code, globals)
         if interactive:
             repl(globals=globals)
     except Exception as e:
         try:
             sys.stderr.write('%s: %s\n' % (e.__class__.__name__, str(e)))
+            for note in getattr(e, '__notes__', ()):
+                sys.stderr.write('%s\n' % note)
+
             if trace_exception:
                 raise e
         finally:
@@ -0,0 +1,120 @@
+"""
+The pools running the iterations of ``par for`` loops, see
+ulang.parser.parfor for the loops themselves.
+
+``__par__(body, items, pool, workers)`` calls body on every item and
+returns the reductions the iterations recorded, in the order of the
+items. The items are cut into a few chunks per worker, the items of a
+chunk running in order in the same worker: a thread of a pool shared by
+the loops, or a process of the pools of ``pmap`` (see
+ulang.runtime.processes). Only bodies using no variable of an enclosing
+function can run in a process, with the values the globals they use
+have when the loop starts.
+
+Python threads run one at a time, a thread pool only helps the loops
+whose iterations wait (sleep, input, channels) or call code releasing
+the interpreter lock, like the arrays of ulang.runtime.arrays.
+
+When iterations fail, the loop raises the exception of the first failing
+item once all the chunks are done, with a note of that item and of the
+line of the ulang source raising it. A loop run by the iteration of
+another one runs in the calling worker, item by item.
+"""
+import os, threading
+from ulang.runtime import processes
+
+# chunks per worker, smaller ones balance iterations of uneven cost
+CHUNKS = 4
+
+# thread pools by number of workers
+pools = {}
+
+# whether the current thread runs iterations of a thread pool
+state = threading.local()
+
+
+def where(e, body):
+    """Return the (file, line) of the innermost ulang frame which raised e."""
+    filename = body.__code__.co_filename
+    found = None
+    tb = e.__traceback__
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        if code.co_filename == filename or code.co_filename.endswith('.ul'):
+            found = (code.co_filename, tb.tb_lineno)
+        tb = tb.tb_next
+
+    return found
+
+
+def iterate(body, items, start):
+    """Run body on the items of a chunk, the first one being item start."""
+    results = []
+    for index, item in enumerate(items, start):
+        try:
+            results.append(body(item))
+        except Exception as e:
+            if hasattr(e, 'add_note'):
+                location = where(e, body)
+                if location is None:
+                    e.add_note('in the par for iteration of item %d' % index)
+                else:
+                    e.add_note('in the par for iteration of item %d, at "%s" line %d' % ((index,) + location))
+            raise
+
+    return results
+
+
+def iterate_thread(body, items, start):
+    state.inside = True
+    try:
+        return iterate(body, items, start)
+    finally:
+        state.inside = False
+
+
+def iterate_process(payload, items, start):
+    return iterate(processes.load(payload), items, start)
+
+
+def get_pool(workers):
+    """Return the thread pool of the given size, starting it on first use."""
+    pool = pools.get(workers)
+    if pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ulang-par')
+        pools[workers] = pool
+    return pool
+
+
+def par(body, items, pool='thread', workers=None):
+    """ Run the body of a par for loop on every item, return the recorded reductions in order. """
+    items = list(items)
+    workers = workers or os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('a par for loop needs at least one worker, not %d' % workers)
+    nested = getattr(state, 'inside', False) or processes.worker_globals is not None
+    if workers == 1 or len(items) < 2 or nested:
+        chunks = [iterate(body, items, 0)]
+    else:
+        size = max(1, -(-len(items) // (workers * CHUNKS)))
+        starts = range(0, len(items), size)
+        if pool == 'process':
+            payload = processes.ship(body)
+            executor = processes.get_pool(body, workers)
+            futures = [executor.submit(iterate_process, payload, items[start:start + size], start) for start in starts]
+        else:
+            executor = get_pool(workers)
+            futures = [executor.submit(iterate_thread, body, items[start:start + size], start) for start in starts]
+        # wait for all the chunks, no iteration runs once the loop is over
+        for future in futures:
+            future.exception()
+
+        chunks = [future.result() for future in futures]
+    reductions = []
+    for results in chunks:
+        for recorded in results:
+            if recorded:
+                reductions.extend(recorded)
+
+    return reductions
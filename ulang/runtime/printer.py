@@ -0,0 +1,162 @@
+"""
+Formatting of µlang values for ``print`` and ``println``.
+
+Values are written piece by piece into a buffer which is flushed to the
+target file as it fills, so printing a container takes time linear in its
+size and never builds its whole text. Nested containers are walked with an
+explicit stack, a container which contains itself is written as ``[...]``,
+and an optional limit caps the number of items written per container.
+"""
+import sys
+
+# pieces collected before they are joined and written to the file
+BUFFER_SIZE = 4096
+
+# items of a list checked at once for a run of plain values
+CHUNK_SIZE = 512
+
+# types whose text is their str()
+PLAIN = frozenset((int, float, str))
+
+EXHAUSTED = object()
+
+BRACKETS = {list: ('[', ']'),
+ tuple: ('', ''),
+ dict: ('{', '}'),
+ set: ('{', '}')}
+
+
+def brackets(x):
+    """Return the opening and closing brackets of a container, or None."""
+    marks = BRACKETS.get(type(x))
+    if marks is not None:
+        return marks
+    if isinstance(x, list):
+        return ('[', ']')
+    if isinstance(x, tuple):
+        return ('', '')
+    if isinstance(x, (dict, set)):
+        return ('{', '}')
+
+
+def scalar_str(x):
+    if x is None:
+        return 'nil'
+    if x is True:
+        return 'true'
+    if x is False:
+        return 'false'
+    return str(x)
+
+
+def write_value(out, x, limit=None, flush=None):
+    """
+    Append the pieces of the text of x to the list out, at most limit
+    items of every container. flush is called whenever out holds more
+    than BUFFER_SIZE pieces and must empty it.
+    """
+    append = out.append
+    active = set()
+    # [items, next index, closing bracket, id, is dict, end of a mixed chunk]
+    stack = []
+    while True:
+        if type(x) in PLAIN:
+            append(str(x))
+        else:
+            marks = brackets(x)
+            if marks is None:
+                append(scalar_str(x))
+            elif id(x) in active:
+                append(marks[0] + '...' + marks[1])
+            elif len(x) <= CHUNK_SIZE and (limit is None or len(x) <= limit) and not isinstance(x, dict) and PLAIN.issuperset(map(type, x)):
+                append(marks[0] + ', '.join(map(str, x)) + marks[1])
+            else:
+                append(marks[0])
+                active.add(id(x))
+                if isinstance(x, dict):
+                    items = list(x.items())
+                elif isinstance(x, set):
+                    items = list(x)
+                else:
+                    items = x
+                stack.append([items, 0, marks[1], id(x), isinstance(x, dict), 0])
+        x = EXHAUSTED
+        while stack:
+            frame = stack[-1]
+            items, i, end, ident, is_dict, mixed = frame
+            stop = len(items) if limit is None else min(len(items), limit)
+            while i < stop:
+                if flush is not None:
+                    if len(out) >= BUFFER_SIZE:
+                        flush()
+                if not is_dict and i >= mixed:
+                    if i == 0 and stop == len(items) <= CHUNK_SIZE:
+                        chunk = items
+                    else:
+                        chunk = items[i:min(i + CHUNK_SIZE, stop)]
+                    if PLAIN.issuperset(map(type, chunk)):
+                        if i:
+                            append(', ')
+                        append(', '.join(map(str, chunk)))
+                        i += len(chunk)
+                        continue
+                    mixed = i + len(chunk)
+                item = items[i]
+                if i:
+                    append(', ')
+                i += 1
+                if is_dict:
+                    key, item = item
+                    if type(key) in PLAIN:
+                        append(str(key))
+                    else:
+                        # keys are hashable, so they are small and without cycles
+                        write_value(out, key, limit)
+                    append(': ')
+                if type(item) in PLAIN:
+                    append(str(item))
+                elif brackets(item) is None:
+                    append(scalar_str(item))
+                else:
+                    x = item
+                    break
+
+            frame[1], frame[5] = i, mixed
+            if x is not EXHAUSTED:
+                break
+            if stop < len(items):
+                append(', ...')
+            append(end)
+            active.discard(ident)
+            stack.pop()
+
+        if x is EXHAUSTED:
+            return
+
+
+def to_str(x, limit=None):
+    """Return the text of a value as printed by print."""
+    pieces = []
+    write_value(pieces, x, limit)
+    return ''.join(pieces)
+
+
+def print_values(objs, sep=' ', end='', file=None, limit=None):
+    """Write the values separated by sep and followed by end to file."""
+    if file is None:
+        file = sys.stdout
+    pieces = []
+
+    def flush():
+        file.write(''.join(pieces))
+        pieces.clear()
+
+    try:
+        for i, obj in enumerate(objs):
+            if i:
+                pieces.append(sep)
+            write_value(pieces, obj, limit, flush)
+
+        pieces.append(end)
+    finally:
+        flush()
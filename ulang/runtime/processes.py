@@ -0,0 +1,176 @@
+"""
+Process pool parallelism for CPU bound ulang code, the ``spawn_process``
+and ``pmap`` builtins.
+
+ulang functions live in namespaces built by ``create_globals`` and can not
+be pickled by reference, so a function is shipped to the workers as its
+marshalled code object together with the globals it uses: other ulang
+functions the same way, modules by name and any other picklable value as
+is. The code is marshalled once, the globals are captured again by every
+call of ``spawn_process`` and ``pmap``, so the workers see the values a
+program has when it makes the call. Values of ulang types can neither be
+shipped nor returned.
+
+Workers build one ulang namespace at startup and keep the functions
+they have loaded, reloading the globals of a function once per call.
+Pools are reused across calls and shut down at exit.
+"""
+import atexit, hashlib, itertools, marshal, os, pickle, types
+from ulang.runtime import tasks
+
+# pools by number of workers
+pools = {}
+
+# (key, marshalled code, global names) of the shipped functions, by code
+compiled = {}
+
+# numbers the calls shipping functions, the values of their globals
+snapshots = itertools.count()
+
+# in a worker, the ulang namespace and the (snapshot, function) loaded in
+# it by key, a function being reloaded with the globals of a new call
+worker_globals = None
+loaded = {}
+
+
+def code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= code_names(const)
+
+    return names
+
+
+def unwrap(func):
+    if isinstance(func, tasks.GreenFunction):
+        return (func.function, 'green')
+    return (func, 'plain')
+
+
+def describe(func):
+    """Return the key, marshalled code and used global names of a function."""
+    described = compiled.get(func.__code__)
+    if described is None:
+        code = marshal.dumps(func.__code__)
+        key = hashlib.sha1(code + func.__name__.encode('utf-8')).hexdigest()
+        described = (key, code, sorted(code_names(func.__code__)))
+        compiled[func.__code__] = described
+    return described
+
+
+def ship(func, snapshot=None, seen=None):
+    """
+    Return the picklable description of a ulang function, with the current
+    values of the globals it uses.
+    """
+    func, kind = unwrap(func)
+    if not isinstance(func, types.FunctionType):
+        raise TypeError('only ulang functions can run in a process, not %s' % type(func).__name__)
+    if func.__closure__:
+        raise TypeError('function "%s" uses variables of an enclosing function' % func.__name__)
+    if seen is None:
+        snapshot = next(snapshots)
+        seen = {}
+    elif func in seen:
+        return seen[func]
+    key, code, names = describe(func)
+    values = {}
+    payload = (key, func.__name__, code, func.__defaults__, kind, snapshot, values)
+    seen[func] = payload
+    namespace = func.__globals__
+    builtins = namespace.get('__builtins__', {})
+    for name in names:
+        if name not in namespace:
+            continue
+        value = namespace[name]
+        if isinstance(builtins, dict) and builtins.get(name) is value:
+            continue
+        if isinstance(value, types.ModuleType):
+            values[name] = ('module', value.__name__)
+        elif isinstance(value, tasks.GreenFunction) or isinstance(value, types.FunctionType) and value.__globals__ is namespace:
+            values[name] = ('function', ship(value, snapshot, seen))
+        else:
+            try:
+                values[name] = ('value', pickle.dumps(value))
+            except Exception:
+                # left out, using it in the worker raises a NameError
+                pass
+
+    return payload
+
+
+def init_worker(mode, argv, fname):
+    from ulang.runtime.env import create_globals
+    global worker_globals
+    tasks.mode = mode
+    worker_globals = create_globals(argv=argv, fname=fname)
+
+
+def load(payload):
+    key, name, code, defaults, kind, snapshot, values = payload
+    last = loaded.get(key)
+    if last is not None and last[0] == snapshot:
+        return last[1]
+    func = types.FunctionType(marshal.loads(code), worker_globals, name, defaults)
+    if kind == 'green':
+        func = tasks.GreenFunction(func)
+    loaded[key] = (snapshot, func)
+    for value_name, (value_kind, value) in values.items():
+        if value_kind == 'module':
+            module = worker_globals['__builtins__']['__import__'](value, worker_globals)
+            for part in value.split('.')[1:]:
+                module = getattr(module, part)
+            value = module
+        elif value_kind == 'function':
+            value = load(value)
+        else:
+            value = pickle.loads(value)
+        worker_globals[value_name] = value
+
+    return func
+
+
+def call(payload, *args):
+    return load(payload)(*args)
+
+
+def get_pool(func, workers):
+    """Return the process pool of the given size, starting it on first use."""
+    pool = pools.get(workers)
+    if pool is None:
+        from concurrent.futures import ProcessPoolExecutor
+        namespace = unwrap(func)[0].__globals__
+        builtins = namespace.get('__builtins__', {})
+        pool = ProcessPoolExecutor(max_workers=workers,
+          initializer=init_worker,
+          initargs=(
+         tasks.mode, list(builtins.get('ARGV', [])), builtins.get('__file__', '')))
+        pools[workers] = pool
+    return pool
+
+
+def spawn_process(target, *args):
+    """ Run a function in a worker process, return a future of its result. """
+    payload = ship(target)
+    return get_pool(target, os.cpu_count() or 1).submit(call, payload, *args)
+
+
+def pmap(func, iterable, workers=None):
+    """ Apply func to every item in parallel worker processes, return the list of results. """
+    items = list(iterable)
+    if not items:
+        return []
+    payload = ship(func)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(items) // (workers * 4))
+    pool = get_pool(func, workers)
+    return list(pool.map(call, [payload] * len(items), items, chunksize=chunksize))
+
+
+@atexit.register
+def shutdown():
+    for pool in pools.values():
+        pool.shutdown(wait=True)
+
+    pools.clear()
@@ -0,0 +1,201 @@
+"""
+Sampling profiler of ``ulang --profile[=out]``.
+
+While the program runs, a thread takes the stacks of all the other
+threads about every ``interval`` seconds, each sample weighing the wall
+clock time since the previous one. The program is not traced, it only
+pays for the switches to the sampling thread.
+
+Frames of code compiled from ulang sources are attributed to their file,
+function and line, the lines of the generated ast being those of the
+source. Other threads only run when the interpreter lets them, at calls
+and at the end of loop bodies, so the line of the innermost frame of a
+sample is the header of its function or the last line of a loop, the
+lines of the calling frames being exact. Below the innermost ulang frame of a sample, the time goes to the
+function it called: a builtin of the ulang runtime like ``println`` or
+``__div__``, listed as ``[ulang] name``, or any other python function,
+listed as ``[python] module.name``. Anonymous functions are shown as
+``<anonymous>``.
+
+The report printed on stderr lists the lines, the functions and the
+runtime builtins taking the most time, self and total. With ``out`` the
+samples are also written in the collapsed stack format read by
+flamegraph.pl and speedscope, one line per stack like
+``main (a.ul:3);fib (a.ul:7);[ulang] println 1250`` with its weight in
+microseconds.
+"""
+import os, re, sys, threading, time
+import ulang
+
+# seconds between two samples
+interval = 0.001
+
+# anonymous functions get random names, see ulang.parser.core.randomString
+ANONYMOUS = re.compile('[A-Za-z]{20}$')
+
+ULANG_DIR = os.path.dirname(os.path.abspath(ulang.__file__)) + os.sep
+
+SOURCES = ('<CLI>', '<STDIN>')
+
+
+def add(counts, key, weight):
+    counts[key] = counts.get(key, 0) + weight
+
+
+class Sampler(threading.Thread):
+    __doc__ = '\n    The thread taking the samples: the (code, line) pairs of the stacks\n    of the other threads, from the innermost frame out, with their weight.\n    '
+
+    def __init__(self):
+        super().__init__(name='ulang-profiler', daemon=True)
+        self.stacks = {}
+        self.running = True
+
+    def run(self):
+        me = threading.get_ident()
+        last = time.perf_counter()
+        while self.running:
+            time.sleep(interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append((frame.f_code, frame.f_lineno))
+                    frame = frame.f_back
+
+                stack = tuple(stack)
+                add(self.stacks, stack, weight)
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+
+class Profile:
+    __doc__ = '\n    The samples of a run, aggregated per line, function and builtin.\n    '
+
+    def __init__(self, stacks, sources=()):
+        self.sources = set(sources)
+        self.modules = {}
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, '__file__', None)
+            if path:
+                self.modules.setdefault(os.path.abspath(path), name)
+
+        self.total = 0
+        # (path, line, function) and (path, function) -> seconds
+        self.lines, self.lines_total = {}, {}
+        self.functions, self.functions_total = {}, {}
+        self.builtins = {}
+        self.collapsed = {}
+        for stack, weight in stacks.items():
+            self.add(stack, weight)
+
+    def is_ulang(self, code):
+        name = code.co_filename
+        return name.endswith('.ul') or name in SOURCES or name in self.sources
+
+    def filename(self, code):
+        path = code.co_filename
+        if os.path.isabs(path):
+            relative = os.path.relpath(path)
+            if not relative.startswith('..'):
+                return relative
+        return path
+
+    def function(self, code):
+        if ANONYMOUS.match(code.co_name):
+            return '<anonymous>'
+        return getattr(code, 'co_qualname', code.co_name)
+
+    def callee(self, code):
+        """Return the name of a python function called by ulang code."""
+        path = os.path.abspath(code.co_filename)
+        if path.startswith(ULANG_DIR):
+            name = code.co_name
+            if name.startswith('__builtin_'):
+                name = '__%s__' % name[len('__builtin_'):]
+            else:
+                for prefix in ('local_', 'builtin_'):
+                    if name.startswith(prefix):
+                        name = name[len(prefix):]
+
+            return '[ulang] ' + name
+        module = self.modules.get(path, os.path.splitext(os.path.basename(path))[0])
+        return '[python] %s.%s' % (module, getattr(code, 'co_qualname', code.co_name))
+
+    def add(self, stack, weight):
+        frames = []
+        callee = None
+        for code, line in reversed(stack):
+            if self.is_ulang(code):
+                frames.append((self.filename(code), self.function(code), line))
+                callee = None
+            elif frames and callee is None:
+                callee = self.callee(code)
+
+        if not frames:
+            # not running ulang code, like the threads of the runtime
+            return
+        self.total += weight
+        path, function, line = frames[(-1)]
+        if callee is None:
+            add(self.lines, (path, line, function), weight)
+            add(self.functions, (path, function), weight)
+        else:
+            add(self.builtins, callee, weight)
+        # the total time of recursive functions is counted once per sample
+        for key in set((path, line, function) for path, function, line in frames):
+            add(self.lines_total, key, weight)
+
+        for key in set((path, function) for path, function, line in frames):
+            add(self.functions_total, key, weight)
+
+        names = ['%s (%s:%d)' % (function, path, line) for path, function, line in frames]
+        if callee is not None:
+            names.append(callee)
+        key = ';'.join(names)
+        add(self.collapsed, key, weight)
+
+    def report(self, file, limit=20):
+        file.write('\nprofile: %.1f ms of ulang code sampled\n' % (self.total * 1000))
+        file.write('%10s %10s  %s\n' % ('self [ms]', 'total [ms]', 'line'))
+        rows = sorted((self.lines_total), key=(lambda key: (-self.lines.get(key, 0), -self.lines_total[key])))
+        for key in rows[:limit]:
+            file.write('%10.2f %10.2f  %s:%d in %s\n' % ((self.lines.get(key, 0) * 1000, self.lines_total[key] * 1000) + key))
+
+        file.write('%10s %10s  %s\n' % ('self [ms]', 'total [ms]', 'function'))
+        rows = sorted((self.functions_total), key=(lambda key: (-self.functions.get(key, 0), -self.functions_total[key])))
+        for path, function in rows[:limit]:
+            file.write('%10.2f %10.2f  %s in %s\n' % (self.functions.get((path, function), 0) * 1000, self.functions_total[(path, function)] * 1000, function, path))
+
+        if self.builtins:
+            file.write('%10s %10s  %s\n' % ('self [ms]', '', 'called from ulang code'))
+            for name, own in sorted((self.builtins.items()), key=(lambda item: -item[1]))[:limit]:
+                file.write('%10.2f %10s  %s\n' % (own * 1000, '', name))
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as (f):
+            for key, weight in sorted(self.collapsed.items()):
+                f.write('%s %d\n' % (key, max(round(weight * 1000000.0), 1)))
+
+
+def run(func, args=(), out=None, sources=()):
+    """
+    Call func(*args) under the profiler, then report on stderr and write
+    the collapsed stacks to out. Sources are the names of the code compiled
+    from ulang without a .ul suffix, like the main program.
+    """
+    sampler = Sampler()
+    sampler.start()
+    try:
+        return func(*args)
+    finally:
+        sampler.stop()
+        profile = Profile(sampler.stacks, sources)
+        profile.report(sys.stderr)
+        if out:
+            profile.write_collapsed(out)
+            sys.stderr.write('collapsed stacks written to %s\n' % out)
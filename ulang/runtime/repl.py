@@ -3,55 +3,177 @@
 # Decompiled from: Python 3.7.2rc1 (tags/v3.7.2rc1:75a402a217, Dec 11 2018, 22:09:03) [MSC v.1916 32 bit (Intel)]
 # Embedded file name: ulang\runtime\repl.py
 import sys, cmd
-from ulang.parser.core import Parser
+import builtins as py_builtins
+from rply import Token
+from rply.errors import LexingError
+from rply.token import SourcePosition
+from ulang.parser.core import NameFixPass, Parser
 from ulang.parser.lexer import lexer
 from ulang.runtime.env import create_globals
 
+# tokens which may still change with the next line, e.g. the newline
+# before '}' or 'else' which the lexer joins into a single token
+TAIL = {'NEWLINE', 'LBRACE', 'ELIF', 'ELSE', 'CATCH', 'FINALLY'}
+OPENING = {'(', '[', 'LBRACE'}
+CLOSING = {')', ']', 'RBRACE'}
+# keywords followed by a block, the input goes on until it is opened
+HEADERS = {'FUNC', 'OPERATOR', 'ATTR', 'TYPE', 'LOOP', 'WHILE', 'TRY', 'ELIF', 'ELSE', 'CATCH', 'FINALLY'}
+# if, for and par for head a block when they start a statement, else they end one
+POSTFIX = {'IF', 'FOR', 'PAR'}
+STARTS = {None, 'NEWLINE', ';', 'LBRACE'}
+# keywords starting a statement, which is never an expression
+STATEMENTS = {'TYPE', 'USING', 'IF', 'WHILE', 'LOOP', 'FOR', 'PAR', 'RETURN', 'BREAK', 'CONTINUE', 'TRY', 'THROW', 'EXTERN', 'OPERATOR', 'ATTR'}
+ASSIGNMENTS = {'=', '+=', '-=', '*=', '/=', '%=', '^=', '|=', '&=', '<<=', '>>='}
+
+# depth, depths of the unopened headers, previous token type,
+# number of tokens but newlines, whether it is a statement
+START = (0, (), None, 0, False)
+
+
+def scan(state, tokens):
+    """Return the state after the given tokens, see START."""
+    depth, headers, prev, count, statement = state
+    for token in tokens:
+        kind = token.gettokentype()
+        if depth <= 0 and kind != 'NEWLINE':
+            if kind in ASSIGNMENTS or prev == 'FUNC' and kind == 'IDENTIFIER':
+                statement = True
+            elif prev in STARTS and kind in STATEMENTS:
+                statement = True
+            elif count and (prev in ('NEWLINE', ';') or kind in POSTFIX and prev not in STARTS):
+                # a second statement, or one ending with if or for
+                statement = True
+        if kind in HEADERS or kind in POSTFIX and prev in STARTS:
+            headers += (depth,)
+        elif kind in ('LBRACE', ';'):
+            headers = tuple(d for d in headers if d != depth)
+        if kind in OPENING:
+            depth += 1
+        elif kind in CLOSING:
+            depth -= 1
+            headers = tuple(d for d in headers if d <= depth)
+        if kind != 'NEWLINE':
+            count += 1
+        prev = kind
+
+    return (depth, headers, prev, count, statement)
+
+
+def wrap(tokens):
+    """Return the tokens of ``___ = (tokens); __print__(___)``."""
+    while tokens[-1].gettokentype() == 'NEWLINE':
+        tokens = tokens[:-1]
+    first, last = tokens[0].getsourcepos(), tokens[-1].getsourcepos()
+    return [
+     Token('IDENTIFIER', '___', first), Token('=', '=', first), Token('(', '(', first)] + tokens + [
+     Token(')', ')', last), Token(';', ';', last), Token('IDENTIFIER', '__print__', last),
+     Token('(', '(', last), Token('IDENTIFIER', '___', last), Token(')', ')', last)]
+
+
+class Input:
+    __doc__ = '''
+    The lines of a statement typed in the REPL, tokenized as they come.
+
+    Each line is lexed once, together with the few tokens at the end of
+    the previous lines which it may change, so the depth of brackets and
+    braces and the keywords waiting for their block are counted as the
+    input grows. A line ending with a backslash goes on with the next
+    one, and so does an unclosed block comment.
+    '''
+
+    def __init__(self, lexer=lexer):
+        self.lexer = lexer
+        self.lines = []
+        self.tokens = []
+        self.state = START
+        # the source of the tail, from where it starts
+        self.tail = []
+        self.pending = ''
+        self.start = SourcePosition(0, 1, 1)
+        self.comment = False
+        self.continued = ''
+
+    def empty(self):
+        return not self.lines and not self.continued
+
+    def relocate(self, token):
+        sp = token.getsourcepos()
+        # the pending source is lexed after a space, see feed()
+        colno = self.start.colno + sp.colno - 2 if sp.lineno == 1 else sp.colno
+        return Token(token.gettokentype(), token.getstr(), SourcePosition(self.start.idx + sp.idx - 1, self.start.lineno + sp.lineno - 1, colno))
+
+    def feed(self, line):
+        """
+        Add a line, return whether the input is complete. Raises a
+        LexingError at its position in the input.
+        """
+        if line.endswith('\\'):
+            self.continued += line[:-1]
+            return False
+        line, self.continued = self.continued + line, ''
+        self.lines.append(line)
+        source = self.pending + line + '\n'
+        try:
+            # the space keeps the shebang rule from matching mid input
+            tokens = [self.relocate(token) for token in self.lexer.lex(' ' + source)]
+        except LexingError as e:
+            pos = e.getsourcepos().idx - 1
+            if source.rfind('/*', 0, pos) > source.rfind('*/', 0, pos):
+                self.pending, self.tail, self.comment = source, [], True
+                return False
+            raise LexingError(None, self.relocate(Token(None, None, e.getsourcepos())).getsourcepos())
+
+        cut = len(tokens)
+        while cut and tokens[cut - 1].gettokentype() in TAIL:
+            cut -= 1
+
+        self.comment = False
+        for i in range(cut - 1):
+            # the lexer ignores closed comments, so this one goes on
+            if tokens[i].gettokentype() == '/' and tokens[i + 1].gettokentype() == '*' and tokens[i + 1].getsourcepos().idx == tokens[i].getsourcepos().idx + 1:
+                cut, self.comment = i, True
+                break
+
+        self.tokens.extend(tokens[:cut])
+        self.state = scan(self.state, tokens[:cut])
+        self.tail = tokens[cut:]
+        if self.tail:
+            start = self.tail[0].getsourcepos()
+            self.pending = source[start.idx - self.start.idx:]
+            self.start = start
+        else:
+            self.start = SourcePosition(self.start.idx + len(source), self.start.lineno + source.count('\n'), 1)
+            self.pending = ''
+        return self.complete()
+
+    def complete(self):
+        if self.comment or self.continued:
+            return False
+        depth, headers = scan(self.state, self.tail)[:2]
+        return depth <= 0 and not headers
+
+    def is_statement(self):
+        return scan(self.state, self.tail)[4]
+
+    def is_blank(self):
+        return not scan(self.state, self.tail)[3]
+
+    def all_tokens(self):
+        return self.tokens + self.tail
+
+
 def is_close(source):
     """
     Check if the given source code is closed,
     which means each '{' has a matched '}' 
     """
-    keywords = {
-     'FUNC', 'OPERATOR', 'ATTR', 'TYPE',
-     'FOR', 'LOOP', 'WHILE',
-     'IF', 'ELIF', 'ELSE',
-     'TRY', 'CATCH', 'FINALLY'}
-    if len(source) > 1:
-        if source[(-2)] == '\\':
-            return False
-    tokens = lexer.lex(source)
-    unclosed = []
-    unmatched = [
-     0, 0, 0]
-    last = 2 * ['']
-    for tok in tokens:
-        c = tok.gettokentype()
-        last[0], last[1] = last[1], c
-        if c in keywords:
-            unclosed.append(c)
-        else:
-            if c == 'LBRACE':
-                unmatched[0] += 1
-        if c == 'RBRACE':
-            unmatched[0] -= 1
-            if len(unclosed):
-                unclosed.pop(-1)
-            elif c == '(':
-                unmatched[1] += 1
-            elif c == ')':
-                unmatched[1] -= 1
-            elif c == '[':
-                unmatched[2] += 1
-            elif c == ']':
-                unmatched[2] -= 1
-
-    unmatched_sum = sum(unmatched)
-    unclosed_sum = len(unclosed)
-    if unclosed_sum > 0 and unmatched_sum == 0 and last[1] == 'NEWLINE' and not last[0] == 'NEWLINE':
-        if last[0] == ';':
-            return True
-    return unclosed_sum == 0 and unmatched_sum == 0
+    lines = source.split('\n')
+    if source.endswith('\n'):
+        lines.pop()
+    state = Input()
+    for line in lines:
+        state.feed(line)
+    return state.complete()
 
 
 def input_swallowing_interrupt(_input):
@@ -77,7 +199,7 @@ class Repl(cmd.Cmd):
         self.locals = locals
         self.parser = Parser()
         self.prompt = ps1
-        self.stmt = ''
+        self.input = Input()
 
     def do_help(self, arg):
         self.default('help(%s)' % arg)
@@ -94,37 +216,59 @@ class Repl(cmd.Cmd):
         try:self.default(line)
         except Exception as err:
             print(type(err).__name__+": ",str(err))
-            self.stmt=''
-        self.prompt = self.ps1 if len(self.stmt) == 0 else self.ps2
+            self.input = Input()
+        self.prompt = self.ps1 if self.input.empty() else self.ps2
 
     def default(self, line):
         if line is not None:
-            self.stmt += '%s\n' % line
-            if not self.is_close():
+            try:
+                if not self.input.feed(line):
+                    return
+            except LexingError as e:
+                self.parser.filename_, self.parser.source_ = '<STDIN>', self.input.lines
+                self.input = Input()
+                sys.stderr.write('SyntaxError: %s\n' % str(self.parser.lexing_error(e)))
+                return
+
+            source, self.input = self.input, Input()
+            if source.is_blank():
                 return
             try:
-                try:
-                    try:
-                        node = self.parser.parse('___=(%s);__print__(___)' % self.stmt, '<STDIN>')
-                    except Exception:
-                        node = self.parser.parse(self.stmt, '<STDIN>')
-
-                    code = compile(node, '<STDIN>', 'exec')
-                    exec(code, self.globals, self.locals)
-                except SystemExit:
-                    sys.exit()
-                except BaseException as e:
-                    try:
-                        sys.stderr.write('%s: %s\n' % (e.__class__.__name__, str(e)))
-                    finally:
-                        e = None
-                        del e
-
-            finally:
-                self.stmt = ''
+                code = compile(self.parse(source), '<STDIN>', 'exec')
+                exec(code, self.globals, self.locals)
+            except SystemExit:
+                sys.exit()
+            except BaseException as e:
+                sys.stderr.write('%s: %s\n' % (e.__class__.__name__, str(e)))
+                for note in getattr(e, '__notes__', ()):
+                    sys.stderr.write('%s\n' % note)
+
+    def parse(self, source):
+        """
+        Parse a complete input with the tokens lexed line by line, as an
+        expression whose value is printed or else as statements. Which one
+        is tried first depends on the tokens, so most inputs parse once.
+        """
+        tokens = source.all_tokens()
+        streams = [(False, wrap(tokens)), (True, tokens)]
+        if source.is_statement():
+            streams.reverse()
+        error = None
+        for statement, stream in streams:
+            try:
+                nodes, anonfuncs = self.parser.parse_tokens(iter(stream), source.lines, '<STDIN>')
+            except Exception as e:
+                if statement or error is None:
+                    error = e
+                continue
+
+            nodes.body[0:0] = anonfuncs
+            return NameFixPass('<STDIN>').visit(nodes)
+
+        raise error
 
     def is_close(self):
-        return is_close(self.stmt)
+        return self.input.complete()
 
     def cmdloop(self, *args, **kwargs):
         orig_input_func = cmd.__builtins__['input']
@@ -145,7 +289,13 @@ def repl(ps1='> ', ps2='>> ', globals=None):
      '\thelp: to show this message']
     if not globals:
         globals = create_globals(fname='<STDIN>')
-    globals['globals'] = lambda : print('\n'.join([' %s (%s)' % (k, v.__class__.__name__) for k, v in globals.items() if k != '__builtins__' if k != '___']))
+
+    def _globals():
+        # the ulang builtins, without the python exceptions added to them
+        names = {k: v for k, v in globals['__builtins__'].items() if not k.startswith('__') if not (isinstance(v, type) and issubclass(v, BaseException) and getattr(py_builtins, k, None) is v)}
+        names.update(globals)
+        print('\n'.join([' %s (%s)' % (k, v.__class__.__name__) for k, v in names.items() if k != '__builtins__' if k != '___']))
+    globals['globals'] = _globals
 
     # Avoid dead code: help(*args)
     def _help(*args):
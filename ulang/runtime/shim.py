@@ -0,0 +1,19 @@
+"""
+The runtime of programs compiled by ``ulang build``.
+
+Every compiled module starts with ``from ulang.runtime.shim import *``,
+which brings the builtins of ``create_globals`` into its namespace. Only
+the runtime is loaded, not the parser. The modules of a compiled program
+are plain ``.pyc`` files imported by python, so the ulang finder is taken
+off ``sys.meta_path`` again.
+"""
+import sys
+from ulang.runtime import importer
+from ulang.runtime.env import create_globals
+
+builtins = create_globals(argv=(sys.argv[1:]), fname=(sys.argv[0] if sys.argv else ''))['__builtins__']
+if importer.finder in sys.meta_path:
+    sys.meta_path.remove(importer.finder)
+
+__all__ = [name for name in builtins if name not in ('__name__', '__file__')]
+globals().update((name, builtins[name]) for name in __all__)
@@ -0,0 +1,256 @@
+"""
+Green tasks for ``ulang --tasks=async``.
+
+By default every ``spawn`` starts an OS thread. In async mode the module
+is compiled so that ulang functions are coroutines and every call made
+from them is awaited, and ``spawn`` schedules a task on an asyncio event
+loop instead. ``sleep``, ``delay``, ``input`` and channel waits suspend
+the calling task and let the others run; ``kill`` cancels a task at its
+next suspension and ``self`` returns the current task.
+
+Methods of types and lambdas stay plain functions: ulang functions called
+from them run to completion, their waits then block the loop.
+"""
+import ast, contextvars, functools, sys, time
+from types import CoroutineType
+
+# switched by ``ulang --tasks=async``
+mode = 'thread'
+MODES = ('thread', 'async')
+
+# true while a coroutine is driven from plain code and must not suspend
+blocking = contextvars.ContextVar('blocking', default=False)
+
+# inspect.CO_COROUTINE, set on code compiled with top level awaits
+CO_COROUTINE = 128
+
+EXHAUSTED = object()
+
+
+class GreenBuiltin:
+    __doc__ = '\n    A builtin with a blocking implementation for plain code and\n    a coroutine one used when it is called from a task.\n    '
+
+    def __init__(self, function, coroutine):
+        self.function = function
+        self.coroutine = coroutine
+        functools.update_wrapper(self, function)
+
+    def __call__(self, *args, **kw):
+        return (self.function)(*args, **kw)
+
+
+class GreenFunction:
+    __doc__ = '\n    A ulang function compiled as a coroutine function. Calls from\n    tasks await it, calls from plain code drive it to completion.\n    '
+
+    def __init__(self, function):
+        self.function = function
+        functools.update_wrapper(self, function)
+
+    def __call__(self, *args, **kw):
+        return run_sync((self.function)(*args, **kw))
+
+
+def run_sync(coro):
+    """Run a coroutine which is not allowed to suspend and return its result."""
+    token = blocking.set(True)
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    finally:
+        blocking.reset(token)
+
+    coro.close()
+    raise RuntimeError('only code running in a task can wait for an awaitable')
+
+
+async def acall(func, *args, **kw):
+    """
+    Call func from a task, awaiting green functions and coroutines
+    returned by python functions. Other awaitables like task handles
+    are plain values.
+    """
+    if isinstance(func, GreenFunction):
+        return await (func.function)(*args, **kw)
+    if isinstance(func, GreenBuiltin):
+        if blocking.get():
+            return (func.function)(*args, **kw)
+        return await (func.coroutine)(*args, **kw)
+    result = func(*args, **kw)
+    if isinstance(result, CoroutineType):
+        return await result
+    return result
+
+
+class GreenIterator:
+    __doc__ = '\n    The iterator of the for loops of tasks: the async iterator of an\n    object which has one, like a channel, otherwise its plain iterator.\n    '
+
+    def __init__(self, iterable):
+        if hasattr(iterable, '__aiter__') and not blocking.get():
+            self.iterator = iterable.__aiter__()
+            self.sync = False
+        else:
+            self.iterator = iter(iterable)
+            self.sync = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.sync:
+            return await self.iterator.__anext__()
+        value = next(self.iterator, EXHAUSTED)
+        if value is EXHAUSTED:
+            raise StopAsyncIteration
+        return value
+
+
+async def run_task(target, args):
+    try:
+        return await acall(target, *args)
+    except SystemExit:
+        pass
+
+
+def report(task):
+    if task.cancelled():
+        return
+    e = task.exception()
+    if e is not None:
+        sys.stderr.write('Exception in task %s:\n' % task.get_name())
+        import traceback
+        traceback.print_exception(type(e), e, e.__traceback__)
+
+
+def spawn(target, *args):
+    """ Spawn and start a new concurrency task. """
+    import asyncio
+    task = asyncio.get_running_loop().create_task(run_task(target, args))
+    task.add_done_callback(report)
+    return task
+
+
+def kill(task):
+    """ Kill a given task if it is running. """
+    import asyncio
+    if isinstance(task, asyncio.Task):
+        if task is current():
+            sys.exit()
+        else:
+            task.cancel()
+    elif hasattr(task, 'cancel'):
+        task.cancel()
+
+
+def current():
+    """ Return the task id of current task. """
+    import asyncio
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return
+
+
+async def ainput(prompt=''):
+    import asyncio
+    return await asyncio.get_running_loop().run_in_executor(None, input, prompt)
+
+
+def builtins():
+    """Return the ulang builtins replaced in async mode."""
+    import asyncio
+    return {'spawn':spawn,
+     'kill':kill,
+     'self':current,
+     'sleep':GreenBuiltin(time.sleep, asyncio.sleep),
+     'delay':GreenBuiltin(lambda ms: time.sleep(ms / 1000), lambda ms: asyncio.sleep(ms / 1000)),
+     'delayMicroseconds':GreenBuiltin(lambda us: time.sleep(us / 1000000), lambda us: asyncio.sleep(us / 1000000)),
+     'input':GreenBuiltin(input, ainput)}
+
+
+class AsyncTransform(ast.NodeTransformer):
+    __doc__ = '\n    Turn the functions of a module into green coroutine functions\n    and await every call made from them or from the module body.\n    Loops over values which may be channels iterate asynchronously.\n    Type bodies, lambdas and generators are left untouched.\n    '
+
+    def visit_FunctionDef(self, func):
+        if self.is_generator(func):
+            return func
+        self.generic_visit(func)
+        func = ast.copy_location(ast.AsyncFunctionDef(name=(func.name),
+          args=(func.args),
+          body=(func.body),
+          decorator_list=(func.decorator_list + [
+         ast.Name(id='__green__', ctx=(ast.Load()), lineno=(func.lineno), col_offset=(func.col_offset))]),
+          returns=(func.returns)), func)
+        return func
+
+    def visit_Call(self, call):
+        self.generic_visit(call)
+        return ast.copy_location(ast.Await(value=ast.copy_location(ast.Call(func=ast.Name(id='__acall__',
+          ctx=(ast.Load()),
+          lineno=(call.lineno),
+          col_offset=(call.col_offset)),
+          args=([call.func] + call.args),
+          keywords=(call.keywords)), call)), call)
+
+    def visit_For(self, loop):
+        if isinstance(loop.iter, (ast.List, ast.Tuple, ast.Set, ast.Dict, ast.Str, ast.ListComp)) or self.is_range(loop.iter):
+            return self.generic_visit(loop)
+        self.generic_visit(loop)
+        return ast.copy_location(ast.AsyncFor(target=(loop.target),
+          iter=ast.copy_location(ast.Call(func=ast.Name(id='__aiterate__',
+          ctx=(ast.Load()),
+          lineno=(loop.lineno),
+          col_offset=(loop.col_offset)),
+          args=[
+         loop.iter],
+          keywords=[]), loop.iter),
+          body=(loop.body),
+          orelse=(loop.orelse)), loop)
+
+    def visit_ClassDef(self, cls):
+        return cls
+
+    def visit_Lambda(self, expr):
+        return expr
+
+    def is_range(self, node):
+        return isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'range'
+
+    def is_generator(self, func):
+        todo = list(func.body)
+        while todo:
+            node = todo.pop()
+            if isinstance(node, (ast.Yield, ast.YieldFrom)):
+                return True
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+                todo.extend(ast.iter_child_nodes(node))
+
+        return False
+
+
+def compile_async(nodes, filename):
+    """Compile a module ast for async mode, see ulang.runtime.compiler."""
+    if not hasattr(ast, 'PyCF_ALLOW_TOP_LEVEL_AWAIT'):
+        raise RuntimeError('--tasks=async requires python 3.8 or later')
+    nodes = AsyncTransform().visit(nodes)
+    return compile(nodes, filename, 'exec', ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+
+
+def execute(code, globals):
+    """
+    Execute module code compiled by compiler.compile_module, running the event
+    loop for the main module in async mode.
+    """
+    if not code.co_flags & CO_COROUTINE:
+        exec(code, globals)
+        return
+    import asyncio
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if loop is None:
+        asyncio.run(eval(code, globals))
+    else:
+        run_sync(eval(code, globals))
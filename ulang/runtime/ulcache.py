@@ -0,0 +1,128 @@
+"""
+A pyc-style bytecode cache for imported µlang modules.
+
+Compiled code objects are marshalled into a ``__ulcache__`` directory next
+to the ``.ul`` source.  Each entry starts with a fixed header recording the
+python magic number, the hash of the grammar the module was parsed with,
+the hash of the compiler (see ``compiler_hash``) and the mtime, size and
+sha1 of the source, so an entry is only reused while all of them still
+match.
+"""
+import hashlib, marshal, os, struct, sys
+from importlib.util import MAGIC_NUMBER, find_spec
+
+CACHE_DIR = '__ulcache__'
+# bumped whenever the layout of the entries changes
+CACHE_MAGIC = b'ULC\x02'
+HEADER = struct.Struct('<4s4s20s20sQQ20s')
+
+# the modules turning a ulang source into code, the parser actions included
+COMPILER = ('ulang.parser.lexer', 'ulang.parser.core', 'ulang.parser.optimizer', 'ulang.parser.parfor',
+ 'ulang.parser.slots', 'ulang.codegen.bytecode', 'ulang.runtime.compiler', 'ulang.runtime.tasks')
+
+# the sha1 of the compiler, computed on first use
+compiler = None
+
+# switched off by ``ulang --no-cache``
+enabled = True
+
+
+def cache_path(source_path, variant=''):
+    """
+    Return the cache file used for the given source file, code compiled
+    differently (``ulang -O``, ``--tasks=async``) gets its own variant tag.
+    """
+    head, tail = os.path.split(os.path.abspath(source_path))
+    name = os.path.splitext(tail)[0]
+    return os.path.join(head, CACHE_DIR, '%s.%s%s.ulc' % (
+     name, sys.implementation.cache_tag, variant))
+
+
+def compiler_hash():
+    """
+    Return the sha1 of ``ulang.__version__`` and of the files of the
+    compiler modules, so that an entry compiled by another version of
+    ulang, or by an edited compiler, is not reused.
+    """
+    global compiler
+    if compiler is None:
+        import ulang
+        digest = hashlib.sha1(ulang.__version__.encode('utf-8'))
+        for name in COMPILER:
+            spec = find_spec(name)
+            digest.update(name.encode('utf-8'))
+            try:
+                with open(spec.origin, 'rb') as (f):
+                    digest.update(f.read())
+            except (OSError, TypeError):
+                # frozen, the version stands for it
+                pass
+
+        compiler = digest.digest()
+    return compiler
+
+
+def _fix_filename(code, filename):
+    if code.co_filename == filename:
+        return code
+    consts = tuple(_fix_filename(c, filename) if isinstance(c, type(code)) else c for c in code.co_consts)
+    return code.replace(co_filename=filename, co_consts=consts)
+
+
+def load(source_path, grammar_hash, variant=''):
+    """
+    Return the cached code object of the given source file,
+    or None if there is no valid cache entry for it.
+    """
+    try:
+        st = os.stat(source_path)
+        with open(cache_path(source_path, variant), 'rb') as (f):
+            data = f.read()
+    except OSError:
+        return
+    if len(data) < HEADER.size:
+        return
+    magic, pymagic, ghash, chash, mtime, size, shash = HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or pymagic != MAGIC_NUMBER:
+        return
+    if ghash != bytes.fromhex(grammar_hash) or chash != compiler_hash():
+        return
+    if size != st.st_size:
+        return
+    if mtime != st.st_mtime_ns:
+        # touched but maybe not modified, compare the content instead
+        try:
+            with open(source_path, 'rb') as (f):
+                if hashlib.sha1(f.read()).digest() != shash:
+                    return
+        except OSError:
+            return
+    try:
+        code = marshal.loads(data[HEADER.size:])
+    except (EOFError, ValueError, TypeError):
+        return
+    return _fix_filename(code, source_path)
+
+
+def store(source_path, source, code, grammar_hash, variant=''):
+    """
+    Write the code object compiled from the given source bytes
+    into the cache, silently giving up if the directory is not writable.
+    """
+    import tempfile
+    path = cache_path(source_path, variant)
+    cache_dir = os.path.dirname(path)
+    try:
+        st = os.stat(source_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        header = HEADER.pack(CACHE_MAGIC, MAGIC_NUMBER, bytes.fromhex(grammar_hash), compiler_hash(),
+          st.st_mtime_ns, len(source), hashlib.sha1(source).digest())
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as (f):
+            f.write(header)
+            f.write(marshal.dumps(code))
+        os.replace(f.name, path)
+    except OSError:
+        try:
+            os.unlink(f.name)
+        except (NameError, OSError):
+            pass